@@ -0,0 +1,207 @@
+# benchmark the packaging stages of RawPresentation without rendering a manim scene
+# synthetic partial movie files are generated with ffmpeg's testsrc
+#
+# usage (from the project root, requires ffmpeg, manim and the built web files):
+#   python3 benchmarks/bench_packaging.py --slides 10,50 --animations 1,4 --resolutions 480p,1080p --durations 1
+#   python3 benchmarks/bench_packaging.py --config single_pass=false --config packaging_workers=1 --output bench_output.txt
+import argparse
+import hashlib
+import itertools
+import json
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+from contextlib import contextmanager
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, Iterator, List
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESOLUTIONS = {
+    "480p": (854, 480, 15),
+    "720p": (1280, 720, 30),
+    "1080p": (1920, 1080, 60),
+}
+
+
+# create fake partial movie file named like manim's hashed ones
+def generate_movie(movie_folder: str, resolution: str, duration: float, idx: int) -> str:
+    width, height, rate = RESOLUTIONS[resolution]
+    name = hashlib.sha256(f"{resolution} {duration} {idx}".encode("utf-8")).hexdigest()[:32]
+    movie_file = os.path.join(movie_folder, f"{name}.mp4")
+    if not os.path.exists(movie_file):
+        subprocess.run(["ffmpeg", "-loglevel", "error", "-y",
+                        "-f", "lavfi", "-i", f"testsrc=size={width}x{height}:rate={rate}:duration={duration}",
+                        "-c:v", "libx264", "-pix_fmt", "yuv420p", movie_file], check=True)
+    return movie_file
+
+
+# combined movie of all animations like the one manim creates
+def generate_combined_movie(movie_folder: str, partial_movie_files: List[str]) -> str:
+    movie_file = os.path.join(movie_folder, f"combined_{len(partial_movie_files)}_{os.path.basename(partial_movie_files[0])}")
+    if not os.path.exists(movie_file):
+        index_file = os.path.join(movie_folder, "combined.txt")
+        with open(index_file, "w", encoding="utf-8") as file:
+            for partial_movie_file in partial_movie_files:
+                file.write(f"file '{partial_movie_file}'\n")
+        subprocess.run(["ffmpeg", "-loglevel", "error", "-y", "-f", "concat", "-safe", "0", "-i", index_file, "-c", "copy", movie_file], check=True)
+    return movie_file
+
+
+def read_io_counters() -> Dict[str, int]:
+    counters: Dict[str, int] = {}
+    # includes finished child processes like ffmpeg
+    with open("/proc/self/io", "r", encoding="utf-8") as file:
+        for line in file:
+            name, value = line.split(":")
+            counters[name] = int(value)
+    return counters
+
+
+def get_folder_size(folder: str) -> int:
+    return sum(os.path.getsize(os.path.join(root, file)) for root, _, files in os.walk(folder) for file in files)
+
+
+# stand-in for the manim scene, only provides what the packaging stages use
+# rendering defines the slides with construct instead of running manim
+class BenchmarkParent:
+    def __init__(self, *args, **kwargs):
+        self.construct: Callable[[], None] = lambda: None
+
+    def render(self, *args, **kwargs):
+        self.construct()
+
+    def play(self, *args, **kwargs):
+        pass
+
+    def tear_down(self, *args, **kwargs):
+        pass
+
+
+class BenchmarkPresentation:
+    def __init__(self, partial_movie_files: List[str], movie_file: str):
+        self.renderer = SimpleNamespace(file_writer=SimpleNamespace(partial_movie_files=partial_movie_files, movie_file_path=movie_file))
+
+
+# run a single case, executed in a fresh process to get meaningful peak memory
+def run_case(case: Dict[str, Any]) -> Dict[str, Any]:
+    sys.path.insert(0, PROJECT_DIR)
+    from manim_web_presenter.settings import presenter_config, parse_value
+    from manim_web_presenter.presentation import RawPresentation
+
+    for setting in case["config"]:
+        name, value = setting.split("=", 1)
+        setattr(presenter_config, name, parse_value(value, getattr(presenter_config, name)))
+
+    partial_movie_files = [generate_movie(case["movie_folder"], case["resolution"], case["duration"], idx)
+                           for idx in range(case["slides"] * case["animations"])]
+    movie_file = generate_combined_movie(case["movie_folder"], partial_movie_files)
+
+    os.chdir(case["work_folder"])
+    owner = BenchmarkPresentation(partial_movie_files, movie_file)
+    parent = BenchmarkParent()
+    raw_presentation = RawPresentation(owner, parent)
+
+    # slides already get packaged while they're being defined
+    def construct() -> None:
+        for _ in range(case["slides"]):
+            raw_presentation.next_slide("normal", None)
+            for _ in range(case["animations"]):
+                raw_presentation.play()
+        raw_presentation.tear_down()
+    parent.construct = construct
+
+    # the build report times every stage, the I/O gets counted around it
+    report = raw_presentation.report
+    report_stage = report.stage
+    io_counters: Dict[str, Dict[str, int]] = {}
+
+    @contextmanager
+    def stage_with_io(name: str) -> Iterator[None]:
+        io_before = read_io_counters()
+        try:
+            with report_stage(name):
+                yield
+        finally:
+            io_after = read_io_counters()
+            io_counters[name] = {
+                # logical bytes, independent of the page cache
+                "bytes_read": io_after["rchar"] - io_before["rchar"],
+                "bytes_written": io_after["wchar"] - io_before["wchar"],
+                # bytes that actually hit the storage
+                "storage_bytes_read": io_after["read_bytes"] - io_before["read_bytes"],
+                "storage_bytes_written": io_after["write_bytes"] - io_before["write_bytes"],
+            }
+    report.stage = stage_with_io
+
+    raw_presentation.render()
+    stages = {stage["name"]: dict(io_counters[stage["name"]], seconds=stage["seconds"]) for stage in report.stages}
+
+    return {
+        "case": {name: case[name] for name in ["slides", "animations", "resolution", "duration", "config"]},
+        "input_bytes": sum(os.path.getsize(file) for file in partial_movie_files),
+        "output_bytes": get_folder_size(raw_presentation.output_folder),
+        "seconds": sum(stage["seconds"] for stage in stages.values()),
+        "stages": stages,
+        # kilobytes on linux
+        "peak_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        "peak_child_rss_kb": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the packaging pipeline of the Manim Web Presenter.")
+    parser.add_argument("--slides", default="10,50", help="comma separated amounts of slides")
+    parser.add_argument("--animations", default="1,4", help="comma separated amounts of animations per slide")
+    parser.add_argument("--resolutions", default="480p,1080p", help=f"comma separated resolutions out of {', '.join(RESOLUTIONS)}")
+    parser.add_argument("--durations", default="1", help="comma separated durations of each animation in seconds")
+    parser.add_argument("--config", action="append", default=[], help="presenter_config setting as name=value, can be repeated")
+    parser.add_argument("--repeat", type=int, default=1, help="runs per case")
+    parser.add_argument("--movie-folder", default=None, help="keep the generated movies in this folder to reuse them")
+    parser.add_argument("--output", default=None, help="write results to this file instead of stdout")
+    parser.add_argument("--case", default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    # worker process
+    if args.case is not None:
+        json.dump(run_case(json.loads(args.case)), sys.stdout)
+        return
+
+    movie_folder = os.path.abspath(args.movie_folder or tempfile.mkdtemp(prefix="manim_web_presenter_movies_"))
+    os.makedirs(movie_folder, exist_ok=True)
+    results: List[Dict[str, Any]] = []
+    for slides, animations, resolution, duration in itertools.product([int(value) for value in args.slides.split(",")],
+                                                                      [int(value) for value in args.animations.split(",")],
+                                                                      args.resolutions.split(","),
+                                                                      [float(value) for value in args.durations.split(",")]):
+        for _ in range(args.repeat):
+            # presentation output of every run starts from scratch
+            work_folder = tempfile.mkdtemp(prefix="manim_web_presenter_bench_")
+            case = {
+                "slides": slides,
+                "animations": animations,
+                "resolution": resolution,
+                "duration": duration,
+                "config": args.config,
+                "movie_folder": movie_folder,
+                "work_folder": work_folder,
+            }
+            process = subprocess.run([sys.executable, os.path.abspath(__file__), "--case", json.dumps(case)], stdout=subprocess.PIPE, check=True)
+            results.append(json.loads(process.stdout.decode("utf-8").splitlines()[-1]))
+            print(f"{slides} slides, {animations} animations, {resolution}, {duration}s: {results[-1]['seconds']:.2f}s", file=sys.stderr)
+            shutil.rmtree(work_folder)
+    if args.movie_folder is None:
+        shutil.rmtree(movie_folder)
+
+    report = json.dumps({"results": results}, indent=4)
+    if args.output is None:
+        print(report)
+    else:
+        with open(args.output, "w", encoding="utf-8") as file:
+            file.write(report)
+
+
+if __name__ == "__main__":
+    main()
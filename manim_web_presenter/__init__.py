@@ -1,5 +1,23 @@
-from .presentation import create_wrappers
-create_wrappers()  # nopep8
-from .wrapper_classes import *
-
 from manim import *
+from .settings import presenter_config
+from . import wrappers as _wrappers
+
+
+# public names apart from the submodules of this package
+def _get_public_names():
+    return [name for name, value in globals().items() if not name.startswith("_") and not getattr(value, "__name__", "").startswith(f"{__name__}.")]
+
+
+# presentation wrappers of all scene classes get created on first access
+def __getattr__(name: str):
+    # used by 'from manim_web_presenter import *'
+    if name == "__all__":
+        return _get_public_names() + _wrappers.get_wrapper_names()
+    wrapper = _wrappers.get_wrapper(name)
+    if wrapper is None:
+        raise AttributeError(f"module '{__name__}' has no attribute '{name}'")
+    return wrapper
+
+
+def __dir__():
+    return sorted(list(globals()) + _wrappers.get_wrapper_names())
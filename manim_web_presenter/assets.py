@@ -0,0 +1,106 @@
+import gzip
+import hashlib
+import json
+import os
+from typing import Callable, Dict, List, Optional
+
+from .locking import write_atomic
+
+ASSET_MANIFEST_FILENAME = "asset_manifest.json"
+SERVICE_WORKER_FILENAME = "sw.js"
+# file extensions of precompressed variants by content coding, served by the presenter server
+PRECOMPRESSED_EXTENSIONS = {
+    "br": ".br",
+    "gzip": ".gz",
+}
+
+
+def hash_file(file_path: str) -> str:
+    sha256 = hashlib.sha256()
+    with open(file_path, "rb") as file:
+        for block in iter(lambda: file.read(1 << 20), b""):
+            sha256.update(block)
+    return sha256.hexdigest()
+
+
+# hashes of the previous build by path
+# a hash is only reused when size and modification time of the file haven't changed, reused slides keep both
+def load_hashes(manifest_file: str) -> Dict[str, Dict]:
+    if not os.path.exists(manifest_file):
+        return {}
+    try:
+        with open(manifest_file, "r", encoding="utf-8") as file:
+            manifest = json.load(file)
+        return {path: {"hash": hash_, "stat": manifest["stats"][path]} for path, hash_ in manifest["assets"].items()}
+    except (OSError, ValueError, KeyError, TypeError):
+        return {}
+
+
+# content hashes of all files the service worker precaches
+# paths are relative to the output folder
+def write_asset_manifest(output_folder: str, paths: List[str]) -> Dict:
+    manifest_file = os.path.join(output_folder, ASSET_MANIFEST_FILENAME)
+    previous = load_hashes(manifest_file)
+    assets: Dict[str, str] = {}
+    stats: Dict[str, List[int]] = {}
+    for path in paths:
+        stat = os.stat(os.path.join(output_folder, path))
+        stats[path] = [stat.st_size, stat.st_mtime_ns]
+        if path in previous and previous[path]["stat"] == stats[path]:
+            assets[path] = previous[path]["hash"]
+        else:
+            assets[path] = hash_file(os.path.join(output_folder, path))
+    version = hashlib.sha256(json.dumps(assets, sort_keys=True).encode("utf-8")).hexdigest()
+    manifest = {
+        "version": version,
+        "assets": assets,
+        "stats": stats,
+    }
+    with open(manifest_file, "w", encoding="utf-8") as file:
+        json.dump(manifest, file)
+    return manifest
+
+
+# the service worker changes with every build that changes any asset, which makes browsers update it
+def write_service_worker(web_folder: str, output_folder: str, manifest: Dict) -> None:
+    with open(os.path.join(web_folder, SERVICE_WORKER_FILENAME), "r", encoding="utf-8") as file:
+        service_worker = file.read()
+    client_manifest = {
+        "version": manifest["version"],
+        "assets": manifest["assets"],
+    }
+    with open(os.path.join(output_folder, SERVICE_WORKER_FILENAME), "w", encoding="utf-8") as file:
+        file.write(f"const ASSET_MANIFEST = {json.dumps(client_manifest)};\n")
+        file.write(service_worker)
+
+
+def get_compressors() -> Dict[str, Callable[[bytes], bytes]]:
+    compressors: Dict[str, Callable[[bytes], bytes]] = {
+        "gzip": lambda data: gzip.compress(data, compresslevel=9),
+    }
+    # brotli is optional
+    try:
+        import brotli
+        compressors["br"] = lambda data: brotli.compress(data, quality=11)
+    except ImportError:
+        pass
+    return compressors
+
+
+# write compressed variants next to the files
+# outdated variants get removed, e.g. when brotli isn't installed anymore or compressing has been disabled
+def write_precompressed(file_paths: List[str], enabled: bool = True) -> None:
+    compressors: Dict[str, Callable[[bytes], bytes]] = get_compressors() if enabled else {}
+    for file_path in file_paths:
+        data: Optional[bytes] = None
+        for coding, extension in PRECOMPRESSED_EXTENSIONS.items():
+            variant = file_path + extension
+            if coding not in compressors:
+                if os.path.exists(variant):
+                    os.remove(variant)
+                continue
+            if data is None:
+                with open(file_path, "rb") as file:
+                    data = file.read()
+            # the menu is shared by presentations rendered at the same time
+            write_atomic(variant, compressors[coding](data))
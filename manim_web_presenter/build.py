@@ -0,0 +1,119 @@
+# render many presentations in parallel, each in its own manim process
+#
+# usage (from the folder the presentation folder should be created in):
+#   python3 -m manim_web_presenter.build lectures/*.py
+#   python3 -m manim_web_presenter.build example.py --jobs 4 --scenes Tutorial -- -ql
+import argparse
+import importlib.util
+import inspect
+import itertools
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, List, Optional, Tuple
+
+import manim
+
+from .wrappers import PresentationMixin
+
+
+# numbers the modules of loaded scene files
+module_counter = itertools.count()
+
+
+# all presentations defined in a scene file by their names
+# the file gets executed again with every call, each time as a new module
+def load_presentations(scene_file: str) -> Dict[str, type]:
+    scene_file = os.path.abspath(scene_file)
+    module_name = f"_manim_web_presenter_build_{next(module_counter)}"
+    spec = importlib.util.spec_from_file_location(module_name, scene_file)
+    if spec is None or spec.loader is None:
+        raise RuntimeError(f"Can't import '{scene_file}'")
+    module = importlib.util.module_from_spec(spec)
+    # classes are looked up by their module, e.g. when pickling them
+    sys.modules[module_name] = module
+    # allow imports relative to the scene file like manim does
+    sys.path.insert(0, os.path.dirname(scene_file))
+    try:
+        spec.loader.exec_module(module)
+    except BaseException:
+        del sys.modules[module_name]
+        raise
+    finally:
+        sys.path.remove(os.path.dirname(scene_file))
+    return {name: value for name, value in inspect.getmembers(module, inspect.isclass)
+            # imported presentations and the wrappers themselves get rendered where they're defined
+            if issubclass(value, PresentationMixin) and value.__module__ == module_name}
+
+
+# names of all presentations defined in a scene file
+def discover_presentations(scene_file: str) -> List[str]:
+    return list(load_presentations(scene_file))
+
+
+# returns success, seconds and the output of manim
+def render_presentation(scene_file: str, presentation_name: str, manim_args: List[str], env: Dict[str, str]) -> Tuple[bool, float, str]:
+    start = time.perf_counter()
+    process = subprocess.run([sys.executable, "-m", "manim", *manim_args, scene_file, presentation_name],
+                             stdout=subprocess.PIPE, stderr=subprocess.STDOUT, env=env)
+    return process.returncode == 0, time.perf_counter() - start, process.stdout.decode("utf-8", errors="replace")
+
+
+# render every presentation of the scene files, optionally only the ones in scenes
+# returns whether each presentation could be rendered, by the presentation names
+def build(scene_files: List[str], jobs: Optional[int] = None, manim_args: Optional[List[str]] = None, scenes: Optional[List[str]] = None) -> Dict[str, bool]:
+    presentations: List[Tuple[str, str]] = []
+    for scene_file in scene_files:
+        for presentation_name in discover_presentations(scene_file):
+            if scenes is None or presentation_name in scenes:
+                presentations.append((scene_file, presentation_name))
+    if len(presentations) == 0:
+        manim.logger.warning("No presentations found")
+        return {}
+
+    cores = os.cpu_count() or 1
+    jobs = min(jobs or cores, len(presentations))
+    env = dict(os.environ)
+    # share the cores between the presentations packaged at the same time
+    env.setdefault("MANIM_WEB_PRESENTER_PACKAGING_WORKERS", str(max(1, cores // jobs)))
+    manim.logger.info(f"Rendering {len(presentations)} presentations with {jobs} processes")
+
+    results: Dict[str, bool] = {}
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        futures = {executor.submit(render_presentation, scene_file, presentation_name, manim_args or [], env): presentation_name
+                   for scene_file, presentation_name in presentations}
+        for future in as_completed(futures):
+            presentation_name = futures[future]
+            success, seconds, output = future.result()
+            results[presentation_name] = success
+            if success:
+                manim.logger.info(f"Rendered '{presentation_name}' in {seconds:.1f}s")
+            else:
+                manim.logger.error(f"Failed to render '{presentation_name}':\n{output}")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Render the presentations of multiple scene files in parallel.",
+                                     epilog="arguments after '--' are handed to manim, e.g. '-- -ql'")
+    parser.add_argument("scene_files", nargs="+", help="files containing presentations")
+    parser.add_argument("-j", "--jobs", type=int, default=None, help="presentations rendered at the same time, amount of cores by default")
+    parser.add_argument("--scenes", nargs="+", default=None, help="only render these presentations")
+    argv = sys.argv[1:]
+    manim_args: List[str] = []
+    if "--" in argv:
+        manim_args = argv[argv.index("--") + 1:]
+        argv = argv[:argv.index("--")]
+    args = parser.parse_args(argv)
+
+    results = build(args.scene_files, args.jobs, manim_args, args.scenes)
+    failed = [name for name, success in results.items() if not success]
+    if len(failed) != 0:
+        manim.logger.error(f"{len(failed)} of {len(results)} presentations failed: {', '.join(failed)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
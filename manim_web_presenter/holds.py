@@ -0,0 +1,41 @@
+import numpy as np
+from typing import Optional, Tuple
+
+from .mp4 import get_dimensions
+from .muxer import Muxer
+
+# frames get scaled down to this width before comparing them
+COMPARE_WIDTH = 160
+# highest difference of a pixel to the last frame that is still considered identical, compensates for encoding noise
+HOLD_TOLERANCE = 2
+
+
+# amount of frames and index of the first frame of the run of frames identical to the last frame the video ends with
+# every frame is compared with the last one, slow fades never count as identical to it even though neighbouring frames barely differ
+# a video that doesn't change at all returns 0 as the first frame
+def find_trailing_hold(muxer: Muxer, video_file: str) -> Tuple[int, int]:
+    width, height = get_dimensions(video_file)
+    if width == 0 or height == 0:
+        return 0, 0
+    # has to be even
+    compare_height = max(2, round(height * COMPARE_WIDTH / width / 2) * 2)
+    frame_size = COMPARE_WIDTH * compare_height
+
+    # the last frame is only known once the video has been decoded entirely
+    # decoding twice keeps only a single block of frames in memory
+    last_frame: Optional[np.ndarray] = None
+    for data in muxer.decode_gray(video_file, COMPARE_WIDTH, compare_height):
+        last_frame = np.frombuffer(data[-frame_size:], dtype=np.uint8).astype(np.int16)
+    if last_frame is None:
+        return 0, 0
+
+    frame_count = 0
+    hold_start = 0
+    for data in muxer.decode_gray(video_file, COMPARE_WIDTH, compare_height):
+        frames = np.frombuffer(data, dtype=np.uint8).reshape(-1, frame_size)
+        differences = np.abs(frames.astype(np.int16) - last_frame).max(axis=1)
+        changed = np.flatnonzero(differences > HOLD_TOLERANCE)
+        if len(changed) != 0:
+            hold_start = frame_count + int(changed[-1]) + 1
+        frame_count += len(frames)
+    return frame_count, hold_start
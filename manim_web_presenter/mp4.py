@@ -0,0 +1,181 @@
+import struct
+from typing import BinaryIO, Iterator, List, Optional, Tuple
+
+# used by the front end when a video can't be probed
+DEFAULT_CODEC = "avc1.64002A"
+
+
+# name, start and end of payload of all boxes in [start, end)
+def iter_boxes(file: BinaryIO, start: int, end: int) -> Iterator[Tuple[str, int, int]]:
+    position = start
+    while position + 8 <= end:
+        file.seek(position)
+        size, name = struct.unpack(">I4s", file.read(8))
+        header = 8
+        if size == 1:
+            size = struct.unpack(">Q", file.read(8))[0]
+            header = 16
+        # box extends to the end of the file
+        elif size == 0:
+            size = end - position
+        if size < header:
+            return
+        yield name.decode("latin-1"), position + header, position + size
+        position += size
+
+
+# payload range of the first box found with path, e.g. ["moov", "mvhd"]
+def find_box(file: BinaryIO, path: List[str], start: int, end: int) -> Optional[Tuple[int, int]]:
+    for name, payload_start, payload_end in iter_boxes(file, start, end):
+        if name == path[0]:
+            if len(path) == 1:
+                return payload_start, payload_end
+            return find_box(file, path[1:], payload_start, payload_end)
+    return None
+
+
+def read_box(file: BinaryIO, path: List[str]) -> Optional[bytes]:
+    file.seek(0, 2)
+    box = find_box(file, path, 0, file.tell())
+    if box is None:
+        return None
+    file.seek(box[0])
+    return file.read(box[1] - box[0])
+
+
+# in seconds, 0 for fragmented files with an empty moov
+def get_duration(video_file: str) -> float:
+    with open(video_file, "rb") as file:
+        mvhd = read_box(file, ["moov", "mvhd"])
+    if mvhd is None:
+        return 0.0
+    if mvhd[0] == 1:
+        timescale, duration = struct.unpack(">IQ", mvhd[20:32])
+    else:
+        timescale, duration = struct.unpack(">II", mvhd[12:20])
+    return duration / timescale if timescale != 0 else 0.0
+
+
+# exact duration of the first track of a fragmented file in seconds, as the browser buffers it
+# sums the durations of all samples in the fragments, 0 when there are none
+def get_fragmented_duration(video_file: str) -> float:
+    with open(video_file, "rb") as file:
+        file.seek(0, 2)
+        file_end = file.tell()
+        moov = find_box(file, ["moov"], 0, file_end)
+        if moov is None:
+            return 0.0
+        tkhd = find_box(file, ["trak", "tkhd"], *moov)
+        mdhd = find_box(file, ["trak", "mdia", "mdhd"], *moov)
+        if tkhd is None or mdhd is None:
+            return 0.0
+        file.seek(tkhd[0])
+        tkhd_data = file.read(tkhd[1] - tkhd[0])
+        track_id = struct.unpack(">I", tkhd_data[20:24] if tkhd_data[0] == 1 else tkhd_data[12:16])[0]
+        file.seek(mdhd[0])
+        mdhd_data = file.read(mdhd[1] - mdhd[0])
+        timescale = struct.unpack(">I", mdhd_data[20:24] if mdhd_data[0] == 1 else mdhd_data[12:16])[0]
+        if timescale == 0:
+            return 0.0
+        # used when neither the fragment nor the sample specify a duration
+        default_duration = 0
+        trex = find_box(file, ["mvex", "trex"], *moov)
+        if trex is not None:
+            file.seek(trex[0])
+            default_duration = struct.unpack(">I", file.read(16)[12:16])[0]
+
+        duration = 0
+        for name, moof_start, moof_end in iter_boxes(file, 0, file_end):
+            if name != "moof":
+                continue
+            for traf_name, traf_start, traf_end in iter_boxes(file, moof_start, moof_end):
+                if traf_name != "traf":
+                    continue
+                duration += get_traf_duration(file, traf_start, traf_end, track_id, default_duration)
+    return duration / timescale
+
+
+# summed sample durations of a track fragment in the timescale of the track, 0 for other tracks
+def get_traf_duration(file: BinaryIO, start: int, end: int, track_id: int, default_duration: int) -> int:
+    tfhd = find_box(file, ["tfhd"], start, end)
+    if tfhd is None:
+        return 0
+    file.seek(tfhd[0])
+    tfhd_data = file.read(tfhd[1] - tfhd[0])
+    flags = int.from_bytes(tfhd_data[1:4], "big")
+    if struct.unpack(">I", tfhd_data[4:8])[0] != track_id:
+        return 0
+    position = 8
+    # base data offset and sample description index come first
+    position += 8 if flags & 0x01 else 0
+    position += 4 if flags & 0x02 else 0
+    if flags & 0x08:
+        default_duration = struct.unpack(">I", tfhd_data[position:position + 4])[0]
+
+    duration = 0
+    for name, trun_start, trun_end in iter_boxes(file, start, end):
+        if name != "trun":
+            continue
+        file.seek(trun_start)
+        trun_data = file.read(trun_end - trun_start)
+        flags = int.from_bytes(trun_data[1:4], "big")
+        sample_count = struct.unpack(">I", trun_data[4:8])[0]
+        if not flags & 0x100:
+            duration += sample_count * default_duration
+            continue
+        # data offset and first sample flags
+        position = 8 + (4 if flags & 0x01 else 0) + (4 if flags & 0x04 else 0)
+        sample_size = 4 * bin(flags & 0xF00).count("1")
+        for sample in range(sample_count):
+            duration += struct.unpack(">I", trun_data[position + sample * sample_size:position + sample * sample_size + 4])[0]
+    return duration
+
+
+# indices of the keyframes of the first track in decoding order, None when every frame is one
+def get_sync_samples(video_file: str) -> Optional[List[int]]:
+    with open(video_file, "rb") as file:
+        stss = read_box(file, ["moov", "trak", "mdia", "minf", "stbl", "stss"])
+    if stss is None:
+        return None
+    entry_count = struct.unpack(">I", stss[4:8])[0]
+    # sample numbers start at 1
+    return [sample - 1 for sample in struct.unpack(f">{entry_count}I", stss[8:8 + 4 * entry_count])]
+
+
+# of the first track
+def get_dimensions(video_file: str) -> Tuple[int, int]:
+    with open(video_file, "rb") as file:
+        tkhd = read_box(file, ["moov", "trak", "tkhd"])
+    if tkhd is None:
+        return 0, 0
+    # 16.16 fixed point numbers at the end of the box
+    width, height = struct.unpack(">II", tkhd[-8:])
+    return width >> 16, height >> 16
+
+
+# decoder configuration of the first track including the parameter sets, None when it isn't h264
+# videos can only be concatenated without re-encoding when theirs are identical
+def get_avc_config(video_file: str) -> Optional[bytes]:
+    with open(video_file, "rb") as file:
+        stsd = read_box(file, ["moov", "trak", "mdia", "minf", "stbl", "stsd"])
+    if stsd is None:
+        return None
+    position = stsd.find(b"avcC")
+    if position < 4:
+        return None
+    size = struct.unpack(">I", stsd[position - 4:position])[0]
+    return stsd[position + 4:position - 4 + size]
+
+
+# RFC 6381 codec string used by MediaSource, e.g. avc1.64002A
+def get_codec_string(video_file: str) -> str:
+    with open(video_file, "rb") as file:
+        stsd = read_box(file, ["moov", "trak", "mdia", "minf", "stbl", "stsd"])
+    if stsd is None:
+        return DEFAULT_CODEC
+    position = stsd.find(b"avcC")
+    if position == -1 or len(stsd) < position + 8:
+        return DEFAULT_CODEC
+    # configuration version, profile, profile compatibility, level
+    profile, compatibility, level = stsd[position + 5:position + 8]
+    return f"avc1.{profile:02X}{compatibility:02X}{level:02X}"
@@ -0,0 +1,262 @@
+import manim
+import json
+import os
+import subprocess
+import time
+from abc import ABC, abstractmethod
+from fractions import Fraction
+from typing import Any, Dict, Iterator, List, Optional
+
+FRAGMENT_FLAGS = "frag_keyframe+empty_moov+default_base_moof"
+# decoded frames handed over at once
+FRAMES_PER_READ = 256
+# ffprobe's profile names as understood by libx264
+X264_PROFILES = {
+    "Constrained Baseline": "baseline",
+    "Baseline": "baseline",
+    "Main": "main",
+    "High": "high",
+    "High 10": "high10",
+    "High 4:2:2": "high422",
+    "High 4:4:4 Predictive": "high444",
+}
+# stream properties written to the sequence parameter set, passed on as the ffmpeg option of the same value
+COLOR_OPTIONS = {
+    "color_range": "-color_range",
+    "color_space": "-colorspace",
+    "color_primaries": "-color_primaries",
+    "color_transfer": "-color_trc",
+}
+
+
+class MuxerError(RuntimeError):
+    pass
+
+
+# concat demuxer line for file outside of the folder of the index file
+def get_concat_line(src_file: str) -> str:
+    escaped = os.path.abspath(src_file).replace("'", "'\\''")
+    return f"file '{escaped}'\n"
+
+
+# combine videos without re-encoding
+# every operation is recorded in runs
+class Muxer(ABC):
+    def __init__(self, tmp_folder: str, loglevel: str, timeout: Optional[float]):
+        # only used by this muxer
+        self.tmp_folder = tmp_folder
+        self.loglevel = loglevel
+        self.timeout = timeout
+        self.runs: List[Dict[str, Any]] = []
+
+    def record(self, operation: str, start: float, exit_code: Optional[int]) -> None:
+        self.runs.append({
+            "operation": operation,
+            "seconds": time.perf_counter() - start,
+            "exit_code": exit_code,
+        })
+
+    # fragmented output is required by the front end
+    @abstractmethod
+    def concat(self, src_files: List[str], dst_file: str, fragment: bool) -> None:
+        pass
+
+    # re-encode with ffmpeg's default settings like the original two pass packaging did
+    @abstractmethod
+    def fragment(self, src_file: str, dst_file: str) -> None:
+        pass
+
+    # re-encode fragmented video with lower height
+    @abstractmethod
+    def transcode(self, src_file: str, dst_file: str, height: int) -> None:
+        pass
+
+    # save first or last frame as jpeg
+    @abstractmethod
+    def extract_frame(self, src_file: str, dst_file: str, last: bool) -> None:
+        pass
+
+    # only keep the first frames without re-encoding, has to end right before a keyframe
+    @abstractmethod
+    def cut(self, src_file: str, dst_file: str, frames: int) -> None:
+        pass
+
+    # re-encode the frames in [start_frame, end_frame) with the profile, level, frame rate, time base and pixel format of the source
+    # so that they can be concatenated with frames copied from it
+    @abstractmethod
+    def encode_frames(self, src_file: str, dst_file: str, start_frame: int, end_frame: int) -> None:
+        pass
+
+    # frames scaled to width and height as 8 bit gray images, multiple frames per yielded block
+    # neither duplicates nor drops frames, the n-th frame is the n-th sample in presentation order
+    @abstractmethod
+    def decode_gray(self, src_file: str, width: int, height: int) -> Iterator[bytes]:
+        pass
+
+
+# run ffmpeg with argument lists, capturing its output
+class SubprocessMuxer(Muxer):
+    def run_ffmpeg(self, operation: str, args: List[str]) -> None:
+        command = ["ffmpeg", "-hide_banner", "-nostdin", "-loglevel", self.loglevel, "-y", *args]
+        start = time.perf_counter()
+        try:
+            process = subprocess.run(command, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, timeout=self.timeout)
+        except subprocess.TimeoutExpired:
+            self.record(operation, start, None)
+            raise MuxerError(f"ffmpeg {operation} timed out after {self.timeout} seconds")
+        self.record(operation, start, process.returncode)
+
+        log = process.stderr.decode("utf-8", errors="replace").strip()
+        if process.returncode != 0:
+            raise MuxerError(f"ffmpeg {operation} exited with {process.returncode}: {log}")
+        if log != "":
+            manim.logger.debug(log)
+
+    # properties of the first video stream
+    def probe_video(self, src_file: str) -> Dict[str, Any]:
+        command = ["ffprobe", "-hide_banner", "-loglevel", "error", "-select_streams", "v:0",
+                   "-show_entries", "stream=profile,level,r_frame_rate,time_base,pix_fmt," + ",".join(COLOR_OPTIONS), "-of", "json", src_file]
+        start = time.perf_counter()
+        try:
+            process = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, timeout=self.timeout)
+        except subprocess.TimeoutExpired:
+            self.record("probe_video", start, None)
+            raise MuxerError(f"ffprobe timed out after {self.timeout} seconds")
+        self.record("probe_video", start, process.returncode)
+        if process.returncode != 0:
+            raise MuxerError(f"ffprobe exited with {process.returncode}: {process.stderr.decode('utf-8', errors='replace').strip()}")
+        streams = json.loads(process.stdout.decode("utf-8")).get("streams", [])
+        if len(streams) == 0:
+            raise MuxerError(f"'{src_file}' doesn't contain a video stream")
+        return streams[0]
+
+    def concat(self, src_files: List[str], dst_file: str, fragment: bool) -> None:
+        index_file = os.path.join(self.tmp_folder, "animations.txt")
+        with open(index_file, "w", encoding="utf-8") as file:
+            for src_file in src_files:
+                file.write(get_concat_line(src_file))
+        args = ["-f", "concat", "-safe", "0", "-i", index_file, "-c", "copy"]
+        if fragment:
+            args += ["-movflags", FRAGMENT_FLAGS]
+        self.run_ffmpeg("concat", args + [dst_file])
+
+    def fragment(self, src_file: str, dst_file: str) -> None:
+        self.run_ffmpeg("fragment", ["-i", src_file, "-movflags", FRAGMENT_FLAGS, dst_file])
+
+    # width keeps the aspect ratio but has to be even
+    def transcode(self, src_file: str, dst_file: str, height: int) -> None:
+        self.run_ffmpeg("transcode", ["-i", src_file, "-vf", f"scale=-2:{height}", "-c:v", "libx264", "-preset", "veryfast", "-pix_fmt", "yuv420p",
+                                      "-movflags", FRAGMENT_FLAGS, dst_file])
+
+    def extract_frame(self, src_file: str, dst_file: str, last: bool) -> None:
+        if last:
+            # decode only the end, every frame overwrites the image
+            args = ["-sseof", "-1", "-i", src_file, "-update", "1"]
+        else:
+            args = ["-i", src_file, "-frames:v", "1"]
+        self.run_ffmpeg("extract_frame", args + ["-an", "-q:v", "3", dst_file])
+
+    def cut(self, src_file: str, dst_file: str, frames: int) -> None:
+        self.run_ffmpeg("cut", ["-i", src_file, "-an", "-frames:v", str(frames), "-c", "copy", dst_file])
+
+    # manim encodes with libx264's defaults, the same settings result in the same parameter sets
+    def encode_frames(self, src_file: str, dst_file: str, start_frame: int, end_frame: int) -> None:
+        stream = self.probe_video(src_file)
+        args = ["-i", src_file, "-an", "-vf", f"trim=start_frame={start_frame}:end_frame={end_frame},setpts=PTS-STARTPTS",
+                "-c:v", "libx264", "-pix_fmt", stream.get("pix_fmt", "yuv420p"), "-r", stream["r_frame_rate"]]
+        if stream.get("profile") in X264_PROFILES:
+            args += ["-profile:v", X264_PROFILES[stream["profile"]]]
+        # e.g. 42 for level 4.2
+        if stream.get("level", 0) > 0:
+            args += ["-level:v", f"{stream['level'] // 10}.{stream['level'] % 10}"]
+        for name, option in COLOR_OPTIONS.items():
+            if stream.get(name, "unknown") != "unknown":
+                args += [option, stream[name]]
+        # e.g. 1/15360
+        args += ["-video_track_timescale", stream["time_base"].split("/")[1]]
+        self.run_ffmpeg("encode_frames", args + [dst_file])
+
+    # frames get read while ffmpeg is still decoding
+    def decode_gray(self, src_file: str, width: int, height: int) -> Iterator[bytes]:
+        command = ["ffmpeg", "-hide_banner", "-nostdin", "-loglevel", self.loglevel,
+                   "-i", src_file, "-an", "-vsync", "passthrough", "-vf", f"scale={width}:{height},format=gray", "-f", "rawvideo", "-"]
+        frame_size = width * height
+        start = time.perf_counter()
+        process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+        assert process.stdout is not None
+        try:
+            while True:
+                data = process.stdout.read(frame_size * FRAMES_PER_READ)
+                # incomplete frames only occur when ffmpeg failed
+                data = data[:len(data) - len(data) % frame_size]
+                if len(data) == 0:
+                    break
+                yield data
+        finally:
+            process.stdout.close()
+            exit_code = process.wait(self.timeout)
+            self.record("decode_gray", start, exit_code)
+        if exit_code != 0:
+            raise MuxerError(f"ffmpeg decode_gray exited with {exit_code}")
+
+
+# remux inside of this process with PyAV
+# avoids starting a process per slide, anything but remuxing still runs ffmpeg, including fragment which re-encodes
+class PyAVMuxer(SubprocessMuxer):
+    def __init__(self, tmp_folder: str, loglevel: str, timeout: Optional[float]):
+        super().__init__(tmp_folder, loglevel, timeout)
+        try:
+            import av
+        except ImportError as e:
+            raise MuxerError("The 'pyav' muxer requires PyAV 14 or newer, install it with 'pip3 install \"av>=14\"'") from e
+        self.av = av
+
+    # first video and audio stream of every file, like ffmpeg's default stream selection
+    def get_streams(self, input_file) -> List[Any]:
+        return list(input_file.streams.video[:1]) + list(input_file.streams.audio[:1])
+
+    def concat(self, src_files: List[str], dst_file: str, fragment: bool) -> None:
+        start = time.perf_counter()
+        options = {"movflags": FRAGMENT_FLAGS} if fragment else {}
+        try:
+            with self.av.open(dst_file, "w", format="mp4", options=options) as output:
+                out_streams: Optional[List[Any]] = None
+                # in seconds
+                offset = Fraction(0)
+                for src_file in src_files:
+                    with self.av.open(src_file) as input_file:
+                        in_streams = self.get_streams(input_file)
+                        if out_streams is None:
+                            out_streams = [output.add_stream_from_template(in_stream) for in_stream in in_streams]
+                        elif [in_stream.type for in_stream in in_streams] != [out_stream.type for out_stream in out_streams]:
+                            raise MuxerError(f"'{src_file}' has other streams than '{src_files[0]}'")
+                        stream_map = {in_stream.index: out_stream for in_stream, out_stream in zip(in_streams, out_streams)}
+                        # the next file starts after the longest stream of this one
+                        end = offset
+                        for packet in input_file.demux(in_streams):
+                            # the demuxer yields empty packets for flushing
+                            if packet.dts is None or packet.pts is None:
+                                continue
+                            shift = round(offset / packet.time_base)
+                            packet.pts += shift
+                            packet.dts += shift
+                            end = max(end, (packet.pts + (packet.duration or 0)) * packet.time_base)
+                            packet.stream = stream_map[packet.stream.index]
+                            output.mux(packet)
+                        offset = end
+        except (self.av.FFmpegError, MuxerError) as e:
+            self.record("concat", start, 1)
+            raise MuxerError(f"PyAV failed to combine '{dst_file}': {e}") from e
+        self.record("concat", start, 0)
+
+
+MUXERS = {
+    "subprocess": SubprocessMuxer,
+    "pyav": PyAVMuxer,
+}
+
+
+def create_muxer(name: str, tmp_folder: str, loglevel: str, timeout: Optional[float]) -> Muxer:
+    if name not in MUXERS:
+        raise ValueError(f"Unknown muxer '{name}', use one of {', '.join(MUXERS)}")
+    return MUXERS[name](tmp_folder, loglevel, timeout)
@@ -0,0 +1,428 @@
+import manim
+import os
+import shutil
+import json
+import hashlib
+import time
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+from .muxer import FRAGMENT_FLAGS, Muxer, create_muxer
+from .mp4 import get_avc_config, get_codec_string, get_dimensions, get_duration, get_fragmented_duration, get_sync_samples
+from .assets import hash_file
+from .holds import find_trailing_hold
+
+MANIFEST_FILENAME = "build_manifest.json"
+# bump when the output of package_slide changes for the same input
+MANIFEST_VERSION = 8
+# folder in the output folder containing the segments of a presentation
+SEGMENT_FOLDERNAME = "segments"
+# settings that don't change the produced files
+NON_OUTPUT_OPTIONS = ["packaging_workers", "packaging_executor", "incremental", "muxer_timeout", "movie_file", "packed", "index_chunk_size", "precompress", "thumbnail_height", "build_report", "print_build_report", "ffmpeg_loglevel"]
+
+
+# linux ioctl sharing the extents of two files on copy-on-write file systems
+FICLONE = 0x40049409
+
+
+def reflink_file(src_file: str, dst_file: str) -> bool:
+    try:
+        import fcntl
+    except ImportError:
+        return False
+    with open(src_file, "rb") as src, open(dst_file, "wb") as dst:
+        try:
+            fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+            return True
+        except OSError:
+            pass
+    os.remove(dst_file)
+    return False
+
+
+# let the kernel copy without passing the data through this process
+def copy_file_range(src_file: str, dst_file: str) -> bool:
+    if not hasattr(os, "copy_file_range"):
+        return False
+    with open(src_file, "rb") as src, open(dst_file, "wb") as dst:
+        try:
+            remaining = os.fstat(src.fileno()).st_size
+            while remaining > 0:
+                copied = os.copy_file_range(src.fileno(), dst.fileno(), remaining)
+                if copied == 0:
+                    break
+                remaining -= copied
+            if remaining == 0:
+                return True
+        except OSError:
+            pass
+    os.remove(dst_file)
+    return False
+
+
+# duplicate file as cheap as the file system allows
+# returns the method that has been used
+def link_or_copy(src_file: str, dst_file: str) -> str:
+    if os.path.lexists(dst_file):
+        os.remove(dst_file)
+    if reflink_file(src_file, dst_file):
+        return "reflink"
+    try:
+        os.link(src_file, dst_file)
+        return "hardlink"
+    except OSError:
+        pass
+    if copy_file_range(src_file, dst_file):
+        return "copy_file_range"
+    shutil.copyfile(src_file, dst_file)
+    return "copy"
+
+
+# identify the packaged output of a slide
+# manim names partial movie files after the hash of their animation
+# None when the animations can't be identified, e.g. when manim's caching is disabled
+def get_build_key(src_files: List[str], slide_type: str, options: Dict[str, Any]) -> Optional[str]:
+    animations = [os.path.basename(src_file) for src_file in src_files]
+    if any(animation.startswith("uncached_") for animation in animations):
+        return None
+    output_options = {name: value for name, value in options.items() if name not in NON_OUTPUT_OPTIONS}
+    key_data = json.dumps({
+        "version": MANIFEST_VERSION,
+        "fragment_flags": FRAGMENT_FLAGS,
+        "animations": animations,
+        # manim's folder of the partial movie files contains the scene, resolution and frame rate, the names only depend on the animation
+        "folders": sorted({os.path.dirname(os.path.abspath(src_file)) for src_file in src_files}),
+        # decides whether holds get trimmed
+        "slide_type": slide_type,
+        "options": output_options,
+    }, sort_keys=True)
+    return hashlib.sha256(key_data.encode("utf-8")).hexdigest()
+
+
+# results of previous render, empty when there is none
+def load_manifest(manifest_file: str) -> List[Dict[str, Any]]:
+    if not os.path.exists(manifest_file):
+        return []
+    try:
+        with open(manifest_file, "r", encoding="utf-8") as file:
+            manifest = json.load(file)
+    except (OSError, ValueError):
+        manim.logger.warning(f"Ignoring broken build manifest '{manifest_file}'")
+        return []
+    if manifest.get("version") != MANIFEST_VERSION:
+        return []
+    return manifest["slides"]
+
+
+def write_manifest(manifest_file: str, results: List[Dict[str, Any]]) -> None:
+    with open(manifest_file, "w", encoding="utf-8") as file:
+        json.dump({
+            "version": MANIFEST_VERSION,
+            # reports only describe a single render
+            "slides": [{name: value for name, value in result.items() if name != "report"} for result in results],
+        }, file)
+
+
+# everything a worker needs to package a single slide
+# has to be picklable to be sent to other processes
+class SlideJob:
+    def __init__(self, slide_id: int, slide_type: str, name: str, key: Optional[str], src_files: List[str], tmp_folder: str, dst_file: str, segment_folder: str, options: Dict[str, Any]):
+        self.slide_id = slide_id
+        self.slide_type = slide_type
+        self.key = key
+        self.name = name
+        self.src_files = src_files
+        # only used by this slide
+        self.tmp_folder = tmp_folder
+        self.dst_file = dst_file
+        # shared by all presentations
+        self.segment_folder = segment_folder
+        self.options = options
+
+
+# read animations where they are and write fragmented video straight to the output folder
+def package_single_pass(job: SlideJob, muxer: Muxer) -> None:
+    manim.logger.info(f"Combining and fragmenting animations for slide '{job.name}'...")
+    muxer.concat(job.src_files, job.dst_file, True)
+
+
+# copy animations into the scratch folder of the slide, concatenate and fragment them afterwards
+# unlike the single pass, fragmenting re-encodes the slide
+def package_with_copies(job: SlideJob, muxer: Muxer) -> None:
+    # copy and fragment videos -> needed by front end
+    copies: List[str] = []
+    for idx, src_file in enumerate(job.src_files):
+        copies.append(os.path.join(job.tmp_folder, f"{idx}.mp4"))
+        shutil.copyfile(src_file, copies[-1])
+
+    # combine animations
+    full_tmp_file = os.path.join(job.tmp_folder, "out.mp4")
+    manim.logger.info(f"Combining animations for slide '{job.name}'...")
+    muxer.concat(copies, full_tmp_file, False)
+    manim.logger.info(f"Fragmenting concatenated animations for slide '{job.name}'...")
+    muxer.fragment(full_tmp_file, job.dst_file)
+
+
+# everything the front end needs to choose between renditions
+def get_rendition_info(video_file: str, duration: float) -> Dict[str, Any]:
+    width, height = get_dimensions(video_file)
+    size = os.path.getsize(video_file)
+    return {
+        "video": os.path.basename(video_file),
+        "codec": get_codec_string(video_file),
+        "width": width,
+        "height": height,
+        "size": size,
+        # bits per second
+        "bitrate": round(size * 8 / duration) if duration > 0 else 0,
+    }
+
+
+# lower resolution versions of the slide for slow connections
+# the first rendition is the slide video itself
+def create_renditions(job: SlideJob, muxer: Muxer, duration: float) -> List[Dict[str, Any]]:
+    renditions = [get_rendition_info(job.dst_file, duration)]
+    for height in sorted(set(job.options["renditions"]), reverse=True):
+        if height >= renditions[0]["height"]:
+            continue
+        rendition_file = os.path.join(os.path.dirname(job.dst_file), f"{job.slide_id}_{height}p.mp4")
+        manim.logger.info(f"Transcoding slide '{job.name}' to {height}p...")
+        muxer.transcode(job.dst_file, rendition_file, height)
+        renditions.append(get_rendition_info(rendition_file, duration))
+    return renditions
+
+
+# every animation fragmented on its own, stored once for all presentations
+# named after the content of the animation, manim's hash doesn't include the quality it has been rendered with
+# each presentation links the segments it uses into its own segments folder, which keeps them in the scope of its service worker
+def create_segments(job: SlideJob, muxer: Muxer) -> List[Dict[str, Any]]:
+    output_folder = os.path.dirname(job.dst_file)
+    segments: List[Dict[str, Any]] = []
+    for src_file in job.src_files:
+        name = f"{hash_file(src_file)[:32]}.mp4"
+        shared_file = os.path.join(job.segment_folder, name)
+        if not os.path.exists(shared_file):
+            tmp_file = os.path.join(job.tmp_folder, "segment.mp4")
+            muxer.concat([src_file], tmp_file, True)
+            # other presentations may create the same segment at the same time
+            os.replace(tmp_file, shared_file)
+        segment_file = os.path.join(output_folder, SEGMENT_FOLDERNAME, name)
+        if not os.path.exists(segment_file):
+            tmp_file = os.path.join(job.tmp_folder, "segment_link.mp4")
+            link_or_copy(shared_file, tmp_file)
+            # other slides may use the same segment
+            os.replace(tmp_file, segment_file)
+        segments.append({
+            "video": f"{SEGMENT_FOLDERNAME}/{name}",
+            "size": os.path.getsize(segment_file),
+            # the continuous loader places the segments one after another, as the browser buffers them
+            # in seconds
+            "duration": get_fragmented_duration(segment_file) or get_duration(src_file),
+        })
+    return segments
+
+
+# cut the identical frames the last animation of the slide ends with, e.g. from self.wait()
+# the trimmed copy replaces the animation, returns the removed seconds the front end keeps showing the last frame for
+# earlier animations are followed by other animations and never hold the slide
+def trim_hold(job: SlideJob, muxer: Muxer) -> float:
+    # loops have to be played entirely
+    if job.slide_type not in ["normal", "skip"]:
+        return 0.0
+    src_file = job.src_files[-1]
+    frame_count, hold_start = find_trailing_hold(muxer, src_file)
+    # the first frame of the hold stays, it's shown while holding
+    kept_frames = hold_start + 1
+    if kept_frames >= frame_count:
+        return 0.0
+    duration = get_duration(src_file)
+    if (frame_count - kept_frames) * duration / frame_count < job.options["min_hold"]:
+        return 0.0
+
+    # manim's animations use closed GOPs, frames before a keyframe never refer to the keyframe or frames after it
+    # everything before the last keyframe up to the cut gets copied, the frames after it get re-encoded
+    sync_samples = get_sync_samples(src_file)
+    keyframe = kept_frames if sync_samples is None else max((sample for sample in sync_samples if sample <= kept_frames), default=0)
+    trimmed_files: List[str] = []
+    if keyframe > 0:
+        trimmed_files.append(os.path.join(job.tmp_folder, "hold_head.mp4"))
+        muxer.cut(src_file, trimmed_files[-1], keyframe)
+    if keyframe < kept_frames:
+        trimmed_files.append(os.path.join(job.tmp_folder, "hold_tail.mp4"))
+        muxer.encode_frames(src_file, trimmed_files[-1], keyframe, kept_frames)
+        # the slide gets stream-copied, decoders only know the parameter sets of the first animation
+        if get_avc_config(trimmed_files[-1]) != get_avc_config(src_file):
+            manim.logger.warning(f"Keeping hold of slide '{job.name}', the re-encoded frames can't be combined with the animation")
+            return 0.0
+    job.src_files = job.src_files[:-1] + trimmed_files
+    return max(0.0, duration - sum(get_duration(trimmed_file) for trimmed_file in trimmed_files))
+
+
+# first and last frame of the slide shown while its video is loading
+def create_posters(job: SlideJob, muxer: Muxer) -> Dict[str, str]:
+    output_folder = os.path.dirname(job.dst_file)
+    posters = {
+        "first": f"{job.slide_id}_first.jpg",
+        "last": f"{job.slide_id}_last.jpg",
+    }
+    # the animations know their duration, unlike the fragmented slide
+    muxer.extract_frame(job.src_files[0], os.path.join(output_folder, posters["first"]), False)
+    muxer.extract_frame(job.src_files[-1], os.path.join(output_folder, posters["last"]), True)
+    return posters
+
+
+# executed by the workers of the SlidePackager
+def package_slide(job: SlideJob) -> Dict[str, Any]:
+    start = time.perf_counter()
+    os.mkdir(job.tmp_folder)
+    muxer = create_muxer(job.options["muxer"], job.tmp_folder, job.options["ffmpeg_loglevel"], job.options["muxer_timeout"] or None)
+    hold = trim_hold(job, muxer) if job.options["trim_holds"] else 0.0
+    if job.options["single_pass"]:
+        package_single_pass(job, muxer)
+    else:
+        package_with_copies(job, muxer)
+
+    # fragmented files don't store their duration up front
+    # the samples are summed up instead, loops have to be restarted exactly when their last frame ends
+    duration = get_fragmented_duration(job.dst_file) or sum(get_duration(src_file) for src_file in job.src_files)
+    renditions = create_renditions(job, muxer, duration)
+    posters = create_posters(job, muxer) if job.options["posters"] else {}
+    segments = create_segments(job, muxer) if job.options["segments"] else []
+
+    shutil.rmtree(job.tmp_folder)
+    files = [rendition["video"] for rendition in renditions] + list(posters.values())
+    output_folder = os.path.dirname(job.dst_file)
+    index: Dict[str, Any] = {
+        "size": os.path.getsize(job.dst_file),
+        # in seconds
+        "duration": duration,
+        "renditions": renditions,
+    }
+    if posters:
+        index["posters"] = posters
+    if segments:
+        index["segments"] = segments
+    if hold > 0:
+        # in seconds
+        index["hold"] = hold
+    return {
+        "slide_id": job.slide_id,
+        "key": job.key,
+        # all files in the output folder belonging to this slide, all starting with the slide id
+        "files": files,
+        # added to the slide in the index
+        "index": index,
+        "report": {
+            "reused": False,
+            "seconds": time.perf_counter() - start,
+            "runs": muxer.runs,
+            "bytes": sum(os.path.getsize(os.path.join(output_folder, file)) for file in files),
+        },
+    }
+
+
+# move files of reused result to the ones of the new slide id
+def relocate_result(result: Dict[str, Any], src_folder: str, dst_folder: str, slide_id: int) -> Dict[str, Any]:
+    old_prefix = str(result["slide_id"])
+    renames: Dict[str, str] = {}
+    for old_file in result["files"]:
+        new_file = str(slide_id) + old_file[len(old_prefix):]
+        os.replace(os.path.join(src_folder, old_file), os.path.join(dst_folder, new_file))
+        renames[old_file] = new_file
+
+    # update every mention of the moved files
+    def rename(value: Any) -> Any:
+        if isinstance(value, str):
+            return renames.get(value, value)
+        if isinstance(value, list):
+            return [rename(item) for item in value]
+        if isinstance(value, dict):
+            return {name: rename(item) for name, item in value.items()}
+        return value
+    relocated = rename(result)
+    relocated["slide_id"] = slide_id
+    relocated["report"] = {
+        "reused": True,
+        "seconds": 0.0,
+        "runs": [],
+        "bytes": sum(os.path.getsize(os.path.join(dst_folder, file)) for file in relocated["files"]),
+    }
+    return relocated
+
+
+# package slides on a pool of workers
+# slides whose animations haven't changed since the previous render get reused
+class SlidePackager:
+    def __init__(self, tmp_folder: str, output_folder: str, segment_folder: str, options: Dict[str, Any], previous_results: Optional[List[Dict[str, Any]]] = None):
+        self.tmp_folder = tmp_folder
+        self.output_folder = output_folder
+        self.segment_folder = segment_folder
+        self.options = options
+        if options["segments"]:
+            os.makedirs(segment_folder, exist_ok=True)
+            os.makedirs(os.path.join(output_folder, SEGMENT_FOLDERNAME), exist_ok=True)
+
+        # move previous output out of the way, new slides may take over their file names
+        self.reuse_folder = os.path.join(tmp_folder, "reuse")
+        os.mkdir(self.reuse_folder)
+        self.reusable: Dict[str, Tuple[str, Dict[str, Any]]] = {}
+        for result in previous_results or []:
+            key = result["key"]
+            if key is None or key in self.reusable:
+                continue
+            if not all(os.path.exists(os.path.join(output_folder, file)) for file in result["files"]):
+                continue
+            # the segments might have been deleted
+            if not all(os.path.exists(os.path.join(output_folder, segment["video"])) for segment in result["index"].get("segments", [])):
+                continue
+            stage_folder = os.path.join(self.reuse_folder, key)
+            os.mkdir(stage_folder)
+            for file in result["files"]:
+                os.replace(os.path.join(output_folder, file), os.path.join(stage_folder, file))
+            self.reusable[key] = (stage_folder, result)
+
+        executor_class = ProcessPoolExecutor if options["packaging_executor"] == "process" else ThreadPoolExecutor
+        self.executor: Executor = executor_class(max_workers=max(1, options["packaging_workers"]))
+        self.jobs: List[Tuple[Any, Future]] = []
+
+    # slide has to provide slide_id, slide_type, name and set_video
+    def submit(self, slide, src_files: List[str]) -> None:
+        video = f"{slide.slide_id}.mp4"
+        slide.set_video(video)
+        key = get_build_key(src_files, slide.slide_type, self.options)
+        if key is not None and key in self.reusable:
+            stage_folder, result = self.reusable.pop(key)
+            manim.logger.info(f"Reusing unchanged slide '{slide.name}'")
+            future: Future = Future()
+            future.set_result(relocate_result(result, stage_folder, self.output_folder, slide.slide_id))
+            self.jobs.append((slide, future))
+            return
+
+        job = SlideJob(slide.slide_id,
+                       slide.slide_type,
+                       slide.name,
+                       key,
+                       list(src_files),
+                       os.path.join(self.tmp_folder, str(slide.slide_id)),
+                       os.path.join(self.output_folder, video),
+                       self.segment_folder,
+                       self.options)
+        self.jobs.append((slide, self.executor.submit(package_slide, job)))
+
+    # block until every submitted slide has been packaged
+    # all failures are reported before giving up
+    def wait(self) -> Dict[int, Dict[str, Any]]:
+        results: Dict[int, Dict[str, Any]] = {}
+        failed: List[str] = []
+        for slide, future in self.jobs:
+            try:
+                results[slide.slide_id] = future.result()
+            except Exception as e:
+                manim.logger.error(f"Failed to package slide '{slide.name}': {e}")
+                failed.append(slide.name)
+        self.executor.shutdown()
+        # previous output that hasn't been reused
+        shutil.rmtree(self.reuse_folder)
+        if len(failed) != 0:
+            raise RuntimeError(f"{len(failed)} of {len(self.jobs)} slides failed to be packaged: {', '.join(repr(name) for name in failed)}")
+        return results
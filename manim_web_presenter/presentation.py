@@ -3,15 +3,33 @@ import os
 import shutil
 import json
 import pathlib
-from jinja2 import Template, StrictUndefined
+import re
+import time
 from typing import List, Optional, Dict
 
+from .settings import presenter_config
+from .packaging import SlidePackager, MANIFEST_FILENAME, SEGMENT_FOLDERNAME, load_manifest, write_manifest, link_or_copy
+from .muxer import create_muxer
+from .report import BuildReport, REPORT_FILENAME
+from .assets import write_asset_manifest, write_service_worker, write_precompressed, SERVICE_WORKER_FILENAME
+from .locking import file_lock, write_atomic
+from .sprites import write_sprite_sheet
+
 FILE_DIR_PATH = pathlib.Path(__file__).parent.resolve()
 GLOBAL_OUTPUT_FOLDER = "presentation"
+PACK_FILENAME = "slides.pack"
+PRESENTATION_INDEX_FILENAME = "presentation_index.json"
+SPRITE_FILENAME = "timeline.jpg"
+# further parts of the index, numbered from 1
+INDEX_CHUNK_PATTERN = re.compile(r"index_\d+\.json")
+# animations shared by all presentations
+SEGMENT_FOLDER = os.path.join(GLOBAL_OUTPUT_FOLDER, "segments")
 
 
 # copy file with jinja2 templating
 def write_template(in_file: str, out_file: str, **kwargs):
+    # only needed once rendering has finished
+    from jinja2 import Template, StrictUndefined
     with open(in_file, "r", encoding="utf-8") as file:
         template = Template(file.read(), undefined=StrictUndefined)
     out = template.render(**kwargs)
@@ -19,34 +37,18 @@ def write_template(in_file: str, out_file: str, **kwargs):
         file.write(out)
 
 
-# intended for writing templated python files
-def write_python_template(in_file: str, out_file: str, **kwargs):
-    with open(in_file, "r", encoding="utf-8") as file:
-        template = Template(file.read(), undefined=StrictUndefined)
-    out = template.render(**kwargs)
-    with open(out_file, "w", encoding="utf-8") as file:
-        file.write("# This file has been automatically created with jinja2, any edits in this file will be overwritten!\n")
-        file.write(out)
-
-
-def get_inheritors(class_):
-    subclasses = {class_}
-    q = [class_]
-    while q:
-        parent = q.pop()
-        for child in parent.__subclasses__():
-            if child not in subclasses:
-                subclasses.add(child)
-                q.append(child)
-    return subclasses
-
-
-def ffmpeg_concat(index_file: str, out_file: str) -> bool:
-    return os.system(f"ffmpeg -loglevel {manim.config.ffmpeg_loglevel.lower()} -y -f concat -i {index_file} -c copy {out_file}") == 0
-
-
-def ffmpeg_fragment(src_file: str, dst_file: str) -> bool:
-    return os.system(f"ffmpeg -loglevel {manim.config.ffmpeg_loglevel.lower()} -y -i {src_file} -movflags frag_keyframe+empty_moov+default_base_moof {dst_file}") == 0
+# add presentation to the list shown by the menu
+# presentations can be rendered by multiple processes at the same time
+def update_presentation_index(presentation_name: str) -> None:
+    presentation_index_path = os.path.join(GLOBAL_OUTPUT_FOLDER, PRESENTATION_INDEX_FILENAME)
+    with file_lock(os.path.join(GLOBAL_OUTPUT_FOLDER, f".{PRESENTATION_INDEX_FILENAME}.lock")):
+        presentation_index: List[str] = []
+        if os.path.exists(presentation_index_path):
+            with open(presentation_index_path, "r", encoding="utf-8") as file:
+                presentation_index = json.load(file)
+        if presentation_name not in presentation_index:
+            presentation_index.append(presentation_name)
+            write_atomic(presentation_index_path, json.dumps(presentation_index).encode("utf-8"))
 
 
 # represent
@@ -61,6 +63,8 @@ class Slide:
         # exclusive
         self.after_last_animation = first_animation
         self.video = ""
+        # added to the index by the packager, e.g. the size of the video
+        self.packaging_info: Dict = {}
 
     def empty(self) -> bool:
         return self.first_animation == self.after_last_animation
@@ -68,6 +72,9 @@ class Slide:
     def set_video(self, video: str) -> None:
         self.video = video
 
+    def add_packaging_info(self, packaging_info: Dict) -> None:
+        self.packaging_info.update(packaging_info)
+
     def get_dict(self) -> Dict:
         return {
             "slide_type": self.slide_type,
@@ -76,6 +83,7 @@ class Slide:
             "first_animation": self.first_animation,
             "after_last_animation": self.after_last_animation,
             "video": self.video,
+            **self.packaging_info,
         }
 
     def __repr__(self):
@@ -95,38 +103,45 @@ class RawPresentation:
         self.next_animation = 0
 
         # keep other presentations
-        if not os.path.exists(GLOBAL_OUTPUT_FOLDER):
-            os.mkdir(GLOBAL_OUTPUT_FOLDER)
+        os.makedirs(GLOBAL_OUTPUT_FOLDER, exist_ok=True)
 
         self.web_folder = os.path.join(FILE_DIR_PATH, "web")
 
         presentation_name = type(owner).__name__
-        if presentation_name == "tmp":
-            raise RuntimeError("The Presentation can't be called 'tmp'")
+        if presentation_name in ["tmp", "segments"]:
+            raise RuntimeError(f"The Presentation can't be called '{presentation_name}'")
 
-        # update presentation index
-        presentation_index_path = os.path.join(GLOBAL_OUTPUT_FOLDER, "presentation_index.json")
-        presentation_index: List[str] = []
-        if os.path.exists(presentation_index_path):
-            with open(presentation_index_path, "r", encoding="utf-8") as file:
-                presentation_index = json.load(file)
-        if presentation_name not in presentation_index:
-            presentation_index.append(presentation_name)
-        with open(presentation_index_path, "w", encoding="utf-8") as file:
-            json.dump(presentation_index, file)
-        shutil.copyfile(os.path.join(self.web_folder, "menu.html"), os.path.join(GLOBAL_OUTPUT_FOLDER, "index.html"))
+        update_presentation_index(presentation_name)
+        with open(os.path.join(self.web_folder, "menu.html"), "rb") as file:
+            write_atomic(os.path.join(GLOBAL_OUTPUT_FOLDER, "index.html"), file.read())
+        write_precompressed([os.path.join(GLOBAL_OUTPUT_FOLDER, "index.html")], presenter_config.precompress)
 
         self.output_folder = os.path.join(GLOBAL_OUTPUT_FOLDER, presentation_name)
+        # slides packaged by the previous render
+        self.manifest_file = os.path.join(self.output_folder, MANIFEST_FILENAME)
+        self.previous_results = load_manifest(self.manifest_file) if presenter_config.incremental else []
         # contain everything required to play this presentation including video files
-        if os.path.exists(self.output_folder):
+        # keep the previous output when it can be reused
+        if os.path.exists(self.output_folder) and len(self.previous_results) == 0:
             shutil.rmtree(self.output_folder)
-        os.mkdir(self.output_folder)
+        if not os.path.exists(self.output_folder):
+            os.mkdir(self.output_folder)
 
-        self.tmp_folder = os.path.join(GLOBAL_OUTPUT_FOLDER, "tmp")
+        # scratch space of this process only, other presentations may be rendered at the same time
+        self.tmp_folder = os.path.join(GLOBAL_OUTPUT_FOLDER, "tmp", f"{presentation_name}-{os.getpid()}")
         self.recreate_tmp_folder()
 
         # stores intel about how to present slides
         self.index_file = os.path.join(self.output_folder, "index.json")
+        # files of the index apart from index.json
+        self.index_chunks: List[str] = []
+        self.report = BuildReport(presentation_name)
+        # timeline sprite sheet in the index
+        self.sprite: Dict = {}
+        # slides get packaged while manim is still rendering the following ones
+        self.packager: Optional[SlidePackager] = None
+        # slides handed to the packager
+        self.submitted_slides = 0
 
         # first slide can be replaced with a loop <- immediately gets deleted when creating a new slide
         self.next_slide("normal", None)
@@ -134,10 +149,12 @@ class RawPresentation:
     def recreate_tmp_folder(self) -> None:
         if os.path.exists(self.tmp_folder):
             shutil.rmtree(self.tmp_folder)
-        os.mkdir(self.tmp_folder)
+        os.makedirs(self.tmp_folder)
 
     def play(self, *args, **kwargs):
+        start = time.perf_counter()
         self.parent.play(*args, **kwargs)
+        self.report.add_animation(self.next_animation, self.slides[-1].slide_id, time.perf_counter() - start)
         # exclusive -> store index of not yet defined animation
         self.next_animation += 1
         self.slides[-1].after_last_animation = self.next_animation
@@ -151,6 +168,7 @@ class RawPresentation:
         if name is None:
             name = f"Slide ({slide_type}) #{len(self.slides)}"
         self.finish_last_slide()
+        self.submit_finished_slides()
         self.slides.append(Slide(slide_type,
                                  name,
                                  len(self.slides),
@@ -161,80 +179,195 @@ class RawPresentation:
         self.finish_last_slide()
         assert len(self.slides) != 0, "The presentation doesn't contain any animations."
         assert self.slides[-1].slide_type != "skip", "The presentation can't end with a skip slide; there's nothing to skip to."
+        self.submit_finished_slides()
         self.parent.tear_down(*args, **kwargs)
 
-    # copy animations into tmp folder and concatenate into single file
-    def combine_animations(self) -> None:
+    # settings handed to the packaging workers
+    def get_packaging_options(self) -> Dict:
+        options = presenter_config.get_dict()
+        options["ffmpeg_loglevel"] = manim.config.ffmpeg_loglevel.lower()
+        return options
+
+    # hand slides whose animations have all been rendered to the packaging workers
+    # slides get packaged in parallel, each in its own scratch folder inside the tmp folder
+    def submit_finished_slides(self) -> None:
+        if self.submitted_slides == len(self.slides):
+            return
+        if self.packager is None:
+            self.packager = SlidePackager(self.tmp_folder, self.output_folder, SEGMENT_FOLDER, self.get_packaging_options(), self.previous_results)
         src_files = self.owner.renderer.file_writer.partial_movie_files
-        for slide in self.slides:
-            index_file = os.path.join(self.tmp_folder, "animations.txt")
-            # copy and fragment videos -> needed by front end
-            with open(index_file, "w", encoding="utf-8") as file:
-                for idx, src_file in enumerate(src_files[slide.first_animation:slide.after_last_animation]):
-                    dst_filename = f"{idx}.mp4"
-                    dst_file = os.path.join(self.tmp_folder, dst_filename)
-                    file.write(f"file {dst_filename}\n")
-                    shutil.copyfile(src_file, dst_file)
-                    # manim.logger.info(f"Converting animation #{idx}...")
-                    # if not ffmpeg_fragment(src_file, dst_file):
-                    #     raise RuntimeError(f"ffmpeg failed to encode animation #{idx} for slide '{slide.name}'")
-
-            # combine animations
-            full_dst_filename = f"{slide.slide_id}.mp4"
-            full_dst_file = os.path.join(self.output_folder, full_dst_filename)
-            full_tmp_file = os.path.join(self.tmp_folder, "out.mp4")
-            slide.set_video(full_dst_filename)
-            manim.logger.info(f"Combining animations for slide '{slide.name}'...")
-            if not ffmpeg_concat(index_file, full_tmp_file):
-                raise RuntimeError(f"ffmpeg failed to concatenate the animations of slide '{slide.name}'")
-            manim.logger.info(f"Fragmenting concatenated animations for slide '{slide.name}'...")
-            if not ffmpeg_fragment(full_tmp_file, full_dst_file):
-                raise RuntimeError(f"ffmpeg failed to encode concatenated animations of slide '{slide.name}'")
+        for slide in self.slides[self.submitted_slides:]:
+            self.packager.submit(slide, src_files[slide.first_animation:slide.after_last_animation])
+        self.submitted_slides = len(self.slides)
 
+    # concatenate and fragment the animations of every slide
+    # only waits for the slides that haven't been packaged during rendering
+    def combine_animations(self) -> None:
+        self.submit_finished_slides()
+        assert self.packager is not None
+        results = self.packager.wait()
+        self.packager = None
+        for slide in self.slides:
+            slide.add_packaging_info(results[slide.slide_id]["index"])
+            self.report.add_slide(slide.slide_id, slide.name, results[slide.slide_id]["report"])
+        write_manifest(self.manifest_file, [results[slide.slide_id] for slide in self.slides])
+        self.remove_stale_files(list(results.values()))
+
+    # files of slides that have been removed or got packaged again, e.g. with another build key
+    # every file of a slide starts with its id, segments are named after their content
+    def remove_stale_files(self, results: List[Dict]) -> None:
+        files = {file for result in results for file in result["files"]}
+        for file in os.listdir(self.output_folder):
+            if file[:1].isdigit() and file not in files:
+                os.remove(os.path.join(self.output_folder, file))
+        segment_folder = os.path.join(self.output_folder, SEGMENT_FOLDERNAME)
+        if not os.path.isdir(segment_folder):
+            return
+        segments = {segment["video"] for result in results for segment in result["index"].get("segments", [])}
+        for file in os.listdir(segment_folder):
+            if f"{SEGMENT_FOLDERNAME}/{file}" not in segments:
+                os.remove(os.path.join(segment_folder, file))
+        if len(segments) == 0:
+            os.rmdir(segment_folder)
+
+    # movie of the entire presentation used by the fallback
     def copy_movie_file(self):
+        dst_file = os.path.join(self.output_folder, "movie.mp4")
+        if os.path.lexists(dst_file):
+            os.remove(dst_file)
+        mode = presenter_config.movie_file
+        if mode == "none":
+            return
+        # combine the already packaged slides
+        if mode == "derive":
+            options = self.get_packaging_options()
+            muxer = create_muxer(options["muxer"], self.tmp_folder, options["ffmpeg_loglevel"], options["muxer_timeout"] or None)
+            muxer.concat([os.path.join(self.output_folder, slide.video) for slide in self.slides], dst_file, False)
+            return
+
         movie_file = self.owner.renderer.file_writer.movie_file_path
         assert movie_file.endswith(".mp4"), "Only mp4 files are supported. Did you add a 'wait' or 'play' statement to the presentation?"
-        dst_file = os.path.join(self.output_folder, "movie.mp4")
-        shutil.copyfile(movie_file, dst_file)
+        if mode == "copy":
+            shutil.copyfile(movie_file, dst_file)
+        else:
+            method = link_or_copy(movie_file, dst_file)
+            manim.logger.info(f"Created movie file with {method}")
 
     # executed single time once scene has been defined
     def render(self, *args, **kwargs):
-        # don't delete any intermediate files
+        # pin the partial movie files until they have been packaged
+        # manim deletes the oldest ones once the scene has finished otherwise
         max_files_cached = manim.config.max_files_cached
-        self.parent.render(*args, **kwargs)
-        manim.config.max_files_cached = max_files_cached
-
-        self.combine_animations()
-        self.copy_movie_file()
+        manim.config.max_files_cached = -1
+        try:
+            with self.report.stage("render"):
+                self.parent.render(*args, **kwargs)
+            with self.report.stage("combine_animations"):
+                self.combine_animations()
+        finally:
+            manim.config.max_files_cached = max_files_cached
+        if presenter_config.packed:
+            with self.report.stage("write_pack"):
+                self.write_pack()
+        elif os.path.exists(os.path.join(self.output_folder, PACK_FILENAME)):
+            os.remove(os.path.join(self.output_folder, PACK_FILENAME))
+        if presenter_config.posters:
+            with self.report.stage("write_sprite_sheet"):
+                self.write_sprite_sheet()
+        elif os.path.exists(os.path.join(self.output_folder, SPRITE_FILENAME)):
+            os.remove(os.path.join(self.output_folder, SPRITE_FILENAME))
+        with self.report.stage("copy_movie_file"):
+            self.copy_movie_file()
+        with self.report.stage("write_index"):
+            self.write_index()
+        with self.report.stage("write_web_files"):
+            self.write_web_files()
+        with self.report.stage("write_asset_manifest"):
+            self.write_asset_manifest()
+
+        shutil.rmtree(self.tmp_folder, ignore_errors=True)
+
+        if presenter_config.build_report:
+            self.report.write(os.path.join(self.output_folder, REPORT_FILENAME))
+        if presenter_config.print_build_report:
+            self.report.print_summary()
+
+    # concatenate all slide videos into a single file
+    # the front end loads slides from it with range requests
+    def write_pack(self) -> None:
+        offset = 0
+        with open(os.path.join(self.output_folder, PACK_FILENAME), "wb") as pack:
+            for slide in self.slides:
+                with open(os.path.join(self.output_folder, slide.video), "rb") as video:
+                    shutil.copyfileobj(video, pack)
+                slide.add_packaging_info({"offset": offset})
+                offset += slide.packaging_info["size"]
+
+    # thumbnails of the last frames for the timeline
+    def write_sprite_sheet(self) -> None:
+        positions, width, height = write_sprite_sheet([os.path.join(self.output_folder, slide.packaging_info["posters"]["last"]) for slide in self.slides],
+                                                      os.path.join(self.output_folder, SPRITE_FILENAME),
+                                                      presenter_config.thumbnail_height)
+        for slide, position in zip(self.slides, positions):
+            slide.add_packaging_info({"thumbnail": position})
+        self.sprite = {
+            "image": SPRITE_FILENAME,
+            "width": width,
+            "height": height,
+        }
 
+    # with index_chunk_size only the first slides are stored in index.json, the others in index_<n>.json
+    def write_index(self) -> None:
+        slides = [slide.get_dict() for slide in self.slides]
+        chunk_size = presenter_config.index_chunk_size if presenter_config.index_chunk_size > 0 else len(slides)
+        chunks = [slides[start:start + chunk_size] for start in range(0, len(slides), chunk_size)]
+
+        for file in os.listdir(self.output_folder):
+            if INDEX_CHUNK_PATTERN.fullmatch(file):
+                os.remove(os.path.join(self.output_folder, file))
+        self.index_chunks = [f"index_{i}.json" for i in range(1, len(chunks))]
+        for chunk_file, chunk in zip(self.index_chunks, chunks[1:]):
+            with open(os.path.join(self.output_folder, chunk_file), "w") as file:
+                json.dump({"slides": chunk}, file)
+
+        index: Dict = {
+            "slides": chunks[0],
+        }
+        if self.index_chunks:
+            index["slide_count"] = len(slides)
+            index["chunks"] = self.index_chunks
+        if presenter_config.packed:
+            index["pack"] = PACK_FILENAME
+        if self.sprite:
+            index["sprite"] = self.sprite
         with open(self.index_file, "w") as file:
-            json.dump({
-                "slides": [slide.get_dict() for slide in self.slides],
-            }, file)
+            json.dump(index, file)
 
-        # copy and configure web site over
+    # copy and configure web site over
+    def write_web_files(self) -> None:
         web_files = [
             "index.html",
         ]
         for file in web_files:
             shutil.copyfile(os.path.join(self.web_folder, file), os.path.join(self.output_folder, file))
-        write_template(os.path.join(self.web_folder, "fallback.html"), os.path.join(self.output_folder, "fallback.html"), slides=self.slides)
-
-
-#####################
-# custom templating #
-#####################
-# manim Scene class or class inheriting from Scene
-class Inheritor:
-    def __init__(self, class_):
-        self.manim_name = class_.__name__
-        if (not self.manim_name.endswith("Scene")):
-            manim.logger.warning(f"Warning: the class '{self.manim_name}' inherits from manim.Scene but doesn't end with 'Scene'; Please open an issue of GitHub. Thank You!")
-            self.presenter_name = f"{self.manim_name}_"
-        else:
-            self.presenter_name = self.manim_name.replace("Scene", "Presentation")
-
+        write_template(os.path.join(self.web_folder, "fallback.html"), os.path.join(self.output_folder, "fallback.html"), slides=self.slides, movie=presenter_config.movie_file != "none")
+
+    # everything the service worker keeps available offline
+    # only the files the Buffer and Continuous Loader play the best rendition from: the segments, otherwise the pack, otherwise the slide videos
+    # lower renditions, the movie file and the slide videos besides the pack are only fetched from the network
+    def write_asset_manifest(self) -> None:
+        paths = ["index.html", "fallback.html", "index.json"] + self.index_chunks
+        if presenter_config.posters:
+            paths.append(SPRITE_FILENAME)
+        for slide in self.slides:
+            if "segments" in slide.packaging_info:
+                paths += [segment["video"] for segment in slide.packaging_info["segments"] if segment["video"] not in paths]
+            elif not presenter_config.packed:
+                paths.append(slide.video)
+            elif PACK_FILENAME not in paths:
+                paths.append(PACK_FILENAME)
+            paths += slide.packaging_info.get("posters", {}).values()
+        manifest = write_asset_manifest(self.output_folder, paths)
+        write_service_worker(self.web_folder, self.output_folder, manifest)
+        write_precompressed([os.path.join(self.output_folder, path) for path in ["index.html", "fallback.html", "index.json", SERVICE_WORKER_FILENAME] + self.index_chunks], presenter_config.precompress)
 
-def create_wrappers():
-    inheritors = [Inheritor(inheritor) for inheritor in get_inheritors(manim.Scene)]
-    write_python_template(os.path.join(FILE_DIR_PATH, "wrapper_classes_template.py"), os.path.join(FILE_DIR_PATH, "wrapper_classes.py"), inheritors=inheritors)
@@ -0,0 +1,70 @@
+import manim
+import json
+import time
+from contextlib import contextmanager
+from rich.table import Table
+from typing import Any, Dict, Iterator, List
+
+REPORT_FILENAME = "build_report.json"
+
+
+# collect timings of all stages of building a presentation
+class BuildReport:
+    def __init__(self, presentation_name: str):
+        self.presentation_name = presentation_name
+        self.stages: List[Dict[str, Any]] = []
+        self.animations: List[Dict[str, Any]] = []
+        self.slides: List[Dict[str, Any]] = []
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages.append({
+                "name": name,
+                "seconds": time.perf_counter() - start,
+            })
+
+    def add_animation(self, animation: int, slide_id: int, seconds: float) -> None:
+        self.animations.append({
+            "animation": animation,
+            "slide_id": slide_id,
+            "seconds": seconds,
+        })
+
+    # report of the packaging worker of a slide
+    def add_slide(self, slide_id: int, name: str, report: Dict[str, Any]) -> None:
+        self.slides.append(dict(report, slide_id=slide_id, name=name))
+
+    def get_dict(self) -> Dict[str, Any]:
+        return {
+            "presentation": self.presentation_name,
+            "seconds": sum(stage["seconds"] for stage in self.stages),
+            "stages": self.stages,
+            "slides": self.slides,
+            "animations": self.animations,
+        }
+
+    def write(self, report_file: str) -> None:
+        with open(report_file, "w", encoding="utf-8") as file:
+            json.dump(self.get_dict(), file, indent=4)
+
+    # print stages and slowest slides
+    def print_summary(self, slowest_slides: int = 10) -> None:
+        stage_table = Table(title=f"Build of '{self.presentation_name}'")
+        stage_table.add_column("Stage")
+        stage_table.add_column("Seconds", justify="right")
+        for stage in self.stages:
+            stage_table.add_row(stage["name"], f"{stage['seconds']:.2f}")
+        manim.console.print(stage_table)
+
+        slide_table = Table(title=f"Slowest {slowest_slides} Slides")
+        slide_table.add_column("Slide")
+        slide_table.add_column("Seconds", justify="right")
+        slide_table.add_column("ffmpeg Runs", justify="right")
+        slide_table.add_column("Bytes", justify="right")
+        for slide in sorted(self.slides, key=lambda slide: slide["seconds"], reverse=True)[:slowest_slides]:
+            slide_table.add_row(slide["name"], f"{slide['seconds']:.2f}", str(len(slide["runs"])), str(slide["bytes"]))
+        manim.console.print(slide_table)
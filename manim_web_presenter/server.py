@@ -0,0 +1,334 @@
+# serve the presentation folder
+# supports range requests, validators built from the asset manifest, keep-alive, zero-copy transfers with sendfile
+# and the precompressed variants written when rendering
+# the watch mode pushes change notifications to the open presenter pages over server-sent events
+#
+# usage (from the folder containing the presentation folder):
+#   python3 -m manim_web_presenter.server
+#   python3 -m manim_web_presenter.server presentation --port 8080
+import argparse
+import asyncio
+import email.utils
+import json
+import mimetypes
+import os
+import posixpath
+import re
+import urllib.parse
+from http import HTTPStatus
+from typing import Dict, List, Optional, Tuple
+
+from .assets import ASSET_MANIFEST_FILENAME, PRECOMPRESSED_EXTENSIONS
+
+# size of the request line and headers
+MAX_HEADER_SIZE = 64 * 1024
+# seconds an idle connection is kept open
+KEEP_ALIVE_TIMEOUT = 15.0
+CONTENT_TYPES = {
+    ".html": "text/html; charset=utf-8",
+    ".json": "application/json",
+    ".js": "text/javascript",
+    ".mp4": "video/mp4",
+    ".pack": "application/octet-stream",
+}
+# single byte range, int() would also accept signs and whitespace
+RANGE_PATTERN = re.compile(r"([0-9]*)-([0-9]*)")
+# files worth compressing
+COMPRESSIBLE_EXTENSIONS = [".html", ".json", ".js"]
+# server-sent events stream of the watch mode
+EVENTS_PATH = "/__events"
+# seconds between keep-alive comments on the events stream, also detects closed connections
+EVENTS_PING_INTERVAL = 15.0
+
+
+def get_content_type(file_path: str) -> str:
+    extension = os.path.splitext(file_path)[1].lower()
+    if extension in CONTENT_TYPES:
+        return CONTENT_TYPES[extension]
+    return mimetypes.guess_type(file_path)[0] or "application/octet-stream"
+
+
+# [start, end) of a range header
+# None when the header should be ignored and the entire file sent, e.g. with multiple ranges
+# start >= end when the range can't be satisfied
+def parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    unit, _, ranges = header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in ranges:
+        return None
+    match = RANGE_PATTERN.fullmatch(ranges.strip())
+    if match is None or match.group(1) == match.group(2) == "":
+        return None
+    first, last = match.groups()
+    # last bytes
+    if first == "":
+        return max(0, size - int(last)), size
+    return int(first), size if last == "" else min(int(last) + 1, size)
+
+
+# opaque tag of an entity tag, the same for its weak and strong version
+def strip_weak(tag: str) -> str:
+    return tag[2:] if tag.startswith("W/") else tag
+
+
+# whether the range of a request with If-Range may be sent instead of the entire file
+# entity tags are compared strongly, weak ones never match (RFC 9110 section 13.1.5)
+def if_range_matches(header: str, etag: str, last_modified: str) -> bool:
+    header = header.strip()
+    if header.startswith('"') or header.startswith("W/"):
+        return not etag.startswith("W/") and header == etag
+    return header == last_modified
+
+
+# codings accepted by the client, excluding the ones with q=0
+def parse_accept_encoding(header: str) -> List[str]:
+    codings: List[str] = []
+    for part in header.split(","):
+        coding, _, params = part.partition(";")
+        params = params.replace(" ", "")
+        if params.startswith("q=") and params[2:].strip("0.") == "":
+            continue
+        codings.append(coding.strip().lower())
+    return codings
+
+
+# content hashes of the presentation folders, used as ETags
+class AssetHashes:
+    def __init__(self):
+        # modification time, hashes and stats by folder
+        self.manifests: Dict[str, Tuple[int, Dict[str, str], Dict[str, List[int]]]] = {}
+
+    # None when the file isn't in the manifest or has been changed since it has been written
+    def get(self, file_path: str, stat: os.stat_result) -> Optional[str]:
+        folder, name = os.path.split(file_path)
+        manifest_file = os.path.join(folder, ASSET_MANIFEST_FILENAME)
+        try:
+            mtime = os.stat(manifest_file).st_mtime_ns
+        except OSError:
+            return None
+        cached = self.manifests.get(folder)
+        if cached is None or cached[0] != mtime:
+            try:
+                with open(manifest_file, "r", encoding="utf-8") as file:
+                    manifest = json.load(file)
+                cached = (mtime, manifest["assets"], manifest["stats"])
+            except (OSError, ValueError, KeyError):
+                cached = (mtime, {}, {})
+            self.manifests[folder] = cached
+        if cached[2].get(name) != [stat.st_size, stat.st_mtime_ns]:
+            return None
+        return cached[1].get(name)
+
+
+class PresentationServer:
+    def __init__(self, root: str):
+        self.root = os.path.abspath(root)
+        self.asset_hashes = AssetHashes()
+        # one per connected events stream
+        self.event_queues: List[asyncio.Queue] = []
+
+    # send event to every connected page
+    # has to be called from the event loop's thread, others use loop.call_soon_threadsafe
+    def publish(self, event: Dict) -> None:
+        data = json.dumps(event)
+        for queue in self.event_queues:
+            queue.put_nowait(data)
+
+    def get_etag(self, file_path: str, stat: os.stat_result) -> str:
+        content_hash = self.asset_hashes.get(file_path, stat)
+        if content_hash is not None:
+            return f'"{content_hash[:32]}"'
+        return f'W/"{stat.st_size:x}-{stat.st_mtime_ns:x}"'
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                try:
+                    head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), KEEP_ALIVE_TIMEOUT)
+                except (asyncio.TimeoutError, asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+                    break
+                if not await self.handle_request(head, writer):
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def send_head(self, writer: asyncio.StreamWriter, status: int, headers: Dict[str, str], keep_alive: bool) -> None:
+        lines = [f"HTTP/1.1 {status} {HTTPStatus(status).phrase}"]
+        headers["Date"] = email.utils.formatdate(usegmt=True)
+        headers["Connection"] = "keep-alive" if keep_alive else "close"
+        if keep_alive:
+            headers["Keep-Alive"] = f"timeout={int(KEEP_ALIVE_TIMEOUT)}"
+        lines += [f"{name}: {value}" for name, value in headers.items()]
+        writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1"))
+        await writer.drain()
+
+    async def send_error(self, writer: asyncio.StreamWriter, status: int, keep_alive: bool, headers: Optional[Dict[str, str]] = None) -> None:
+        body = f"{status} {HTTPStatus(status).phrase}\n".encode("utf-8")
+        await self.send_head(writer, status, {**(headers or {}), "Content-Type": "text/plain", "Content-Length": str(len(body))}, keep_alive)
+        writer.write(body)
+        await writer.drain()
+
+    # returns whether the connection can be kept open
+    async def handle_request(self, head: bytes, writer: asyncio.StreamWriter) -> bool:
+        lines = head.decode("latin-1").split("\r\n")
+        request_line = lines[0].split(" ")
+        if len(request_line) != 3:
+            await self.send_error(writer, 400, False)
+            return False
+        method, target, version = request_line
+        headers: Dict[str, str] = {}
+        for line in lines[1:]:
+            name, _, value = line.partition(":")
+            if name != "":
+                headers[name.strip().lower()] = value.strip()
+        connection = headers.get("connection", "").lower()
+        keep_alive = connection == "keep-alive" if version == "HTTP/1.0" else connection != "close"
+
+        # requests with bodies aren't supported
+        if method not in ["GET", "HEAD"]:
+            await self.send_error(writer, 405, False, {"Allow": "GET, HEAD"})
+            return False
+
+        url = urllib.parse.urlsplit(target)
+        if url.path == EVENTS_PATH:
+            await self.send_events(writer)
+            return False
+        # normpath prevents escaping the root
+        path = posixpath.normpath(urllib.parse.unquote(url.path))
+        # not allowed in file names
+        if "\x00" in path:
+            await self.send_error(writer, 400, keep_alive)
+            return keep_alive
+        file_path = os.path.join(self.root, *[part for part in path.split("/") if part != ""])
+        if os.path.commonpath([self.root, os.path.abspath(file_path)]) != self.root:
+            await self.send_error(writer, 404, keep_alive)
+            return keep_alive
+        if os.path.isdir(file_path):
+            # relative links require the trailing slash
+            if not url.path.endswith("/"):
+                location = url.path + "/" + (f"?{url.query}" if url.query != "" else "")
+                await self.send_error(writer, 301, keep_alive, {"Location": location})
+                return keep_alive
+            file_path = os.path.join(file_path, "index.html")
+        try:
+            stat = os.stat(file_path)
+        except (OSError, ValueError):
+            await self.send_error(writer, 404, keep_alive)
+            return keep_alive
+        await self.send_file(writer, method, headers, file_path, stat, keep_alive)
+        return keep_alive
+
+    async def send_file(self, writer: asyncio.StreamWriter, method: str, headers: Dict[str, str], file_path: str, stat: os.stat_result, keep_alive: bool) -> None:
+        etag = self.get_etag(file_path, stat)
+        last_modified = email.utils.formatdate(stat.st_mtime, usegmt=True)
+        response_headers = {
+            "Content-Type": get_content_type(file_path),
+            "Last-Modified": last_modified,
+            "ETag": etag,
+            # always revalidate, the validators make that cheap
+            "Cache-Control": "no-cache",
+            "Accept-Ranges": "bytes",
+        }
+        compressible = os.path.splitext(file_path)[1].lower() in COMPRESSIBLE_EXTENSIONS
+        if compressible:
+            response_headers["Vary"] = "Accept-Encoding"
+
+        if self.is_not_modified(headers, etag, stat):
+            await self.send_head(writer, 304, response_headers, keep_alive)
+            return
+
+        status = 200
+        start, end = 0, stat.st_size
+        # If-Range only allows the range when the file hasn't changed
+        if "range" in headers and ("if-range" not in headers or if_range_matches(headers["if-range"], etag, last_modified)):
+            byte_range = parse_range(headers["range"], stat.st_size)
+            if byte_range is not None:
+                if byte_range[0] >= byte_range[1]:
+                    await self.send_error(writer, 416, keep_alive, {"Content-Range": f"bytes */{stat.st_size}"})
+                    return
+                status = 206
+                start, end = byte_range
+                response_headers["Content-Range"] = f"bytes {start}-{end - 1}/{stat.st_size}"
+
+        # precompressed variants are only used for entire files
+        if status == 200 and compressible:
+            accepted = parse_accept_encoding(headers.get("accept-encoding", ""))
+            for coding, extension in PRECOMPRESSED_EXTENSIONS.items():
+                try:
+                    variant_stat = os.stat(file_path + extension)
+                except OSError:
+                    continue
+                # outdated variant
+                if coding not in accepted or variant_stat.st_mtime_ns < stat.st_mtime_ns:
+                    continue
+                file_path = file_path + extension
+                end = variant_stat.st_size
+                response_headers["Content-Encoding"] = coding
+                # strong validators have to differ between encodings
+                response_headers["ETag"] = f'{etag[:-1]}-{coding}"'
+                break
+
+        response_headers["Content-Length"] = str(end - start)
+        await self.send_head(writer, status, response_headers, keep_alive)
+        if method == "HEAD" or end == start:
+            return
+        with open(file_path, "rb") as file:
+            # zero-copy with os.sendfile where the platform supports it
+            await asyncio.get_running_loop().sendfile(writer.transport, file, start, end - start)
+
+    # stream published events until the page is closed
+    async def send_events(self, writer: asyncio.StreamWriter) -> None:
+        await self.send_head(writer, 200, {"Content-Type": "text/event-stream", "Cache-Control": "no-cache"}, False)
+        queue: asyncio.Queue = asyncio.Queue()
+        self.event_queues.append(queue)
+        try:
+            while True:
+                try:
+                    data = await asyncio.wait_for(queue.get(), EVENTS_PING_INTERVAL)
+                    writer.write(f"data: {data}\n\n".encode("utf-8"))
+                except asyncio.TimeoutError:
+                    writer.write(b": ping\n\n")
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            self.event_queues.remove(queue)
+
+    def is_not_modified(self, headers: Dict[str, str], etag: str, stat: os.stat_result) -> bool:
+        if "if-none-match" in headers:
+            # weak comparison, also matches the tags of the compressed variants
+            tags = [strip_weak(tag.strip()) for tag in headers["if-none-match"].split(",")]
+            own = strip_weak(etag)[:-1]
+            return "*" in tags or any(tag == f'{own}"' or tag.startswith(f"{own}-") for tag in tags)
+        if "if-modified-since" in headers:
+            try:
+                since = email.utils.parsedate_to_datetime(headers["if-modified-since"]).timestamp()
+            except (TypeError, ValueError):
+                return False
+            return int(stat.st_mtime) <= since
+        return False
+
+
+async def serve(presentation_server: PresentationServer, host: str, port: int) -> None:
+    # many clients connect at once when a lecture hall opens the presentation
+    server = await asyncio.start_server(presentation_server.handle_connection, host, port, limit=MAX_HEADER_SIZE, backlog=1024)
+    print(f"Serving '{presentation_server.root}' on http://{host or 'localhost'}:{port}/")
+    async with server:
+        await server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve presentations rendered with the Manim Web Presenter.")
+    parser.add_argument("root", nargs="?", default="presentation", help="folder to serve, 'presentation' by default")
+    parser.add_argument("--host", default="", help="address to bind to, all interfaces by default")
+    parser.add_argument("--port", type=int, default=8000)
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(PresentationServer(args.root), args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
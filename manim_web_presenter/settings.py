@@ -0,0 +1,80 @@
+import os
+from typing import Any, Dict, List
+
+
+# convert environment variable to the type of the default value
+def parse_value(raw: str, default: Any) -> Any:
+    if isinstance(default, bool):
+        return raw.strip().lower() in ["1", "true", "yes", "on"]
+    if isinstance(default, int):
+        return int(raw)
+    if isinstance(default, float):
+        return float(raw)
+    if isinstance(default, list):
+        return [int(value) if value.strip().isdigit() else value.strip() for value in raw.split(",") if value.strip() != ""]
+    return raw
+
+
+# settings used when packaging presentations
+# change them in the scene file before rendering, e.g. 'presenter_config.packaging_workers = 4'
+# or with environment variables, e.g. 'MANIM_WEB_PRESENTER_PACKAGING_WORKERS=4'
+class PresenterConfig:
+    def __init__(self):
+        # amount of slides getting packaged at the same time
+        self.packaging_workers: int = os.cpu_count() or 1
+        # "thread" or "process"; ffmpeg runs in subprocesses either way so threads are usually enough
+        self.packaging_executor: str = "thread"
+        # reuse slides whose animations haven't changed since the last render
+        self.incremental: bool = True
+        # read the animations where manim stored them and write each slide only once, stream-copying them
+        # instead of copying the animations and writing the slide twice, re-encoding it while fragmenting
+        self.single_pass: bool = True
+        # "subprocess" runs ffmpeg, "pyav" remuxes inside of the packaging worker (requires PyAV)
+        self.muxer: str = "subprocess"
+        # seconds a single ffmpeg run may take, 0 for no limit
+        self.muxer_timeout: float = 0.0
+        # how movie.mp4 gets created:
+        # "link" shares the data with manim's movie file if possible, "copy" duplicates it,
+        # "derive" combines the packaged slides and "none" skips it
+        self.movie_file: str = "link"
+        # heights of additional lower resolution versions of each slide, e.g. [720, 480]
+        # the front end chooses between them depending on the download speed
+        self.renditions: List[int] = []
+        # extract the first and last frame of each slide, shown while the video is loading and in the timeline
+        self.posters: bool = False
+        # height in pixels of the slide thumbnails in the timeline
+        self.thumbnail_height: int = 72
+        # cut the identical frames normal and skip slides end with, e.g. from self.wait(), shorter than min_hold seconds are kept
+        # the front end keeps showing the last frame for as long instead
+        self.trim_holds: bool = False
+        self.min_hold: float = 1.0
+        # additionally store every animation once in a folder shared by all presentations, named after its content, and link it into each presentation
+        # the front end loads slides from these segments, so animations used in multiple slides only get downloaded once
+        self.segments: bool = False
+        # additionally store all slides in a single file, loaded by the front end with range requests
+        self.packed: bool = False
+        # slides per file of the index, 0 for a single file
+        # the first slide starts playing once the first file has been parsed, the rest gets loaded afterwards
+        self.index_chunk_size: int = 0
+        # write gzip and, if installed, brotli compressed variants of the index and the web pages
+        # only the presenter server uses them
+        self.precompress: bool = False
+        # write timings of all stages and slides to build_report.json in the presentation folder
+        self.build_report: bool = True
+        # print a summary of the build report once rendering has finished
+        self.print_build_report: bool = False
+
+        self.load_environment()
+
+    def load_environment(self) -> None:
+        for name, default in vars(self).items():
+            env_name = f"MANIM_WEB_PRESENTER_{name.upper()}"
+            if env_name in os.environ:
+                setattr(self, name, parse_value(os.environ[env_name], default))
+
+    # picklable snapshot handed to the packaging workers
+    def get_dict(self) -> Dict[str, Any]:
+        return dict(vars(self))
+
+
+presenter_config = PresenterConfig()
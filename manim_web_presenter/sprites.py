@@ -0,0 +1,37 @@
+import math
+from typing import Dict, List, Tuple
+
+SPRITE_COLUMNS = 10
+
+
+# combine the thumbnails of all slides into a single image loaded once by the timeline
+# returns position and size of each thumbnail and the size of the sheet
+def write_sprite_sheet(image_files: List[str], dst_file: str, height: int) -> Tuple[List[Dict[str, int]], int, int]:
+    # Pillow is installed with manim
+    from PIL import Image
+
+    thumbnails = []
+    for image_file in image_files:
+        with Image.open(image_file) as image:
+            width = max(1, round(image.width * height / image.height))
+            # decode jpegs at a reduced scale
+            image.draft("RGB", (width, height))
+            thumbnails.append(image.convert("RGB").resize((width, height), Image.LANCZOS))
+
+    cell_width = max(thumbnail.width for thumbnail in thumbnails)
+    columns = min(SPRITE_COLUMNS, len(thumbnails))
+    rows = math.ceil(len(thumbnails) / columns)
+    sheet = Image.new("RGB", (columns * cell_width, rows * height))
+    positions: List[Dict[str, int]] = []
+    for idx, thumbnail in enumerate(thumbnails):
+        x = idx % columns * cell_width
+        y = idx // columns * height
+        sheet.paste(thumbnail, (x, y))
+        positions.append({
+            "x": x,
+            "y": y,
+            "width": thumbnail.width,
+            "height": height,
+        })
+    sheet.save(dst_file, "JPEG", quality=80, optimize=True, progressive=True)
+    return positions, sheet.width, sheet.height
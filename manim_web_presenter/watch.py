@@ -0,0 +1,172 @@
+# render presentations again whenever their scene files change
+# manim stays loaded and unchanged slides are reused, the open presenter pages only reload the changed slides
+#
+# usage (from the folder the presentation folder should be created in):
+#   python3 -m manim_web_presenter.watch example.py
+#   python3 -m manim_web_presenter.watch lectures/*.py --scenes Tutorial --quality m --port 8080
+# then open http://localhost:8000/<presentation>/?live_reload=true
+import argparse
+import asyncio
+import os
+import sys
+import sysconfig
+import threading
+import time
+import traceback
+from typing import Dict, List, Optional
+
+import manim
+from watchdog.events import FileSystemEvent, FileSystemEventHandler
+from watchdog.observers import Observer
+
+from .build import load_presentations
+from .packaging import MANIFEST_FILENAME, load_manifest
+from .presentation import GLOBAL_OUTPUT_FOLDER
+from .server import PresentationServer, serve
+
+# seconds to wait for further changes, editors often write a file multiple times
+DEBOUNCE_DELAY = 0.3
+# like manim's -q flag
+QUALITIES = {
+    "l": "low_quality",
+    "m": "medium_quality",
+    "h": "high_quality",
+    "p": "production_quality",
+    "k": "fourk_quality",
+}
+
+
+# build keys of the slides by their ids, a slide changed when its key did
+# empty when the presentation hasn't been rendered yet, None for slides that get packaged with every render
+def load_build_keys(presentation_name: str) -> Dict[int, Optional[str]]:
+    results = load_manifest(os.path.join(GLOBAL_OUTPUT_FOLDER, presentation_name, MANIFEST_FILENAME))
+    return {result["slide_id"]: result["key"] for result in results}
+
+
+# standard library and installed packages, wherever the distribution puts them, e.g. dist-packages on debian
+def get_installed_folders() -> List[str]:
+    paths = sysconfig.get_paths()
+    folders = {paths[name] for name in ["stdlib", "platstdlib", "purelib", "platlib"] if name in paths}
+    folders |= {sys.prefix, sys.exec_prefix, sys.base_prefix, sys.base_exec_prefix}
+    return [os.path.abspath(folder) for folder in folders]
+
+
+def is_in_folders(path: str, folders: List[str]) -> bool:
+    return any(path.startswith(folder + os.sep) for folder in folders)
+
+
+# forget the modules imported from the watched folders, so changes to them get picked up as well
+# this package and installed packages stay loaded
+def forget_modules(folders: List[str]) -> None:
+    installed_folders = get_installed_folders()
+    for name, module in list(sys.modules.items()):
+        if name == __package__ or name.startswith(f"{__package__}."):
+            continue
+        module_file = getattr(module, "__file__", None)
+        if module_file is None:
+            continue
+        module_file = os.path.abspath(module_file)
+        if is_in_folders(module_file, folders) and not is_in_folders(module_file, installed_folders):
+            del sys.modules[name]
+
+
+# render in this process, manim doesn't have to be imported again
+def render_presentation(presentation_class: type, scene_file: str, quality: str) -> None:
+    with manim.tempconfig({}):
+        manim.config.quality = QUALITIES[quality]
+        manim.config.input_file = scene_file
+        presentation_class().render()
+
+
+class ChangeHandler(FileSystemEventHandler):
+    def __init__(self, changed: threading.Event):
+        self.changed = changed
+
+    def on_any_event(self, event: FileSystemEvent) -> None:
+        # editors may save by moving a temporary file over the original
+        paths = [event.src_path, getattr(event, "dest_path", "")]
+        if any(path.endswith(".py") for path in paths):
+            self.changed.set()
+
+
+class Watcher:
+    def __init__(self, scene_files: List[str], scenes: Optional[List[str]], quality: str, host: str, port: int):
+        self.scene_files = [os.path.abspath(scene_file) for scene_file in scene_files]
+        self.scenes = scenes
+        self.quality = quality
+        self.folders = sorted({os.path.dirname(scene_file) for scene_file in self.scene_files})
+
+        # the server runs in its own thread, rendering blocks this one
+        self.loop = asyncio.new_event_loop()
+        self.presentation_server = PresentationServer(GLOBAL_OUTPUT_FOLDER)
+        threading.Thread(target=self.loop.run_until_complete, args=(serve(self.presentation_server, host, port),), daemon=True).start()
+
+    # render all presentations and tell the open pages which slides have changed
+    def render(self) -> None:
+        forget_modules(self.folders)
+        for scene_file in self.scene_files:
+            try:
+                presentations = load_presentations(scene_file)
+            except Exception:
+                manim.logger.error(f"Failed to load '{scene_file}':\n{traceback.format_exc()}")
+                continue
+            for presentation_name, presentation_class in presentations.items():
+                if self.scenes is not None and presentation_name not in self.scenes:
+                    continue
+                previous_keys = load_build_keys(presentation_name)
+                start = time.perf_counter()
+                try:
+                    render_presentation(presentation_class, scene_file, self.quality)
+                except Exception:
+                    manim.logger.error(f"Failed to render '{presentation_name}':\n{traceback.format_exc()}")
+                    continue
+                keys = load_build_keys(presentation_name)
+                changed_slides = sorted(slide_id for slide_id, key in keys.items() if key is None or previous_keys.get(slide_id) != key)
+                manim.logger.info(f"Rendered '{presentation_name}' in {time.perf_counter() - start:.1f}s, {len(changed_slides)} of {len(keys)} slides changed")
+                if len(changed_slides) == 0 and len(keys) == len(previous_keys):
+                    continue
+                self.loop.call_soon_threadsafe(self.presentation_server.publish, {
+                    "presentation": presentation_name,
+                    "slides": changed_slides,
+                    "slide_count": len(keys),
+                    # used to bypass the browser's cache, has to differ from previous watch sessions as well
+                    "version": int(time.time() * 1000),
+                })
+
+    def run(self) -> None:
+        changed = threading.Event()
+        observer = Observer()
+        for folder in self.folders:
+            observer.schedule(ChangeHandler(changed), folder, recursive=True)
+        observer.start()
+        # initial render
+        changed.set()
+        try:
+            while True:
+                # a timeout keeps KeyboardInterrupt working
+                if not changed.wait(1.0):
+                    continue
+                time.sleep(DEBOUNCE_DELAY)
+                changed.clear()
+                self.render()
+                manim.logger.info("Waiting for changes...")
+        except KeyboardInterrupt:
+            pass
+        finally:
+            observer.stop()
+            observer.join()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Render presentations again whenever their scene files change and reload the changed slides in the browser.")
+    parser.add_argument("scene_files", nargs="+", help="files containing presentations, their folders get watched")
+    parser.add_argument("--scenes", nargs="+", default=None, help="only render these presentations")
+    parser.add_argument("-q", "--quality", choices=list(QUALITIES), default="l", help="render quality like manim's -q, low by default")
+    parser.add_argument("--host", default="", help="address to bind to, all interfaces by default")
+    parser.add_argument("--port", type=int, default=8000)
+    args = parser.parse_args()
+    Watcher(args.scene_files, args.scenes, args.quality, args.host, args.port).run()
+
+
+if __name__ == "__main__":
+    main()
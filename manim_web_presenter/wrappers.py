@@ -0,0 +1,100 @@
+import manim
+import threading
+from typing import Dict, List, Optional
+
+from .presentation import RawPresentation
+
+
+def get_inheritors(class_):
+    subclasses = {class_}
+    q = [class_]
+    while q:
+        parent = q.pop()
+        for child in parent.__subclasses__():
+            if child not in subclasses:
+                subclasses.add(child)
+                q.append(child)
+    return subclasses
+
+
+# name of the wrapper of a manim Scene class or class inheriting from Scene
+def get_presenter_name(scene_class) -> str:
+    manim_name = scene_class.__name__
+    if not manim_name.endswith("Scene"):
+        return f"{manim_name}_"
+    return manim_name.replace("Scene", "Presentation")
+
+
+# functionality added to every scene class
+# super() refers to the wrapped scene class
+class PresentationMixin:
+    def __init__(self, *args, **kwargs):
+        self.raw_presentation = RawPresentation(self, super(), *args, **kwargs)
+
+    def play(self, *args, **kwargs):
+        self.raw_presentation.play(*args, **kwargs)
+
+    def next_normal_slide(self, name: Optional[str] = None):
+        """
+        end last slide and start new(first slide has been created automatically)
+        """
+        self.raw_presentation.next_slide("normal", name)
+
+    def next_loop_slide(self, name: Optional[str] = None):
+        """
+        end last slide and start new loop slide
+        """
+        self.raw_presentation.next_slide("loop", name)
+
+    def next_skip_slide(self, name: Optional[str] = None):
+        """
+        slide that continues to next slide without any user input
+        """
+        self.raw_presentation.next_slide("skip", name)
+
+    def next_complete_loop_slide(self, name: Optional[str] = None):
+        """
+        end last slide and start new loop slide
+        loop finishes first before going to next slide
+        """
+        self.raw_presentation.next_slide("complete_loop", name)
+
+    def tear_down(self, *args, **kwargs):
+        self.raw_presentation.tear_down(*args, **kwargs)
+
+    def render(self, *args, **kwargs):
+        self.raw_presentation.render(*args, **kwargs)
+
+
+# wrappers only get created when they're used for the first time
+wrappers: Dict[str, type] = {}
+wrappers_lock = threading.Lock()
+
+
+# wrapped scene classes by the names of their wrappers
+# scene classes defined after importing this module are included as well
+def get_scene_classes() -> Dict[str, type]:
+    scene_classes: Dict[str, type] = {}
+    for scene_class in get_inheritors(manim.Scene):
+        # don't wrap the wrappers
+        if issubclass(scene_class, PresentationMixin):
+            continue
+        scene_classes[get_presenter_name(scene_class)] = scene_class
+    return scene_classes
+
+
+def get_wrapper_names() -> List[str]:
+    return sorted(get_scene_classes())
+
+
+def get_wrapper(name: str) -> Optional[type]:
+    with wrappers_lock:
+        if name in wrappers:
+            return wrappers[name]
+        scene_class = get_scene_classes().get(name)
+        if scene_class is None:
+            return None
+        if not scene_class.__name__.endswith("Scene"):
+            manim.logger.warning(f"Warning: the class '{scene_class.__name__}' inherits from manim.Scene but doesn't end with 'Scene'; Please open an issue of GitHub. Thank You!")
+        wrappers[name] = type(name, (PresentationMixin, scene_class), {"__module__": "manim_web_presenter"})
+        return wrappers[name]
@@ -35,5 +35,5 @@ echo "| Finished rendering with manim |"
 echo "|                               |"
 echo "|        Starting server        |"
 echo "'-------------------------------'"
-cd "$SCRIPTPATH/presentation/"
-python3 -m http.server
+cd "$SCRIPTPATH"
+python3 -m manim_web_presenter.server
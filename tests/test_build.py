@@ -0,0 +1,45 @@
+import pickle
+import sys
+
+import pytest
+
+from manim_web_presenter.build import load_presentations
+
+SCENE = """
+import manim
+from manim_web_presenter.wrappers import PresentationMixin
+
+
+class {name}(PresentationMixin, manim.Scene):
+    pass
+"""
+
+
+def write_scene(folder, name: str) -> str:
+    scene_file = folder / f"{name.lower()}.py"
+    scene_file.write_text(SCENE.format(name=name), encoding="utf-8")
+    return str(scene_file)
+
+
+def test_scene_files_get_their_own_modules(tmp_path):
+    first = load_presentations(write_scene(tmp_path, "First"))["First"]
+    second = load_presentations(write_scene(tmp_path, "Second"))["Second"]
+    assert first.__module__ != second.__module__
+    assert sys.modules[first.__module__].First is first
+    assert sys.modules[second.__module__].Second is second
+    # classes can be found by their module
+    assert pickle.loads(pickle.dumps(first)) is first
+
+
+def test_reloaded_scene_file_gets_a_new_module(tmp_path):
+    scene_file = write_scene(tmp_path, "Lecture")
+    assert load_presentations(scene_file)["Lecture"].__module__ != load_presentations(scene_file)["Lecture"].__module__
+
+
+def test_broken_scene_file_isnt_registered(tmp_path):
+    scene_file = tmp_path / "broken.py"
+    scene_file.write_text("raise ValueError('broken')\n", encoding="utf-8")
+    modules = set(sys.modules)
+    with pytest.raises(ValueError):
+        load_presentations(str(scene_file))
+    assert set(sys.modules) == modules
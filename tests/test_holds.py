@@ -0,0 +1,104 @@
+import shutil
+import subprocess
+from typing import Iterator, List
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from manim_web_presenter import holds
+
+WIDTH = holds.COMPARE_WIDTH
+HEIGHT = 90
+
+
+# yields the frames in blocks like ffmpeg would
+class FakeMuxer:
+    def __init__(self, frames: List[np.ndarray], frames_per_block: int):
+        self.data = b"".join(frame.tobytes() for frame in frames)
+        self.block_size = WIDTH * HEIGHT * frames_per_block
+
+    def decode_gray(self, src_file: str, width: int, height: int) -> Iterator[bytes]:
+        assert (width, height) == (WIDTH, HEIGHT)
+        for start in range(0, len(self.data), self.block_size):
+            yield self.data[start:start + self.block_size]
+
+
+def frame(value: int) -> np.ndarray:
+    return np.full(WIDTH * HEIGHT, value, dtype=np.uint8)
+
+
+def find_hold(monkeypatch, frames: List[np.ndarray], frames_per_block: int = 7):
+    monkeypatch.setattr(holds, "get_dimensions", lambda video_file: (1920, 1080))
+    return holds.find_trailing_hold(FakeMuxer(frames, frames_per_block), "animation.mp4")
+
+
+def test_true_hold(monkeypatch):
+    frames = [frame(value * 20) for value in range(10)] + [frame(200)] * 50
+    assert find_hold(monkeypatch, frames) == (60, 10)
+
+
+def test_hold_with_encoding_noise(monkeypatch):
+    frames = [frame(0)] * 5 + [frame(100 + value % 3) for value in range(30)] + [frame(100)]
+    assert find_hold(monkeypatch, frames) == (36, 5)
+
+
+def test_slow_fade_is_not_a_hold(monkeypatch):
+    # neighbouring frames differ by less than the tolerance
+    frames = [frame(value) for value in range(100)]
+    assert find_hold(monkeypatch, frames) == (100, 100 - holds.HOLD_TOLERANCE - 1)
+
+
+def test_fade_into_hold(monkeypatch):
+    frames = [frame(value) for value in range(50)] + [frame(50)] * 20
+    assert find_hold(monkeypatch, frames) == (70, 50 - holds.HOLD_TOLERANCE)
+
+
+def test_all_static(monkeypatch):
+    assert find_hold(monkeypatch, [frame(42)] * 30) == (30, 0)
+
+
+def test_single_changed_pixel(monkeypatch):
+    changed = frame(0)
+    changed[123] = 255
+    frames = [frame(0)] * 10 + [changed] + [frame(0)] * 10
+    assert find_hold(monkeypatch, frames, frames_per_block=4) == (21, 11)
+
+
+def test_no_frames(monkeypatch):
+    assert find_hold(monkeypatch, []) == (0, 0)
+
+
+def encode_clip(clip_file: str, source: str) -> None:
+    # like manim encodes its animations, with keyframes in between to cut the hold after one
+    subprocess.run(["ffmpeg", "-loglevel", "error", "-y", "-f", "lavfi", "-i", source,
+                    "-c:v", "libx264", "-pix_fmt", "yuv420p", "-g", "20", clip_file], check=True)
+
+
+@pytest.mark.skipif(shutil.which("ffmpeg") is None or shutil.which("ffprobe") is None, reason="requires ffmpeg")
+def test_trimmed_slide_decodes(tmp_path):
+    from manim_web_presenter.muxer import SubprocessMuxer
+    from manim_web_presenter.packaging import SlideJob, package_single_pass, trim_hold
+
+    animations = [str(tmp_path / "animation_0.mp4"), str(tmp_path / "animation_1.mp4")]
+    encode_clip(animations[0], "testsrc=size=320x240:rate=30:duration=1")
+    # one second of movement followed by two seconds of its last frame
+    encode_clip(animations[1], "testsrc=size=320x240:rate=30:duration=1,tpad=stop_mode=clone:stop_duration=2")
+    tmp_folder = tmp_path / "tmp"
+    tmp_folder.mkdir()
+    dst_file = str(tmp_path / "0.mp4")
+    job = SlideJob(0, "normal", "hold", None, list(animations), str(tmp_folder), dst_file, str(tmp_path / "segments"), {"min_hold": 1.0})
+    muxer = SubprocessMuxer(str(tmp_folder), "error", None)
+
+    hold = trim_hold(job, muxer)
+    # the cut isn't at a keyframe, the frames after the last one got re-encoded
+    assert [run["operation"] for run in muxer.runs if run["operation"] in ["cut", "encode_frames"]] == ["cut", "encode_frames"]
+    assert hold == pytest.approx(2.0, abs=0.1)
+    package_single_pass(job, muxer)
+
+    process = subprocess.run(["ffmpeg", "-nostdin", "-loglevel", "error", "-xerror", "-i", dst_file, "-f", "null", "-"], stderr=subprocess.PIPE)
+    assert process.returncode == 0 and process.stderr == b""
+    frames = subprocess.run(["ffprobe", "-loglevel", "error", "-count_frames", "-select_streams", "v:0", "-show_entries", "stream=nb_read_frames",
+                             "-of", "csv=p=0", dst_file], stdout=subprocess.PIPE, check=True).stdout
+    # the first animation and everything before the hold
+    assert int(frames) == 30 + 90 - round(hold * 30)
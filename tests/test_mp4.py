@@ -0,0 +1,130 @@
+import io
+import struct
+
+from manim_web_presenter import mp4
+
+
+def box(name: str, *payloads: bytes) -> bytes:
+    payload = b"".join(payloads)
+    return struct.pack(">I4s", 8 + len(payload), name.encode("latin-1")) + payload
+
+
+# version and flags
+def full(version: int, flags: int = 0) -> bytes:
+    return bytes([version]) + flags.to_bytes(3, "big")
+
+
+def tkhd(track_id: int, width: int, height: int) -> bytes:
+    return box("tkhd", full(0), struct.pack(">III", 0, 0, track_id), bytes(4 + 4 + 8 + 4 + 4 + 36), struct.pack(">II", width << 16, height << 16))
+
+
+def mdhd(timescale: int) -> bytes:
+    return box("mdhd", full(0), struct.pack(">IIII", 0, 0, timescale, 0), bytes(4))
+
+
+def write(tmp_path, data: bytes) -> str:
+    video_file = str(tmp_path / "video.mp4")
+    with open(video_file, "wb") as file:
+        file.write(data)
+    return video_file
+
+
+def test_iter_boxes():
+    data = box("ftyp", b"isom") + box("free") + struct.pack(">I4sQ", 1, b"mdat", 16 + 3) + b"abc"
+    boxes = list(mp4.iter_boxes(io.BytesIO(data), 0, len(data)))
+    assert boxes == [("ftyp", 8, 12), ("free", 20, 20), ("mdat", 36, 39)]
+
+
+def test_iter_boxes_until_end():
+    # size 0 extends to the end of the file
+    data = box("ftyp", b"isom") + struct.pack(">I4s", 0, b"mdat") + b"abcdef"
+    assert list(mp4.iter_boxes(io.BytesIO(data), 0, len(data)))[-1] == ("mdat", 20, 26)
+
+
+def test_iter_boxes_stops_at_broken_box():
+    data = box("ftyp", b"isom") + struct.pack(">I4s", 4, b"moov") + bytes(8)
+    assert [name for name, _, _ in mp4.iter_boxes(io.BytesIO(data), 0, len(data))] == ["ftyp"]
+
+
+def test_find_box():
+    data = box("ftyp", b"isom") + box("moov", box("mvhd", b"first"), box("trak", box("tkhd", b"second")))
+    file = io.BytesIO(data)
+    start, end = mp4.find_box(file, ["moov", "trak", "tkhd"], 0, len(data))
+    assert data[start:end] == b"second"
+    assert mp4.find_box(file, ["moov", "mdia"], 0, len(data)) is None
+    assert mp4.read_box(file, ["moov", "mvhd"]) == b"first"
+
+
+def test_get_duration(tmp_path):
+    mvhd = box("mvhd", full(0), struct.pack(">IIII", 0, 0, 1000, 2500), bytes(80))
+    assert mp4.get_duration(write(tmp_path, box("moov", mvhd))) == 2.5
+
+
+def test_get_duration_version_1(tmp_path):
+    mvhd = box("mvhd", full(1), struct.pack(">QQIQ", 0, 0, 600, 1 << 33), bytes(80))
+    assert mp4.get_duration(write(tmp_path, box("moov", mvhd))) == (1 << 33) / 600
+
+
+def test_get_duration_without_moov(tmp_path):
+    assert mp4.get_duration(write(tmp_path, box("ftyp", b"isom"))) == 0.0
+
+
+def test_get_dimensions(tmp_path):
+    video_file = write(tmp_path, box("moov", box("trak", tkhd(1, 1920, 1080))))
+    assert mp4.get_dimensions(video_file) == (1920, 1080)
+
+
+def test_get_codec_string(tmp_path):
+    avcc = box("avcC", bytes([1, 0x64, 0x00, 0x2A]), bytes(4))
+    stsd = box("stsd", full(0), struct.pack(">I", 1), box("avc1", bytes(78), avcc))
+    video_file = write(tmp_path, box("moov", box("trak", box("mdia", box("minf", box("stbl", stsd))))))
+    assert mp4.get_codec_string(video_file) == "avc1.64002A"
+    assert mp4.get_codec_string(write(tmp_path, box("moov"))) == mp4.DEFAULT_CODEC
+
+
+def test_get_sync_samples(tmp_path):
+    stss = box("stss", full(0), struct.pack(">IIII", 3, 1, 251, 501))
+    video_file = write(tmp_path, box("moov", box("trak", box("mdia", box("minf", box("stbl", stss))))))
+    assert mp4.get_sync_samples(video_file) == [0, 250, 500]
+    # every sample is a keyframe
+    assert mp4.get_sync_samples(write(tmp_path, box("moov", box("trak", box("mdia", box("minf", box("stbl"))))))) is None
+
+
+def fragmented(*trafs: bytes, default_duration: int = 0) -> bytes:
+    moov = box("moov",
+               box("trak", tkhd(1, 640, 360), box("mdia", mdhd(15360))),
+               box("mvex", box("trex", full(0), struct.pack(">IIIII", 1, 1, default_duration, 0, 0))))
+    return box("ftyp", b"isom") + moov + b"".join(box("moof", box("mfhd", full(0), struct.pack(">I", index)), traf) + box("mdat") for index, traf in enumerate(trafs))
+
+
+def trun_with_durations(*durations: int) -> bytes:
+    # data offset, sample durations and sizes
+    flags = 0x01 | 0x100 | 0x200
+    return box("trun", full(0, flags), struct.pack(">Ii", len(durations), 0), b"".join(struct.pack(">II", duration, 100) for duration in durations))
+
+
+def test_get_fragmented_duration(tmp_path):
+    data = fragmented(box("traf", box("tfhd", full(0), struct.pack(">I", 1)), trun_with_durations(512, 512, 1024)),
+                      box("traf", box("tfhd", full(0), struct.pack(">I", 1)), trun_with_durations(512)))
+    assert mp4.get_fragmented_duration(write(tmp_path, data)) == 2560 / 15360
+
+
+def test_get_fragmented_duration_with_defaults(tmp_path):
+    # duration from the track fragment header, after the base data offset
+    tfhd = box("tfhd", full(0, 0x01 | 0x08), struct.pack(">IQI", 1, 0, 1024))
+    trun = box("trun", full(0), struct.pack(">I", 15))
+    # duration from the track extends box
+    other_tfhd = box("tfhd", full(0), struct.pack(">I", 1))
+    data = fragmented(box("traf", tfhd, trun), box("traf", other_tfhd, trun), default_duration=512)
+    assert mp4.get_fragmented_duration(write(tmp_path, data)) == (15 * 1024 + 15 * 512) / 15360
+
+
+def test_get_fragmented_duration_ignores_other_tracks(tmp_path):
+    data = fragmented(box("traf", box("tfhd", full(0), struct.pack(">I", 2)), trun_with_durations(15360)),
+                      box("traf", box("tfhd", full(0), struct.pack(">I", 1)), trun_with_durations(512)))
+    assert mp4.get_fragmented_duration(write(tmp_path, data)) == 512 / 15360
+
+
+def test_get_fragmented_duration_without_fragments(tmp_path):
+    assert mp4.get_fragmented_duration(write(tmp_path, fragmented())) == 0.0
+    assert mp4.get_fragmented_duration(write(tmp_path, box("ftyp", b"isom"))) == 0.0
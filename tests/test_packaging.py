@@ -0,0 +1,131 @@
+import os
+import shutil
+import struct
+import threading
+from types import SimpleNamespace
+from typing import Any, Dict, List
+
+import pytest
+
+from manim_web_presenter import packaging
+from manim_web_presenter.muxer import MuxerError
+from manim_web_presenter.packaging import SlidePackager, get_build_key
+
+OPTIONS = {
+    "packaging_workers": 4,
+    "renditions": [720],
+    "segments": False,
+}
+ANIMATIONS = [
+    "media/videos/example/1080p60/partial_movie_files/Tutorial/1185818338_3147347581_223132457.mp4",
+    "media/videos/example/1080p60/partial_movie_files/Tutorial/1185818338_2890416394_3561461939.mp4",
+]
+
+
+def test_build_key_is_stable():
+    assert get_build_key(ANIMATIONS, "normal", OPTIONS) == get_build_key(list(ANIMATIONS), "normal", dict(OPTIONS))
+
+
+def test_build_key_depends_on_animations():
+    assert get_build_key(ANIMATIONS, "normal", OPTIONS) != get_build_key(ANIMATIONS[:1], "normal", OPTIONS)
+    assert get_build_key(ANIMATIONS, "normal", OPTIONS) != get_build_key(ANIMATIONS[::-1], "normal", OPTIONS)
+
+
+def test_build_key_depends_on_folder():
+    # same animation rendered in another quality or by another scene
+    other_quality = [animation.replace("1080p60", "480p15") for animation in ANIMATIONS]
+    other_scene = [animation.replace("Tutorial", "Lecture") for animation in ANIMATIONS]
+    assert get_build_key(ANIMATIONS, "normal", OPTIONS) != get_build_key(other_quality, "normal", OPTIONS)
+    assert get_build_key(ANIMATIONS, "normal", OPTIONS) != get_build_key(other_scene, "normal", OPTIONS)
+
+
+def test_build_key_depends_on_slide_type():
+    assert get_build_key(ANIMATIONS, "normal", OPTIONS) != get_build_key(ANIMATIONS, "loop", OPTIONS)
+
+
+def test_build_key_ignores_non_output_options():
+    assert get_build_key(ANIMATIONS, "normal", OPTIONS) == get_build_key(ANIMATIONS, "normal", dict(OPTIONS, packaging_workers=1))
+    assert get_build_key(ANIMATIONS, "normal", OPTIONS) != get_build_key(ANIMATIONS, "normal", dict(OPTIONS, renditions=[480]))
+
+
+def test_uncached_animations_have_no_build_key():
+    uncached = ANIMATIONS + ["media/videos/example/1080p60/partial_movie_files/Tutorial/uncached_00002.mp4"]
+    assert get_build_key(uncached, "normal", OPTIONS) is None
+
+
+def box(name: str, *payloads: bytes) -> bytes:
+    payload = b"".join(payloads)
+    return struct.pack(">I4s", 8 + len(payload), name.encode("latin-1")) + payload
+
+
+# one second long with a 640x360 track, enough for packaging to read it
+ANIMATION_DATA = box("moov",
+                     box("mvhd", bytes(4), struct.pack(">IIII", 0, 0, 1000, 1000), bytes(80)),
+                     box("trak", box("tkhd", bytes(84 - 8), struct.pack(">II", 640 << 16, 360 << 16))))
+
+
+# copies the first animation instead of running ffmpeg
+# every slide waits for the others so that all of them use their scratch folders at the same time
+class FakeMuxer:
+    def __init__(self, tmp_folder: str, barrier: threading.Barrier, tmp_folders: List[str]):
+        self.tmp_folder = tmp_folder
+        self.barrier = barrier
+        self.runs: List[Dict[str, Any]] = []
+        tmp_folders.append(tmp_folder)
+
+    def concat(self, src_files: List[str], dst_file: str, fragment: bool) -> None:
+        assert os.path.isdir(self.tmp_folder)
+        # other slides must not see the files of this one
+        with open(os.path.join(self.tmp_folder, "animations.txt"), "x", encoding="utf-8") as file:
+            file.write("\n".join(src_files))
+        self.barrier.wait()
+        if any("broken" in src_file for src_file in src_files):
+            raise MuxerError("broken animation")
+        shutil.copyfile(src_files[0], dst_file)
+
+
+def package(tmp_path, monkeypatch, names: List[str]):
+    tmp_folders: List[str] = []
+    barrier = threading.Barrier(len(names), timeout=10)
+    monkeypatch.setattr(packaging, "create_muxer", lambda name, tmp_folder, loglevel, timeout: FakeMuxer(tmp_folder, barrier, tmp_folders))
+    options = dict(OPTIONS, packaging_executor="thread", packaging_workers=len(names), muxer="fake", ffmpeg_loglevel="error", muxer_timeout=0.0,
+                   incremental=True, single_pass=True, trim_holds=False, posters=False, renditions=[])
+    for folder in ["tmp", "output", "animations"]:
+        (tmp_path / folder).mkdir()
+    packager = SlidePackager(str(tmp_path / "tmp"), str(tmp_path / "output"), str(tmp_path / "segments"), options)
+    for slide_id, name in enumerate(names):
+        animation = tmp_path / "animations" / f"{name}.mp4"
+        animation.write_bytes(ANIMATION_DATA)
+        slide = SimpleNamespace(slide_id=slide_id, slide_type="normal", name=name, set_video=lambda video: None)
+        packager.submit(slide, [str(animation)])
+    return packager, tmp_folders
+
+
+def test_packager_scratch_folders_dont_collide(tmp_path, monkeypatch):
+    packager, tmp_folders = package(tmp_path, monkeypatch, ["first", "second", "third", "fourth"])
+    results = packager.wait()
+    assert sorted(results) == [0, 1, 2, 3]
+    assert len(set(tmp_folders)) == 4
+    assert all(os.path.dirname(tmp_folder) == str(tmp_path / "tmp") for tmp_folder in tmp_folders)
+    # removed once the slide has been packaged
+    assert not any(os.path.exists(tmp_folder) for tmp_folder in tmp_folders)
+    assert results[2]["index"]["renditions"][0]["height"] == 360
+    assert results[2]["index"]["duration"] == 1.0
+
+
+def test_packager_reports_failed_slides(tmp_path, monkeypatch, caplog):
+    packager, _ = package(tmp_path, monkeypatch, ["first", "broken", "third", "also broken"])
+    # manim's logger might not propagate to the root logger that caplog listens to
+    monkeypatch.setattr(packaging.manim.logger, "propagate", True)
+    with pytest.raises(RuntimeError) as error:
+        packager.wait()
+    assert "2 of 4 slides" in str(error.value)
+    assert "'broken'" in str(error.value) and "'also broken'" in str(error.value)
+    assert "'first'" not in str(error.value) and "'third'" not in str(error.value)
+    # every failure gets logged with its cause
+    assert [record.getMessage() for record in caplog.records if "Failed to package" in record.getMessage()] == [
+        "Failed to package slide 'broken': broken animation",
+        "Failed to package slide 'also broken': broken animation",
+    ]
+    # the other slides still finished
+    assert sorted(os.listdir(tmp_path / "output")) == ["0.mp4", "2.mp4"]
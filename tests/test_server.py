@@ -0,0 +1,81 @@
+import os
+
+from manim_web_presenter.server import PresentationServer, if_range_matches, parse_range
+
+STRONG_ETAG = '"0123456789abcdef0123456789abcdef"'
+WEAK_ETAG = 'W/"1f4-17a2b3c4d5e6f700"'
+LAST_MODIFIED = "Sun, 18 Oct 2026 12:00:00 GMT"
+
+
+def test_parse_range():
+    assert parse_range("bytes=0-99", 1000) == (0, 100)
+    assert parse_range("bytes=500-", 1000) == (500, 1000)
+    assert parse_range("bytes=900-2000", 1000) == (900, 1000)
+    assert parse_range(" Bytes = 10-19", 1000) == (10, 20)
+
+
+def test_parse_suffix_range():
+    assert parse_range("bytes=-100", 1000) == (900, 1000)
+    assert parse_range("bytes=-2000", 1000) == (0, 1000)
+
+
+def test_parse_unsatisfiable_range():
+    start, end = parse_range("bytes=1000-", 1000)
+    assert start >= end
+    start, end = parse_range("bytes=50-10", 1000)
+    assert start >= end
+
+
+def test_parse_ignored_range():
+    assert parse_range("items=0-10", 1000) is None
+    assert parse_range("bytes=0-10,20-30", 1000) is None
+    assert parse_range("bytes=a-b", 1000) is None
+    assert parse_range("bytes=--5", 1000) is None
+
+
+def test_if_range():
+    assert if_range_matches(STRONG_ETAG, STRONG_ETAG, LAST_MODIFIED)
+    assert if_range_matches(LAST_MODIFIED, STRONG_ETAG, LAST_MODIFIED)
+    assert not if_range_matches('"other"', STRONG_ETAG, LAST_MODIFIED)
+    assert not if_range_matches("Sat, 17 Oct 2026 12:00:00 GMT", STRONG_ETAG, LAST_MODIFIED)
+
+
+def test_if_range_rejects_weak_tags():
+    assert not if_range_matches(WEAK_ETAG, WEAK_ETAG, LAST_MODIFIED)
+    assert not if_range_matches(f"W/{STRONG_ETAG}", STRONG_ETAG, LAST_MODIFIED)
+
+
+def get_stat(mtime: float) -> os.stat_result:
+    return os.stat_result((0o644, 0, 0, 1, 0, 0, 500, int(mtime), int(mtime), int(mtime)))
+
+
+def is_not_modified(headers):
+    return PresentationServer(".").is_not_modified(headers, STRONG_ETAG, get_stat(1000))
+
+
+def test_if_none_match():
+    assert is_not_modified({"if-none-match": STRONG_ETAG})
+    assert is_not_modified({"if-none-match": f'"other", {STRONG_ETAG}'})
+    assert is_not_modified({"if-none-match": "*"})
+    assert not is_not_modified({"if-none-match": '"other"'})
+
+
+def test_if_none_match_is_weak():
+    assert is_not_modified({"if-none-match": f"W/{STRONG_ETAG}"})
+    # tags of the compressed variants
+    assert is_not_modified({"if-none-match": f'{STRONG_ETAG[:-1]}-br"'})
+
+
+def test_if_none_match_only_strips_weak_prefix():
+    # lstrip("W/") would have removed the leading W of the tag as well
+    server = PresentationServer(".")
+    assert not server.is_not_modified({"if-none-match": '"W1"'}, '"1"', get_stat(1000))
+    assert server.is_not_modified({"if-none-match": 'W/"W1"'}, '"W1"', get_stat(1000))
+
+
+def test_if_modified_since():
+    assert is_not_modified({"if-modified-since": "Thu, 01 Jan 1970 00:16:40 GMT"})
+    assert not is_not_modified({"if-modified-since": "Thu, 01 Jan 1970 00:16:39 GMT"})
+    assert not is_not_modified({"if-modified-since": "not a date"})
+    # If-None-Match takes precedence
+    assert not is_not_modified({"if-none-match": '"other"', "if-modified-since": "Thu, 01 Jan 1970 00:16:40 GMT"})
@@ -0,0 +1,105 @@
+import { SlideType } from "../presenter/slide";
+
+// what the buffer manager needs to know about a slide
+export interface ManagedSlide {
+    get_type(): SlideType;
+    // in bytes
+    get_expected_size(): number;
+    is_loaded(): boolean;
+    is_loading(): boolean;
+    unload(): void;
+}
+
+// decide which slides to keep in memory
+// slides are prioritized by how likely they're going to be played next,
+// the least recently played ones get evicted once the memory budget is exceeded
+export class BufferManager<T extends ManagedSlide> {
+    private slides: T[];
+    // in bytes
+    private budget: number;
+    // future slides to buffer
+    private slides_to_auto_load: number;
+    // past slides to buffer for going back
+    private slides_to_keep: number;
+    // when each slide has been played, higher is more recent
+    private last_used = new Map<number, number>();
+    private clock = 0;
+
+    public constructor(slides: T[], budget: number, slides_to_auto_load: number, slides_to_keep: number) {
+        this.slides = slides;
+        this.budget = budget;
+        this.slides_to_auto_load = slides_to_auto_load;
+        this.slides_to_keep = slides_to_keep;
+    }
+
+    // slide indices sorted from most to least important
+    private get_priority_order(current_slide: number): number[] {
+        let order: number[] = [];
+        let add = (slide: number) => {
+            if (slide >= 0 && slide < this.slides.length && !order.includes(slide))
+                order.push(slide);
+        };
+        // skip slides continue without user input, so the following slide is needed as well
+        let add_with_skips = (slide: number) => {
+            add(slide);
+            while (slide >= 0 && slide < this.slides.length - 1 && this.slides[slide].get_type() == SlideType.SKIP)
+                add(++slide);
+        };
+
+        add_with_skips(current_slide);
+        // also the slide a complete loop continues to once it has finished
+        add_with_skips(current_slide + 1);
+        // going back
+        add(current_slide - 1);
+        for (let i = 2; i <= this.slides_to_auto_load; ++i)
+            add_with_skips(current_slide + i);
+        for (let i = 2; i <= this.slides_to_keep; ++i)
+            add(current_slide - i);
+        return order;
+    }
+
+    // of slides that are loaded or loading
+    public get_used_bytes(): number {
+        let used = 0;
+        for (let slide of this.slides)
+            if (slide.is_loaded() || slide.is_loading())
+                used += slide.get_expected_size();
+        return used;
+    }
+
+    // unload slides that don't fit anymore
+    // returns slides to load, sorted from most to least important
+    public update(current_slide: number): T[] {
+        this.last_used.set(current_slide, ++this.clock);
+
+        // most important slides that fit into the budget
+        // the current slide is required no matter what
+        let wanted = new Set<number>();
+        let wanted_bytes = 0;
+        for (let slide of this.get_priority_order(current_slide)) {
+            let size = this.slides[slide].get_expected_size();
+            if (wanted.size != 0 && wanted_bytes + size > this.budget)
+                break;
+            wanted.add(slide);
+            wanted_bytes += size;
+        }
+
+        // make room, starting with the least recently used slides
+        let used = this.get_used_bytes();
+        for (let slide of wanted)
+            if (!this.slides[slide].is_loaded() && !this.slides[slide].is_loading())
+                used += this.slides[slide].get_expected_size();
+        let evictable = this.slides
+            .map((_, slide) => slide)
+            .filter(slide => !wanted.has(slide) && (this.slides[slide].is_loaded() || this.slides[slide].is_loading()))
+            .sort((a, b) => (this.last_used.get(a) ?? 0) - (this.last_used.get(b) ?? 0));
+        for (let slide of evictable) {
+            if (used <= this.budget)
+                break;
+            used -= this.slides[slide].get_expected_size();
+            this.slides[slide].unload();
+        }
+
+        return Array.from(wanted).map(slide => this.slides[slide]);
+    }
+}
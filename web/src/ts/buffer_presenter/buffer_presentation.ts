@@ -1,11 +1,15 @@
 import { Presentation } from "../presenter/presentation";
 import { SlideJson } from "../presenter/slide";
 import { BufferSlide } from "./buffer_slide";
+import { stream_bytes } from "../utils";
+import { ThroughputEstimator } from "./throughput_estimator";
+import { BufferManager } from "./buffer_manager";
+import { telemetry } from "../telemetry";
 
 export class BufferPresentation extends Presentation {
-    // when both 0, only current slide will be buffered
-    private slides_to_auto_load;
-    private slides_to_keep;
+    // shared by all slides to choose renditions
+    private throughput_estimator = new ThroughputEstimator();
+    private buffer_manager: BufferManager<BufferSlide>;
 
     public constructor(
         video0: HTMLVideoElement,
@@ -14,27 +18,111 @@ export class BufferPresentation extends Presentation {
         timeline: HTMLTableElement,
         progress_el: HTMLDivElement,
         bar_el: HTMLDivElement,
-        cache_batch_size: number,
+        cache_window_size: number,
 
+        // when both 0, only current slide will be buffered
         slides_to_auto_load: number,
-        slides_to_keep: number) {
+        slides_to_keep: number,
+        // in bytes
+        buffer_budget: number) {
 
-        super(video0, video1, videos_div, timeline, progress_el, bar_el, cache_batch_size);
-        this.slides_to_auto_load = slides_to_auto_load;
-        this.slides_to_keep = slides_to_keep;
+        super(video0, video1, videos_div, timeline, progress_el, bar_el, cache_window_size);
+        this.buffer_manager = new BufferManager(this.slides as BufferSlide[], buffer_budget, slides_to_auto_load, slides_to_keep);
     }
 
     // update currently playing video according to current_slide
     protected override update_source(): void {
-        // load next slides
-        for (let i = this.current_slide + 1, len = Math.min(this.current_slide + this.slides_to_auto_load + 1, this.slides.length); i < len; ++i)
-            (this.slides[i] as BufferSlide).load();
-        // unload previous slides
-        for (let i = 0, len = this.current_slide - this.slides_to_keep; i < len; ++i)
-            (this.slides[i] as BufferSlide).unload();
+        // the current slide gets loaded by its media source
+        this.load_slides(this.buffer_manager.update(this.current_slide).filter(slide => slide !== this.slides[this.current_slide]));
+    }
+
+    // with a pack file neighbouring slides get loaded with a single range request
+    // slides get requested in the given order
+    private load_slides(slides: BufferSlide[]): void {
+        if (this.pack === null) {
+            for (let slide of slides)
+                slide.load();
+            return;
+        }
+        let group: BufferSlide[] = [];
+        for (let slide of slides) {
+            if (slide.is_loaded() || slide.is_loading()) {
+                this.load_slide_group(group);
+                group = [];
+                continue;
+            }
+            slide.choose_rendition();
+            // only directly following slides can share a request
+            if (group.length != 0 && slide.get_id() != group[group.length - 1].get_id() + 1) {
+                this.load_slide_group(group);
+                group = [];
+            }
+            if (slide.uses_pack())
+                group.push(slide);
+            else {
+                // lower renditions have their own files
+                this.load_slide_group(group);
+                group = [];
+                slide.load();
+            }
+        }
+        this.load_slide_group(group);
+    }
+
+    // slides have to be consecutive
+    private load_slide_group(group: BufferSlide[]): void {
+        if (group.length == 0)
+            return;
+        if (group.length == 1) {
+            group[0].load();
+            return;
+        }
+        let start = group[0].get_offset();
+        let end = group[group.length - 1].get_offset() + group[group.length - 1].get_size();
+        let generations = group.map(slide => slide.begin_loading());
+        let start_time = performance.now();
+        // hand every chunk to the slides it belongs to
+        stream_bytes(this.pack!, [start, end], null, (chunk: Uint8Array, position: number) => {
+            let chunk_end = position + chunk.byteLength;
+            group.forEach((slide, i) => {
+                // already finished or unloaded
+                if (!slide.is_loading())
+                    return;
+                let slide_end = slide.get_offset() + slide.get_size();
+                let begin = Math.max(slide.get_offset(), position);
+                let finish = Math.min(slide_end, chunk_end);
+                if (begin < finish)
+                    slide.add_chunk(chunk.subarray(begin - position, finish - position), generations[i]);
+                if (chunk_end >= slide_end)
+                    slide.finish_loading(true, generations[i]);
+            });
+        }, () => {
+            this.throughput_estimator.add_sample(end - start, performance.now() - start_time);
+            telemetry.record({ type: "load", slide: group[0].get_id(), ms: performance.now() - start_time, bytes: end - start, source: this.pack! });
+            group.forEach((slide, i) => {
+                if (slide.is_loading())
+                    slide.finish_loading(true, generations[i]);
+            });
+        }, () => {
+            telemetry.record({ type: "load_failed", slide: group[0].get_id(), source: this.pack! });
+            group.forEach((slide, i) => {
+                if (slide.is_loading())
+                    slide.finish_loading(false, generations[i]);
+            });
+        });
+    }
+
+    public override get_buffered_bytes(): number {
+        return this.buffer_manager.get_used_bytes();
     }
 
     protected override add_slide(slide: SlideJson): void {
-        this.slides.push(new BufferSlide(slide));
+        this.slides.push(new BufferSlide(slide, this.pack, this.throughput_estimator));
+    }
+
+    protected override replace_slide(slide: SlideJson): boolean {
+        (this.slides[slide.slide_id] as BufferSlide).unload();
+        this.slides[slide.slide_id] = new BufferSlide(slide, this.pack, this.throughput_estimator);
+        return true;
     }
 }
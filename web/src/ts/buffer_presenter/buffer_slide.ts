@@ -1,82 +1,294 @@
 import { SlideJson, Slide } from "../presenter/slide";
+import { Download } from "../download_scheduler";
+import { concat_chunks, stream_bytes, stream_files } from "../utils";
+import { ThroughputEstimator } from "./throughput_estimator";
+import { telemetry } from "../telemetry";
+
+// in milliseconds
+const APPEND_RETRY_DELAY = 500;
 
 export class BufferSlide extends Slide {
     private media_source: MediaSource = new MediaSource();
-    private media_buffer: BufferSource | null = null;
+    // only exists while the media source is attached to a video element
+    private source_buffer: SourceBuffer | null = null;
+    // downloaded parts of the video that haven't been appended to a source buffer yet
+    private chunks: Uint8Array[] = [];
+    // part of the video only exists in the source buffer, it has to be downloaded again once the media source gets closed
+    private appended = false;
+    // changes whenever the downloaded data gets discarded to ignore chunks of downloads that have been started before
+    private generation = 0;
+    // pending retry of an append the source buffer had no space for
+    private append_timeout: number | null = null;
+    // file containing all slides, null when every slide has its own file
+    private pack: string | null;
+    private throughput_estimator: ThroughputEstimator;
+    // index of the rendition that is or will be loaded
+    private rendition = 0;
+    // index of the full resolution rendition stored in the pack and segments, -1 when this browser can't play it
+    private full_rendition = 0;
+    private loaded = false;
+    private loading = false;
+    private abort_controller: AbortController | null = null;
+    private on_loaded_callbacks: (() => void)[] = [];
+    private on_failed_callbacks: (() => void)[] = [];
 
-    public constructor(slide: SlideJson) {
+    public constructor(slide: SlideJson, pack: string | null, throughput_estimator: ThroughputEstimator) {
         super(slide);
+        this.pack = pack;
+        this.throughput_estimator = throughput_estimator;
+
+        // only keep renditions this browser can play
+        if ("MediaSource" in window) {
+            let supported = this.renditions.filter(rendition => MediaSource.isTypeSupported(this.get_mime_codec(rendition.codec)));
+            if (supported.length != 0) {
+                this.full_rendition = supported.indexOf(this.renditions[0]);
+                this.renditions = supported;
+            }
+        }
+
         // when setting url to video element
         this.media_source.onsourceopen = (_) => {
-            // check if MIME codec is supported
-            let mime_codec = 'video/mp4; codecs="avc1.64002A"';
-            if (!("MediaSource" in window) || !MediaSource.isTypeSupported(mime_codec)) {
-                console.error("MediaSource or mime codec not supported");
-                this.media_source.endOfStream();
+            // playback starts with the first chunk, no need to wait for the entire video
+            this.load(null, () => {
+                if (this.media_source.readyState == "open")
+                    this.media_source.endOfStream("network");
+            });
+            this.attach_source_buffer();
+        };
+        this.media_source.onsourceclose = (_) => {
+            this.source_buffer = null;
+            // played again by downloading it again, hopefully from the HTTP cache
+            if (this.appended)
+                this.discard();
+        };
+    }
+
+    private get_mime_codec(codec: string): string {
+        return `video/mp4; codecs="${codec}"`;
+    }
+
+    private attach_source_buffer(): void {
+        // check if MIME codec is supported
+        let mime_codec = this.get_mime_codec(this.renditions[this.rendition].codec);
+        if (!("MediaSource" in window) || !MediaSource.isTypeSupported(mime_codec)) {
+            console.error("MediaSource or mime codec not supported");
+            this.media_source.endOfStream();
+            return;
+        }
+
+        // add source buffer to media source of this slide
+        this.source_buffer = this.media_source.addSourceBuffer(mime_codec);
+        // every segment starts at 0, place them one after another
+        if (this.uses_segments())
+            this.source_buffer.mode = "sequence";
+
+        // set callbacks
+        // only append once the previous append has been processed
+        this.source_buffer.onupdateend = (_) => {
+            this.append_chunks();
+        };
+        this.source_buffer.onerror = (_) => {
+            console.error("Failed to append buffer to source buffer:");
+            console.error(this.media_source);
+        };
+        this.source_buffer.onabort = (_) => {
+            console.error("Aborted source buffer:");
+            console.error(this.media_source);
+        };
+        this.append_chunks();
+    }
+
+    // append everything that has arrived since the last append
+    // the chunks are dropped afterwards, the video is only kept once by the source buffer
+    private append_chunks(): void {
+        if (this.source_buffer === null || this.source_buffer.updating || this.media_source.readyState != "open" || this.append_timeout !== null)
+            return;
+        if (this.chunks.length != 0) {
+            let pending = concat_chunks(this.chunks);
+            try {
+                this.source_buffer.appendBuffer(pending);
+            }
+            catch (e) {
+                if (!(e instanceof DOMException) || e.name != "QuotaExceededError")
+                    throw e;
+                // the browser evicts already played frames on the next append
+                console.warn(`Source buffer of slide '${this.name}' is full, retrying`);
+                this.chunks = [pending];
+                this.append_timeout = window.setTimeout(() => {
+                    this.append_timeout = null;
+                    this.append_chunks();
+                }, APPEND_RETRY_DELAY);
                 return;
             }
-
-            // add source buffer to media source of this slide
-            let source_buffer = this.media_source.addSourceBuffer(mime_codec);
-
-            // set callbacks
-            source_buffer.onupdateend = (_) => {
-                this.media_source.endOfStream();
-            };
-            source_buffer.onerror = (_) => {
-                console.error("Failed to append buffer to source buffer:");
-                console.error(this.media_source);
-            };
-            source_buffer.onabort = (_) => {
-                console.error("Aborted source buffer:");
-                console.error(this.media_source);
-            };
-
-            this.load(() => {
-                if (this.media_buffer == null) {
-                    source_buffer.abort();
-                    return;
-                }
-                // success
-                source_buffer.appendBuffer(this.media_buffer);
-            }, () => {
-                // failure
-                source_buffer.abort();
-            });
+            this.chunks = [];
+            this.appended = true;
         }
+        else if (this.loaded)
+            this.media_source.endOfStream();
+    }
+
+    // pick rendition according to the current download speed
+    // has to be called before loading
+    public choose_rendition(): void {
+        this.rendition = this.throughput_estimator.choose_rendition(this.renditions);
+    }
+
+    // bytes the video takes up in memory once loaded
+    public get_expected_size(): number {
+        if (this.loaded || this.loading)
+            return this.renditions[this.rendition].size;
+        return this.renditions[this.throughput_estimator.choose_rendition(this.renditions)].size;
+    }
+
+    // the full resolution rendition is stored in the segments
+    public uses_segments(rendition = this.rendition): boolean {
+        return this.segments !== null && rendition == this.full_rendition;
+    }
+
+    // and in the pack file, segments are preferred
+    public uses_pack(rendition = this.rendition): boolean {
+        return this.pack !== null && rendition == this.full_rendition && !this.uses_segments(rendition);
+    }
+
+    // the rendition that would be loaded now
+    public override get_downloads(): Download[] {
+        let rendition = this.loaded || this.loading ? this.rendition : this.throughput_estimator.choose_rendition(this.renditions);
+        if (this.uses_segments(rendition))
+            return this.get_segment_downloads();
+        if (this.uses_pack(rendition))
+            return [this.get_pack_download(this.pack!)];
+        return [{
+            name: `${this.renditions[rendition].video} ${this.renditions[rendition].size}`,
+            url: this.renditions[rendition].video,
+            range: null,
+            size: this.renditions[rendition].size,
+            slide: this.slide_id,
+        }];
+    }
+
+    public override move_in_pack(pack: string | null, offset: number): void {
+        super.move_in_pack(pack, offset);
+        this.pack = pack;
     }
 
+    private get_source_name(): string {
+        if (this.uses_segments())
+            return this.segments!.map(segment => segment.video).join("', '");
+        return this.uses_pack() ? this.pack! : this.renditions[this.rendition].video;
+    }
+
+    // callbacks get called once the entire video has been downloaded
     public load(
         on_loaded: (() => void) | null = null,
         on_failed: (() => void) | null = null
     ): void {
-        if (this.media_buffer !== null) {
+        if (this.loaded) {
             if (on_loaded !== null)
                 on_loaded();
             return;
         }
+        if (on_loaded !== null)
+            this.on_loaded_callbacks.push(on_loaded);
+        if (on_failed !== null)
+            this.on_failed_callbacks.push(on_failed);
+        // only request once
+        if (this.loading)
+            return;
 
-        let request = new XMLHttpRequest();
-        request.responseType = "arraybuffer";
-        request.onload = () => {
-            this.media_buffer = request.response;
-            console.log(`Slide '${this.name}' successfully loaded`);
-            if (on_loaded !== null)
-                on_loaded();
+        this.choose_rendition();
+        let generation = this.begin_loading();
+        let start = performance.now();
+        let bytes = 0;
+        this.abort_controller = new AbortController();
+        let on_chunk = (chunk: Uint8Array) => {
+            bytes += chunk.byteLength;
+            this.add_chunk(chunk, generation);
         };
-        request.onerror = () => {
-            console.error(`Slide '${this.name}' failed to load`);
-            if (on_failed !== null)
-                on_failed();
+        let on_done = () => {
+            if (generation != this.generation)
+                return;
+            this.throughput_estimator.add_sample(bytes, performance.now() - start);
+            telemetry.record({ type: "load", slide: this.slide_id, ms: performance.now() - start, bytes: bytes, source: this.get_source_name() });
+            this.finish_loading(true, generation);
+        };
+        let on_failed = () => {
+            if (generation != this.generation)
+                return;
+            telemetry.record({ type: "load_failed", slide: this.slide_id, source: this.get_source_name() });
+            this.finish_loading(false, generation);
         };
-        request.open("GET", this.video, true);
-        request.send();
+        if (this.uses_segments())
+            stream_files(this.segments!.map(segment => segment.video), this.abort_controller.signal, on_chunk, on_done, on_failed);
+        else
+            stream_bytes(
+                this.uses_pack() ? this.pack! : this.renditions[this.rendition].video,
+                this.uses_pack() ? [this.offset, this.offset + this.size] : null,
+                this.abort_controller.signal,
+                on_chunk,
+                on_done,
+                on_failed);
+    }
+
+    // also used when the video gets loaded together with other slides
+    // returns the generation chunks of this download have to be added with
+    public begin_loading(): number {
+        this.loading = true;
+        this.chunks = [];
+        return this.generation;
+    }
+
+    public add_chunk(chunk: Uint8Array, generation: number): void {
+        if (generation != this.generation)
+            return;
+        this.chunks.push(chunk);
+        this.append_chunks();
+    }
+
+    public finish_loading(success: boolean, generation: number): void {
+        if (generation != this.generation)
+            return;
+        this.loading = false;
+        this.loaded = success;
+        this.abort_controller = null;
+        let callbacks = success ? this.on_loaded_callbacks : this.on_failed_callbacks;
+        this.on_loaded_callbacks = [];
+        this.on_failed_callbacks = [];
+        if (success) {
+            console.log(`Slide '${this.name}' successfully loaded from '${this.get_source_name()}'`);
+            this.append_chunks();
+        }
+        else {
+            console.error(`Slide '${this.name}' failed to load`);
+            this.chunks = [];
+        }
+        for (let callback of callbacks)
+            callback();
+    }
+
+    // forget the downloaded data, callbacks still get called once it has been loaded again
+    private discard(): void {
+        if (this.abort_controller !== null)
+            this.abort_controller.abort();
+        this.abort_controller = null;
+        if (this.append_timeout !== null)
+            window.clearTimeout(this.append_timeout);
+        this.append_timeout = null;
+        ++this.generation;
+        this.loading = false;
+        this.loaded = false;
+        this.chunks = [];
+        this.appended = false;
     }
 
     public unload(): void {
-        this.media_buffer = null;
+        this.discard();
+        this.on_loaded_callbacks = [];
+        this.on_failed_callbacks = [];
     }
 
+    public is_loaded(): boolean { return this.loaded; }
+    public is_loading(): boolean { return this.loading; }
+
     public override get_src_url(): string {
         return URL.createObjectURL(this.media_source);
     }
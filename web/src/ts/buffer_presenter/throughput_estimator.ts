@@ -0,0 +1,40 @@
+import { RenditionJson } from "../presenter/slide";
+
+// moving average of the download speed
+export class ThroughputEstimator {
+    // null until the first download finished
+    private bytes_per_second: number | null = null;
+    // how much a new sample counts
+    private weight: number;
+    // only use renditions that download this much faster than they play
+    private safety_factor: number;
+
+    public constructor(weight: number = 0.3, safety_factor: number = 1.25) {
+        this.weight = weight;
+        this.safety_factor = safety_factor;
+    }
+
+    public add_sample(bytes: number, milliseconds: number): void {
+        if (milliseconds <= 0)
+            return;
+        let sample = bytes * 1000 / milliseconds;
+        if (this.bytes_per_second === null)
+            this.bytes_per_second = sample;
+        else
+            this.bytes_per_second = this.weight * sample + (1 - this.weight) * this.bytes_per_second;
+    }
+
+    public get_bytes_per_second(): number | null { return this.bytes_per_second; }
+
+    // renditions are sorted from best to worst
+    // use the best one until the speed is known
+    public choose_rendition(renditions: RenditionJson[]): number {
+        if (this.bytes_per_second === null)
+            return 0;
+        let available_bitrate = this.bytes_per_second * 8 / this.safety_factor;
+        for (let i = 0; i < renditions.length; ++i)
+            if (renditions[i].bitrate <= available_bitrate)
+                return i;
+        return renditions.length - 1;
+    }
+}
@@ -0,0 +1,141 @@
+import { Presentation } from "../presenter/presentation";
+import { SlideJson, SlideType } from "../presenter/slide";
+import { BufferManager } from "../buffer_presenter/buffer_manager";
+import { ContinuousSlide } from "./continuous_slide";
+import { TimelineSource } from "./timeline_source";
+import { telemetry } from "../telemetry";
+
+// slides end a little early, the end is only checked once per animation frame
+const END_TOLERANCE = 0.02;
+
+// all slides on one timeline in a single media source
+// switching slides only seeks instead of creating a new decoder
+export class ContinuousPresentation extends Presentation {
+    private video: HTMLVideoElement;
+    private source = new TimelineSource();
+    private buffer_manager: BufferManager<ContinuousSlide>;
+    // end of the last slide added to the timeline in seconds
+    private timeline_end = 0;
+
+    public constructor(
+        video0: HTMLVideoElement,
+        video1: HTMLVideoElement,
+        videos_div: HTMLDivElement,
+        timeline: HTMLTableElement,
+        progress_el: HTMLDivElement,
+        bar_el: HTMLDivElement,
+        cache_window_size: number,
+
+        // when both 0, only current slide will be buffered
+        slides_to_auto_load: number,
+        slides_to_keep: number,
+        // in bytes
+        buffer_budget: number) {
+
+        super(video0, video1, videos_div, timeline, progress_el, bar_el, cache_window_size);
+        this.video = video0;
+        video1.style.visibility = "hidden";
+        this.buffer_manager = new BufferManager(this.slides as ContinuousSlide[], buffer_budget, slides_to_auto_load, slides_to_keep);
+    }
+
+    protected override add_slide(slide: SlideJson): void {
+        if (slide.duration === undefined)
+            console.error(`Slide '${slide.name}' has no duration, render the presentation again to use the ContinuousPresentation`);
+        let continuous_slide = new ContinuousSlide(slide, this.pack, this.source, this.timeline_end);
+        this.timeline_end = continuous_slide.get_end_time();
+        this.slides.push(continuous_slide);
+        // slides from later chunks of the index extend the timeline
+        if (this.source.is_attached())
+            this.source.set_duration(this.timeline_end);
+    }
+
+    private get_slide(slide: number): ContinuousSlide {
+        return this.slides[slide] as ContinuousSlide;
+    }
+
+    protected override update_video(): void {
+        if (!this.source.is_attached()) {
+            this.video.style.visibility = "visible";
+            this.source.attach(this.video, this.get_slide(0).get_mime_codec(), this.timeline_end);
+            let check = () => {
+                this.check_slide_end();
+                requestAnimationFrame(check);
+            };
+            requestAnimationFrame(check);
+        }
+
+        let current_slide_elem = this.get_slide(this.current_slide);
+        console.log(`Playing slide '${current_slide_elem.get_name()}'`);
+        // also restarts the current slide
+        telemetry.measure_switch(this.video, this.current_slide);
+        this.video.currentTime = current_slide_elem.get_start_time();
+        this.video.play();
+
+        this.update_timeline();
+        this.update_source();
+        this.previous_slide = this.current_slide;
+    }
+
+    // the end of the slide is checked every animation frame
+    protected override finish_complete_loop(_finish: boolean): void { }
+
+    // what happens at the end of a slide is decided here instead of in onended callbacks
+    private check_slide_end(): void {
+        if (this.current_slide < 0 || this.video.paused || this.video.seeking)
+            return;
+        let current_slide_elem = this.get_slide(this.current_slide);
+        if (this.video.currentTime < current_slide_elem.get_end_time() - END_TOLERANCE)
+            return;
+
+        switch (current_slide_elem.get_type()) {
+            case SlideType.SKIP:
+                // the hold has been cut from the timeline, stay on the last frame for as long
+                if (current_slide_elem.get_hold() > 0) {
+                    this.video.pause();
+                    this.video.currentTime = Math.max(current_slide_elem.get_start_time(), current_slide_elem.get_end_time() - END_TOLERANCE / 2);
+                    this.after_hold(() => this.play_slide(this.current_slide + 1, true));
+                    break;
+                }
+                // the next slide directly follows on the timeline, keep playing
+                if (this.current_slide + 1 >= this.slides.length) {
+                    // wait for the chunk of the index containing the next slide
+                    this.video.pause();
+                    this.play_slide(this.current_slide + 1, true);
+                    break;
+                }
+                ++this.current_slide;
+                this.next_slide = this.current_slide;
+                this.update_timeline();
+                this.update_source();
+                this.previous_slide = this.current_slide;
+                break;
+            case SlideType.LOOP:
+                this.video.currentTime = current_slide_elem.get_start_time();
+                break;
+            case SlideType.COMPLETE_LOOP:
+                // when next slide has changed, go to next one
+                // otherwise restart
+                if (this.next_slide == this.current_slide)
+                    this.video.currentTime = current_slide_elem.get_start_time();
+                else {
+                    this.current_slide = this.next_slide;
+                    this.update_video();
+                }
+                break;
+            default:
+                // stay on the last frame <- wait for user input
+                this.video.pause();
+                this.video.currentTime = Math.max(current_slide_elem.get_start_time(), current_slide_elem.get_end_time() - END_TOLERANCE / 2);
+                break;
+        }
+    }
+
+    public override get_buffered_bytes(): number {
+        return this.buffer_manager.get_used_bytes();
+    }
+
+    protected override update_source(): void {
+        for (let slide of this.buffer_manager.update(this.current_slide))
+            slide.load();
+    }
+}
@@ -0,0 +1,148 @@
+import { SlideJson, Slide } from "../presenter/slide";
+import { Download } from "../download_scheduler";
+import { concat_chunks, stream_bytes } from "../utils";
+import { TimelineSource } from "./timeline_source";
+import { telemetry } from "../telemetry";
+
+// part of the shared timeline
+export class ContinuousSlide extends Slide {
+    private source: TimelineSource;
+    // file containing all slides, null when every slide has its own file
+    private pack: string | null;
+    // in seconds on the timeline
+    private start_time: number;
+    private loaded = false;
+    private loading = false;
+    // changes with every unload to ignore downloads and appends that have been started before
+    private generation = 0;
+    private abort_controller: AbortController | null = null;
+    private load_start = 0;
+
+    public constructor(slide: SlideJson, pack: string | null, source: TimelineSource, start_time: number) {
+        super(slide);
+        this.pack = pack;
+        this.source = source;
+        this.start_time = start_time;
+    }
+
+    public get_start_time(): number { return this.start_time; }
+    public get_end_time(): number { return this.start_time + this.duration; }
+
+    public get_mime_codec(): string {
+        return `video/mp4; codecs="${this.renditions[0].codec}"`;
+    }
+
+    // only the best rendition is used, all slides have to fit into the same source buffer
+    public get_expected_size(): number {
+        return this.size;
+    }
+
+    public override get_downloads(): Download[] {
+        if (this.segments !== null)
+            return this.get_segment_downloads();
+        if (this.pack !== null)
+            return [this.get_pack_download(this.pack)];
+        return super.get_downloads();
+    }
+
+    public override move_in_pack(pack: string | null, offset: number): void {
+        super.move_in_pack(pack, offset);
+        this.pack = pack;
+    }
+
+    // download the video and append it to the timeline
+    public load(): void {
+        if (this.loaded || this.loading)
+            return;
+        this.loading = true;
+        this.load_start = performance.now();
+        let generation = this.generation;
+        this.abort_controller = new AbortController();
+        if (this.segments !== null)
+            this.load_segments(generation, this.abort_controller.signal);
+        else {
+            let chunks: Uint8Array[] = [];
+            stream_bytes(
+                this.pack ?? this.video,
+                this.pack !== null ? [this.offset, this.offset + this.size] : null,
+                this.abort_controller.signal,
+                (chunk: Uint8Array) => chunks.push(chunk),
+                () => {
+                    this.abort_controller = null;
+                    this.source.append(concat_chunks(chunks), this.start_time, () => this.succeed(generation), () => this.fail(generation));
+                },
+                () => this.fail(generation));
+        }
+    }
+
+    // every segment starts at 0 and gets placed after the previous one
+    private load_segments(generation: number, signal: AbortSignal): void {
+        let segments = this.segments!;
+        let offset = this.start_time;
+        let load_segment = (index: number) => {
+            if (index == segments.length) {
+                this.abort_controller = null;
+                this.succeed(generation);
+                return;
+            }
+            let chunks: Uint8Array[] = [];
+            stream_bytes(segments[index].video, null, signal, (chunk: Uint8Array) => chunks.push(chunk), () => {
+                let segment_offset = offset;
+                offset += segments[index].duration;
+                this.source.append(concat_chunks(chunks), segment_offset, () => {
+                    if (generation == this.generation)
+                        load_segment(index + 1);
+                }, () => this.fail(generation));
+            }, () => this.fail(generation));
+        };
+        load_segment(0);
+    }
+
+    private succeed(generation: number): void {
+        if (generation != this.generation)
+            return;
+        this.loading = false;
+        this.loaded = true;
+        telemetry.record({
+            type: "load",
+            slide: this.slide_id,
+            ms: performance.now() - this.load_start,
+            bytes: this.segments !== null ? this.segments.reduce((size, segment) => size + segment.size, 0) : this.size,
+            source: this.segments !== null ? "segments" : this.pack ?? this.video,
+        });
+        console.log(`Slide '${this.name}' appended at ${this.start_time.toFixed(3)}s`);
+    }
+
+    private fail(generation: number): void {
+        if (generation != this.generation)
+            return;
+        console.error(`Slide '${this.name}' failed to load`);
+        telemetry.record({ type: "load_failed", slide: this.slide_id, source: this.pack ?? this.video });
+        if (this.abort_controller !== null)
+            this.abort_controller.abort();
+        this.abort_controller = null;
+        // segments that have already been appended don't make up the entire slide
+        this.source.remove(this.start_time, Math.max(this.start_time, this.get_end_time() - 0.001));
+        ++this.generation;
+        this.loading = false;
+    }
+
+    public unload(): void {
+        if (this.abort_controller !== null)
+            this.abort_controller.abort();
+        this.abort_controller = null;
+        if (this.loaded || this.loading)
+            // the next slide starts with a key frame at the end time, which must not be removed
+            this.source.remove(this.start_time, Math.max(this.start_time, this.get_end_time() - 0.001));
+        ++this.generation;
+        this.loaded = false;
+        this.loading = false;
+    }
+
+    public is_loaded(): boolean { return this.loaded; }
+    public is_loading(): boolean { return this.loading; }
+
+    public override get_src_url(): string {
+        return this.source.get_src_url();
+    }
+}
@@ -0,0 +1,131 @@
+// appending or removing a part of the timeline
+type Operation = {
+    data: Uint8Array;
+    // start of the slide on the timeline in seconds
+    offset: number;
+    on_done: () => void;
+    on_failed: () => void;
+} | {
+    start: number;
+    end: number;
+} | {
+    duration: number;
+};
+
+// one media source containing all slides one after another
+// operations get queued until the source buffer is ready for them
+export class TimelineSource {
+    private media_source: MediaSource = new MediaSource();
+    private source_buffer: SourceBuffer | null = null;
+    private src_url: string | null = null;
+    private queue: Operation[] = [];
+    // the operation currently processed by the source buffer
+    private current: Operation | null = null;
+    // set by the error event of the current operation, which is followed by updateend
+    private failed = false;
+
+    public attach(video: HTMLVideoElement, mime_codec: string, duration: number): void {
+        this.media_source.onsourceopen = (_) => {
+            if (!MediaSource.isTypeSupported(mime_codec)) {
+                console.error(`Mime codec '${mime_codec}' not supported`);
+                this.media_source.endOfStream();
+                return;
+            }
+            this.source_buffer = this.media_source.addSourceBuffer(mime_codec);
+            this.media_source.duration = duration;
+            this.source_buffer.onupdateend = (_) => {
+                let current = this.current;
+                let failed = this.failed;
+                this.current = null;
+                this.failed = false;
+                if (current !== null && "data" in current) {
+                    if (failed)
+                        current.on_failed();
+                    else
+                        current.on_done();
+                }
+                // a broken append ends the media source with a decode error, nothing else can be appended anymore
+                if (failed && this.media_source.readyState != "open")
+                    this.fail_queue();
+                this.process();
+            };
+            this.source_buffer.onerror = (_) => {
+                console.error("Failed to update the source buffer:");
+                console.error(this.media_source);
+                this.failed = true;
+            };
+            this.process();
+        };
+        this.media_source.onsourceclose = (_) => {
+            this.source_buffer = null;
+        };
+        video.src = this.get_src_url();
+    }
+
+    public is_attached(): boolean {
+        return this.src_url !== null;
+    }
+
+    public get_src_url(): string {
+        if (this.src_url === null)
+            this.src_url = URL.createObjectURL(this.media_source);
+        return this.src_url;
+    }
+
+    // place a slide's video at offset on the timeline
+    public append(data: Uint8Array, offset: number, on_done: () => void, on_failed: () => void): void {
+        this.queue.push({ data: data, offset: offset, on_done: on_done, on_failed: on_failed });
+        this.process();
+    }
+
+    // free [start, end) of the timeline
+    public remove(start: number, end: number): void {
+        // appends of the same range that haven't been processed yet are obsolete
+        this.queue = this.queue.filter(operation => !("data" in operation) || operation.offset < start || operation.offset >= end);
+        this.queue.push({ start: start, end: end });
+        this.process();
+    }
+
+    // in seconds, can't be changed while the source buffer is updating
+    public set_duration(duration: number): void {
+        this.queue.push({ duration: duration });
+        this.process();
+    }
+
+    private fail_queue(): void {
+        let queue = this.queue;
+        this.queue = [];
+        for (let operation of queue)
+            if ("data" in operation)
+                operation.on_failed();
+    }
+
+    private process(): void {
+        if (this.source_buffer === null || this.source_buffer.updating || this.media_source.readyState != "open" || this.queue.length == 0)
+            return;
+        let operation = this.queue.shift()!;
+        this.current = operation;
+        try {
+            if ("data" in operation) {
+                // every slide video starts at 0
+                this.source_buffer.timestampOffset = operation.offset;
+                this.source_buffer.appendBuffer(operation.data);
+            }
+            else if ("duration" in operation) {
+                this.current = null;
+                this.media_source.duration = operation.duration;
+                this.process();
+            }
+            else
+                this.source_buffer.remove(operation.start, operation.end);
+        }
+        // e.g. when the browser's buffer is full
+        catch (error) {
+            console.error(`Failed to update the source buffer: ${error}`);
+            this.current = null;
+            if ("data" in operation)
+                operation.on_failed();
+            this.process();
+        }
+    }
+}
@@ -0,0 +1,248 @@
+import { ProgressBar } from "./progress_bar";
+import { stream_bytes } from "./utils";
+import { telemetry } from "./telemetry";
+
+// failed downloads get retried with exponential backoff
+const MAX_ATTEMPTS = 6;
+const FIRST_BACKOFF_MS = 1000;
+const MAX_BACKOFF_MS = 30000;
+
+export type Download = {
+    // identifies the file across page reloads
+    name: string;
+    url: string;
+    // [start, end) of the file, e.g. a slide in the pack, null for the entire file
+    range: [number, number] | null;
+    // in bytes
+    size: number;
+    // files of slides close to the current one get downloaded first
+    slide: number;
+};
+
+function format_bytes(bytes: number): string {
+    return `${(bytes / (1024 * 1024)).toFixed(1)}MB`;
+}
+
+// download many files with a constant amount of requests in flight
+// finished downloads are remembered in the local storage to resume after a page reload
+export class DownloadScheduler {
+    private window_size: number;
+    private progress_bar: ProgressBar;
+    // slide the user is currently at
+    private get_focus: () => number;
+    private storage_key = `manim-web-presenter cache ${location.pathname}`;
+
+    private running = false;
+    private pending: Download[] = [];
+    private finished = new Set<string>();
+    private attempts = new Map<string, number>();
+    private in_flight = 0;
+    // downloads waiting for their retry
+    private waiting = 0;
+    private failed = 0;
+
+    // in bytes
+    private total_bytes = 0;
+    private finished_bytes = 0;
+    // received by downloads that haven't finished yet
+    private in_flight_bytes = 0;
+    // received since start, used for the throughput
+    private session_bytes = 0;
+    private start_time = 0;
+
+    public constructor(window_size: number, progress_bar: ProgressBar, get_focus: () => number) {
+        this.window_size = Math.max(1, window_size);
+        this.progress_bar = progress_bar;
+        this.get_focus = get_focus;
+    }
+
+    private load_state(): string[] | null {
+        try {
+            let state = localStorage.getItem(this.storage_key);
+            return state === null ? null : JSON.parse(state);
+        }
+        catch (_) {
+            return null;
+        }
+    }
+
+    private save_state(): void {
+        try {
+            localStorage.setItem(this.storage_key, JSON.stringify(Array.from(this.finished)));
+        }
+        catch (_) {
+            // local storage can be disabled or full, caching simply starts over after a reload
+        }
+    }
+
+    private clear_state(): void {
+        try {
+            localStorage.removeItem(this.storage_key);
+        }
+        catch (_) { }
+    }
+
+    // caching has been started but not finished before the page got reloaded
+    public was_interrupted(): boolean {
+        return this.load_state() !== null;
+    }
+
+    // slides may share files, e.g. segments
+    private get_unique(downloads: Download[]): Download[] {
+        let names = new Set<string>();
+        return downloads.filter(download => {
+            if (names.has(download.name))
+                return false;
+            names.add(download.name);
+            return true;
+        });
+    }
+
+    public start(downloads: Download[]): void {
+        if (this.running)
+            return;
+        this.running = true;
+        downloads = this.get_unique(downloads);
+        let previously_finished = new Set(this.load_state() ?? []);
+        this.pending = downloads.filter(download => !previously_finished.has(download.name));
+        this.finished = new Set(downloads.filter(download => previously_finished.has(download.name)).map(download => download.name));
+        this.attempts.clear();
+        this.failed = 0;
+        this.total_bytes = downloads.reduce((size, download) => size + download.size, 0);
+        this.finished_bytes = downloads.filter(download => this.finished.has(download.name)).reduce((size, download) => size + download.size, 0);
+        this.in_flight_bytes = 0;
+        this.session_bytes = 0;
+        this.start_time = performance.now();
+        if (this.finished.size != 0)
+            console.log(`Resuming caching with ${this.finished.size} of ${downloads.length} files already cached`);
+        this.save_state();
+
+        this.progress_bar.set_max(Math.max(1, this.total_bytes));
+        this.progress_bar.show();
+        this.update_progress();
+        this.fill_window();
+        this.check_complete();
+    }
+
+    // extend the downloads, e.g. once another chunk of the index has been loaded
+    // restarts when the previous downloads have already finished
+    public add(downloads: Download[]): void {
+        let known = (download: Download) => this.finished.has(download.name) || this.pending.some(pending => pending.name == download.name) || this.attempts.has(download.name);
+        let added = this.get_unique(downloads).filter(download => !known(download));
+        if (added.length == 0)
+            return;
+        if (!this.running) {
+            this.running = true;
+            this.failed = 0;
+            this.start_time = performance.now();
+            this.session_bytes = 0;
+            this.progress_bar.show();
+        }
+        this.pending.push(...added);
+        this.total_bytes += added.reduce((size, download) => size + download.size, 0);
+        this.progress_bar.set_max(Math.max(1, this.total_bytes));
+        this.save_state();
+        this.update_progress();
+        this.fill_window();
+    }
+
+    // closest first, slides ahead are more likely to be needed than ones behind
+    private pop_next(): Download | null {
+        if (this.pending.length == 0)
+            return null;
+        let focus = this.get_focus();
+        let distance = (download: Download) => download.slide >= focus ? download.slide - focus : 2 * (focus - download.slide);
+        let best = 0;
+        for (let i = 1; i < this.pending.length; ++i)
+            if (distance(this.pending[i]) < distance(this.pending[best]))
+                best = i;
+        return this.pending.splice(best, 1)[0];
+    }
+
+    // start as many downloads as the window allows
+    private fill_window(): void {
+        while (this.in_flight < this.window_size) {
+            let download = this.pop_next();
+            if (download === null)
+                break;
+            this.run(download);
+        }
+    }
+
+    private run(download: Download): void {
+        ++this.in_flight;
+        let received = 0;
+        let start = performance.now();
+        stream_bytes(download.url, download.range, null, (chunk: Uint8Array) => {
+            received += chunk.byteLength;
+            this.in_flight_bytes += chunk.byteLength;
+            this.session_bytes += chunk.byteLength;
+            this.update_progress();
+        }, () => {
+            --this.in_flight;
+            this.in_flight_bytes -= received;
+            this.finished.add(download.name);
+            this.finished_bytes += download.size;
+            this.save_state();
+            telemetry.record({ type: "download", slide: download.slide, ms: performance.now() - start, bytes: received, source: download.url });
+            console.log(`Cached '${download.url}'`);
+            this.update_progress();
+            this.fill_window();
+            this.check_complete();
+        }, () => {
+            --this.in_flight;
+            this.in_flight_bytes -= received;
+            telemetry.record({ type: "download_failed", slide: download.slide, source: download.url });
+            this.retry(download);
+            this.fill_window();
+            this.check_complete();
+        });
+    }
+
+    private retry(download: Download): void {
+        let attempt = (this.attempts.get(download.name) ?? 0) + 1;
+        this.attempts.set(download.name, attempt);
+        if (attempt >= MAX_ATTEMPTS) {
+            console.error(`Giving up caching '${download.url}' after ${attempt} attempts`);
+            ++this.failed;
+            return;
+        }
+        let delay = Math.min(MAX_BACKOFF_MS, FIRST_BACKOFF_MS * Math.pow(2, attempt - 1));
+        console.error(`Failed to cache '${download.url}', retrying in ${delay / 1000}s`);
+        ++this.waiting;
+        setTimeout(() => {
+            --this.waiting;
+            this.pending.push(download);
+            this.fill_window();
+        }, delay);
+    }
+
+    private check_complete(): void {
+        if (!this.running || this.in_flight != 0 || this.pending.length != 0 || this.waiting != 0)
+            return;
+        this.running = false;
+        if (this.failed == 0) {
+            console.log("Caching complete");
+            this.clear_state();
+            this.progress_bar.update(this.progress_bar.get_max());
+        }
+        // the next reload retries the missing files
+        else {
+            console.error(`Caching finished with ${this.failed} failed files`);
+            this.progress_bar.set_text(`${this.failed} files failed to be cached`);
+        }
+    }
+
+    private update_progress(): void {
+        let done = Math.min(this.finished_bytes + this.in_flight_bytes, this.total_bytes);
+        let seconds = (performance.now() - this.start_time) / 1000;
+        let throughput = seconds > 0 ? this.session_bytes / seconds : 0;
+        let text = `${format_bytes(done)} / ${format_bytes(this.total_bytes)}`;
+        if (throughput > 0)
+            text += `, ${format_bytes(throughput)}/s, ${Math.ceil((this.total_bytes - done) / throughput)}s left`;
+        this.progress_bar.set_text(text);
+        // finishing is up to check_complete
+        if (done < this.total_bytes)
+            this.progress_bar.update(done);
+    }
+}
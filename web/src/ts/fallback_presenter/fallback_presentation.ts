@@ -7,4 +7,9 @@ export class FallbackPresentation extends Presentation {
     public override add_slide(slide: SlideJson): void {
         this.slides.push(new FallbackSlide(slide));
     }
+
+    protected override replace_slide(slide: SlideJson): boolean {
+        this.slides[slide.slide_id] = new FallbackSlide(slide);
+        return true;
+    }
 }
@@ -7,19 +7,28 @@ import fullscreen_icon from "../icons/fullscreen_black_24dp.svg";
 import { Presentation } from "./presenter/presentation";
 import { BufferPresentation } from "./buffer_presenter/buffer_presentation";
 import { FallbackPresentation } from "./fallback_presenter/fallback_presentation";
+import { ContinuousPresentation } from "./continuous_presenter/continuous_presentation";
+import { connect_live_reload } from "./live_reload";
+import { TelemetryOverlay } from "./telemetry";
 
 abstract class URLParams {
     private static m_url_search_params = new URLSearchParams(location.search);
 
     public static load(): void {
-        if (this.m_url_search_params.has("cache_batch_size"))
-            cache_batch_size = Number(this.m_url_search_params.get("cache_batch_size"));
+        if (this.m_url_search_params.has("cache_window_size"))
+            cache_window_size = Number(this.m_url_search_params.get("cache_window_size"));
         if (this.m_url_search_params.has("slides_to_auto_load"))
             slides_to_auto_load = Number(this.m_url_search_params.get("slides_to_auto_load"));
         if (this.m_url_search_params.has("slides_to_keep"))
             slides_to_keep = Number(this.m_url_search_params.get("slides_to_keep"));
+        if (this.m_url_search_params.has("buffer_budget"))
+            buffer_budget = Number(this.m_url_search_params.get("buffer_budget"));
+        if (this.m_url_search_params.has("presenter"))
+            presenter = this.m_url_search_params.get("presenter")!;
         if (this.m_url_search_params.has("use_fallback"))
             use_fallback = this.m_url_search_params.get("use_fallback") === "true";
+        if (this.m_url_search_params.has("live_reload"))
+            live_reload = this.m_url_search_params.get("live_reload") === "true";
     }
 
     private static reload_url_params(): void {
@@ -43,25 +52,38 @@ function create_presentation(): void {
     let videos_div = document.getElementById("videos-div") as HTMLDivElement;
 
     if (use_fallback) {
-        console.log(`Using FallbackPresentation with a cache batch size of ${cache_batch_size}`);
+        console.log(`Using FallbackPresentation with a cache window size of ${cache_window_size}`);
         presentation = new FallbackPresentation(
             video0, video1,
             videos_div,
             timeline,
             progress_el,
             bar_el,
-            cache_batch_size);
+            cache_window_size);
+    }
+    else if (presenter == "continuous") {
+        console.log(`Using ContinuousPresentation with ${slides_to_auto_load} slides to auto load, ${slides_to_keep} slides to keep, a buffer budget of ${buffer_budget}MB and a cache window size of ${cache_window_size}`);
+        presentation = new ContinuousPresentation(
+            video0, video1,
+            videos_div,
+            timeline,
+            progress_el,
+            bar_el,
+            cache_window_size,
+            slides_to_auto_load, slides_to_keep,
+            buffer_budget * 1024 * 1024);
     }
     else {
-        console.log(`Using BufferPresentation with ${slides_to_auto_load} slides to auto load, ${slides_to_keep} slides to keep and a cache batch size of ${cache_batch_size}`);
+        console.log(`Using BufferPresentation with ${slides_to_auto_load} slides to auto load, ${slides_to_keep} slides to keep, a buffer budget of ${buffer_budget}MB and a cache window size of ${cache_window_size}`);
         presentation = new BufferPresentation(
             video0, video1,
             videos_div,
             timeline,
             progress_el,
             bar_el,
-            cache_batch_size,
-            slides_to_auto_load, slides_to_keep);
+            cache_window_size,
+            slides_to_auto_load, slides_to_keep,
+            buffer_budget * 1024 * 1024);
     }
 }
 
@@ -103,6 +125,9 @@ function attach_keyboard_ui(): void {
     const fullscreen_keys = [
         "KeyF",
     ];
+    const telemetry_keys = [
+        "KeyP",
+    ];
 
     document.addEventListener("keydown", (e: KeyboardEvent) => {
         if (e.repeat)
@@ -113,32 +138,49 @@ function attach_keyboard_ui(): void {
             presentation.play_next_slide();
         else if (fullscreen_keys.includes(e.code))
             presentation.toggle_fullscreen();
+        else if (telemetry_keys.includes(e.code))
+            telemetry_overlay.toggle();
     });
 }
 
+function create_telemetry_overlay(): void {
+    let telemetry_el = document.getElementById("telemetry") as HTMLDivElement;
+    let telemetry_text_el = document.getElementById("telemetry-text") as HTMLPreElement;
+    let telemetry_export_button = document.getElementById("telemetry-export") as HTMLButtonElement;
+    telemetry_overlay = new TelemetryOverlay(telemetry_el, telemetry_text_el, telemetry_export_button, presentation.get_buffered_bytes.bind(presentation));
+}
+
 function attach_nerdy_ui(): void {
     let cache_button = document.getElementById("cache-button") as HTMLDivElement;
     let fallback_button = document.getElementById("toggle-fallback") as HTMLButtonElement;
-    let cache_batch_size_button = document.getElementById("cache-batch-size-button") as HTMLButtonElement;
+    let continuous_button = document.getElementById("toggle-continuous") as HTMLButtonElement;
+    let cache_window_size_button = document.getElementById("cache-window-size-button") as HTMLButtonElement;
     let slides_to_auto_load_button = document.getElementById("slides-to-auto-load-button") as HTMLButtonElement;
     let slides_to_keep_button = document.getElementById("slides-to-keep-button") as HTMLButtonElement;
+    let buffer_budget_button = document.getElementById("buffer-budget-button") as HTMLButtonElement;
 
-    let cache_batch_size_input = document.getElementById("cache-batch-size-input") as HTMLInputElement;
+    let cache_window_size_input = document.getElementById("cache-window-size-input") as HTMLInputElement;
     let slides_to_auto_load_input = document.getElementById("slides-to-auto-load-input") as HTMLInputElement;
     let slides_to_keep_input = document.getElementById("slides-to-keep-input") as HTMLInputElement;
+    let buffer_budget_input = document.getElementById("buffer-budget-input") as HTMLInputElement;
 
     // set text
     fallback_button.innerText = use_fallback ? "Use Buffer Loader" : "Use Fallback Loader";
-    cache_batch_size_input.value = cache_batch_size.toString();
+    continuous_button.innerText = presenter == "continuous" ? "Use Buffer Loader" : "Use Continuous Loader";
+    cache_window_size_input.value = cache_window_size.toString();
     slides_to_auto_load_input.value = slides_to_auto_load.toString();
     slides_to_keep_input.value = slides_to_keep.toString();
+    buffer_budget_input.value = buffer_budget.toString();
 
     // hide if not used
     if (use_fallback) {
+        continuous_button.style.visibility = "hidden";
         slides_to_auto_load_input.style.visibility = "hidden";
         slides_to_auto_load_button.style.visibility = "hidden";
         slides_to_keep_input.style.visibility = "hidden";
         slides_to_keep_button.style.visibility = "hidden";
+        buffer_budget_input.style.visibility = "hidden";
+        buffer_budget_button.style.visibility = "hidden";
     }
 
     // add callbacks
@@ -149,9 +191,12 @@ function attach_nerdy_ui(): void {
     fallback_button.addEventListener("click", () => {
         URLParams.set("use_fallback", (!use_fallback).toString());
     });
-    cache_batch_size_button.addEventListener("click", () => {
-        let new_value = Number(cache_batch_size_input.value);
-        URLParams.set("cache_batch_size", new_value);
+    continuous_button.addEventListener("click", () => {
+        URLParams.set("presenter", presenter == "continuous" ? "buffer" : "continuous");
+    });
+    cache_window_size_button.addEventListener("click", () => {
+        let new_value = Number(cache_window_size_input.value);
+        URLParams.set("cache_window_size", new_value);
     });
     slides_to_auto_load_button.addEventListener("click", () => {
         let new_value = Number(slides_to_auto_load_input.value);
@@ -161,18 +206,59 @@ function attach_nerdy_ui(): void {
         let new_value = Number(slides_to_keep_input.value);
         URLParams.set("slides_to_keep", new_value);
     });
+    buffer_budget_button.addEventListener("click", () => {
+        let new_value = Number(buffer_budget_input.value);
+        URLParams.set("buffer_budget", new_value);
+    });
+}
+
+// keep the presentation available offline
+function register_service_worker(): void {
+    // only available over https or on localhost
+    if (!("serviceWorker" in navigator))
+        return;
+    navigator.serviceWorker.register("sw.js").then(() => {
+        console.log("Registered service worker");
+    }, (error) => {
+        console.error(`Failed to register service worker: ${error}`);
+    });
 }
 
-var cache_batch_size = 5;
+// a service worker registered by an earlier visit would keep serving the old videos
+function unregister_service_worker(): void {
+    if (!("serviceWorker" in navigator))
+        return;
+    navigator.serviceWorker.getRegistration().then((registration) => {
+        if (registration !== undefined)
+            registration.unregister().then(() => console.log("Unregistered service worker"));
+    });
+}
+
+var cache_window_size = 5;
 var slides_to_auto_load = 5;
 var slides_to_keep = 2;
+// in megabytes
+var buffer_budget = 256;
 var use_fallback = false;
+// "buffer" or "continuous", unless the fallback is used
+var presenter = "buffer";
+// reload changed slides when served by the watch mode
+var live_reload = false;
 var presentation: Presentation;
+var telemetry_overlay: TelemetryOverlay;
 
 document.body.onload = () => {
     URLParams.load();
     create_presentation();
+    create_telemetry_overlay();
     attach_media_ui();
     attach_keyboard_ui();
     attach_nerdy_ui();
+    // the service worker would keep serving the old videos
+    if (live_reload) {
+        unregister_service_worker();
+        connect_live_reload(presentation);
+    }
+    else
+        register_service_worker();
 }
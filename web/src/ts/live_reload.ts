@@ -0,0 +1,30 @@
+import { Presentation } from "./presenter/presentation";
+
+// sent by the watch mode whenever it has rendered a presentation again
+type ChangeEvent = {
+    presentation: string;
+    slides: number[];
+    slide_count: number;
+    version: number;
+};
+
+// reload the changed slides whenever this presentation has been rendered again
+export function connect_live_reload(presentation: Presentation): void {
+    if (!("EventSource" in window)) {
+        console.error("Live reload requires EventSource");
+        return;
+    }
+    let events = new EventSource("/__events");
+    events.onmessage = (message: MessageEvent) => {
+        let event = JSON.parse(message.data) as ChangeEvent;
+        // every presentation is stored in a folder named after it
+        if (!decodeURIComponent(location.pathname).split("/").includes(event.presentation))
+            return;
+        console.log(`Presentation has been rendered again, ${event.slides.length} slides have changed`);
+        presentation.reload_slides(event.slides, event.slide_count, event.version);
+    };
+    // reconnects by itself
+    events.onerror = (_) => {
+        console.error("Lost connection to the watch mode");
+    };
+}
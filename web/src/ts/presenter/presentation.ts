@@ -1,5 +1,7 @@
 import { get_json } from "../utils";
 import { ProgressBar } from "../progress_bar";
+import { Download, DownloadScheduler } from "../download_scheduler";
+import { telemetry } from "../telemetry";
 import { Slide, SlideJson, SlideType } from "./slide";
 
 import unselected_icon from "../../icons/radio_button_unchecked_black_24dp.svg";
@@ -11,16 +13,67 @@ import skip_slide_icon from "../../icons/arrow_downward_black_24dp.svg";
 import loop_slide_icon from "../../icons/rotate_left_black_24dp.svg";
 import complete_loop_slide_icon from "../../icons/loop_black_24dp.svg";
 
+// thumbnails of all slides in one image
+export type SpriteJson = {
+    image: string;
+    width: number;
+    height: number;
+};
+
+// only the first chunk of slides is stored in the index itself
 export type PresentationJson = {
     slides: SlideJson[];
+    // in all chunks, only set when there are chunks
+    slide_count?: number;
+    // files containing the other chunks in order
+    chunks?: string[];
+    // all slides in a single file
+    pack?: string;
+    sprite?: SpriteJson;
+};
+
+export type IndexChunkJson = {
+    slides: SlideJson[];
 };
 
+// in pixels, all timeline rows are the same height so only the visible ones have to exist
+const TIMELINE_ROW_HEIGHT = 36;
+// rows rendered above and below the visible ones to hide scrolling
+const TIMELINE_OVERSCAN = 10;
+// slide to continue with after the page has been reloaded by the live reload
+const START_SLIDE_KEY = `manim-web-presenter start slide ${location.pathname}`;
+
+// make the browser download changed files again
+function bypass_cache(url: string, version: number): string {
+    return `${url}?live=${version}`;
+}
+
+function bypass_slide_cache(slide: SlideJson, version: number): SlideJson {
+    return {
+        ...slide,
+        video: bypass_cache(slide.video, version),
+        renditions: slide.renditions?.map(rendition => ({ ...rendition, video: bypass_cache(rendition.video, version) })),
+        posters: slide.posters === undefined ? undefined : {
+            first: bypass_cache(slide.posters.first, version),
+            last: bypass_cache(slide.posters.last, version),
+        },
+    };
+}
+
 export abstract class Presentation {
     private timeline: HTMLTableElement;
-    private timeline_slides: HTMLImageElement[] = [];
+    private timeline_row_height = TIMELINE_ROW_HEIGHT;
+    // rendered rows [first, last)
+    private timeline_first = 0;
+    private timeline_last = 0;
+    private finished_slides = new Set<number>();
+    // selector icons of the rendered rows by slide, updated when switching slides
+    private timeline_selectors = new Map<number, HTMLImageElement>();
 
-    private cache_batch_size: number;
     private progress_bar: ProgressBar;
+    private download_scheduler: DownloadScheduler;
+    // slides of chunks loaded later get cached as well
+    private caching = false;
 
     // using two video elements for smooth transitions
     private video0: HTMLVideoElement;
@@ -30,12 +83,20 @@ export abstract class Presentation {
     private current_video = 1;
 
     protected slides: Slide[] = [];
+    // including the ones whose chunk hasn't been loaded yet
+    protected slide_count = 0;
+    // requested before its chunk has been loaded
+    private pending_slide = -1;
     protected current_slide = -1;
+    protected pack: string | null = null;
+    private sprite: SpriteJson | null = null;
     // used for restarting loops
     // <- has to be done to allow complete loops
-    private previous_slide = -1;
+    protected previous_slide = -1;
     // used for complete loops
-    private next_slide = 0;
+    protected next_slide = 0;
+    // continues a skip slide once its hold is over
+    private hold_timeout: number | null = null;
 
     public constructor(
         video0: HTMLVideoElement,
@@ -44,34 +105,130 @@ export abstract class Presentation {
         timeline: HTMLTableElement,
         progress_el: HTMLDivElement,
         bar_el: HTMLDivElement,
-        cache_batch_size: number) {
+        cache_window_size: number) {
 
         this.video0 = video0;
         this.video1 = video1;
         this.videos_div = videos_div;
         this.timeline = timeline;
         this.progress_bar = new ProgressBar(progress_el, bar_el);
-        this.cache_batch_size = cache_batch_size;
+        this.download_scheduler = new DownloadScheduler(cache_window_size, this.progress_bar, () => Math.max(0, this.current_slide));
+        telemetry.observe_video(video0, () => this.current_slide);
+        telemetry.observe_video(video1, () => this.current_slide);
 
         // load_slides
         get_json("index.json", (presentation_json: PresentationJson) => {
             // construct slides from json response
-            let slides = presentation_json.slides;
-            for (let i = 0; i < slides.length; ++i)
-                this.add_slide(slides[i]);
-            console.log(`All ${slides.length} slides have been parsed successfully.`)
+            this.pack = presentation_json.pack ?? null;
+            this.sprite = presentation_json.sprite ?? null;
+            this.slide_count = presentation_json.slide_count ?? presentation_json.slides.length;
+            for (let slide of presentation_json.slides)
+                this.add_slide(slide);
 
-            this.progress_bar.set_max(slides.length);
             this.load_timeline();
             // start the action
-            this.play_slide(0);
+            let start_slide = Number(sessionStorage.getItem(START_SLIDE_KEY) ?? 0);
+            sessionStorage.removeItem(START_SLIDE_KEY);
+            this.play_slide(Math.min(Math.max(0, start_slide), this.slide_count - 1));
+            // the rest gets parsed while the first slide plays
+            this.load_chunks(presentation_json.chunks ?? []);
+        });
+    }
+
+    // load the remaining chunks of the index one after another
+    private load_chunks(chunks: string[]): void {
+        if (chunks.length == 0) {
+            console.log(`All ${this.slides.length} slides have been parsed successfully.`);
+            // continue caching from before the page has been reloaded
+            if (this.download_scheduler.was_interrupted())
+                this.cache();
+            return;
+        }
+        get_json(chunks[0], (chunk: IndexChunkJson) => {
+            let first_new_slide = this.slides.length;
+            for (let slide of chunk.slides)
+                this.add_slide(slide);
+            if (this.caching)
+                this.download_scheduler.add(this.get_downloads(this.slides.slice(first_new_slide)));
+            this.render_timeline(true);
+            if (this.pending_slide != -1 && this.pending_slide < this.slides.length) {
+                let slide = this.pending_slide;
+                this.pending_slide = -1;
+                this.play_slide(slide, true);
+            }
+            // buffer the newly known slides
+            else if (this.current_slide != -1)
+                this.update_source();
+            this.load_chunks(chunks.slice(1));
         });
     }
 
-    private update_video(): void {
+    // index and all of its chunks
+    private load_all_slides(version: number, callback: (presentation_json: PresentationJson, slides: SlideJson[]) => void): void {
+        get_json(bypass_cache("index.json", version), (presentation_json: PresentationJson) => {
+            let slides = presentation_json.slides;
+            let load_chunks = (chunks: string[]) => {
+                if (chunks.length == 0) {
+                    callback(presentation_json, slides);
+                    return;
+                }
+                get_json(bypass_cache(chunks[0], version), (chunk: IndexChunkJson) => {
+                    slides = slides.concat(chunk.slides);
+                    load_chunks(chunks.slice(1));
+                });
+            };
+            load_chunks(presentation_json.chunks ?? []);
+        });
+    }
+
+    // live reload: replace the slides that have been rendered again and stay on the current slide
+    // version is different for every render
+    public reload_slides(slide_ids: number[], slide_count: number, version: number): void {
+        if (slide_count != this.slide_count) {
+            this.reload_page();
+            return;
+        }
+        this.load_all_slides(version, (presentation_json: PresentationJson, slides: SlideJson[]) => {
+            this.pack = presentation_json.pack === undefined ? null : bypass_cache(presentation_json.pack, version);
+            this.sprite = presentation_json.sprite === undefined ? null : { ...presentation_json.sprite, image: bypass_cache(presentation_json.sprite.image, version) };
+            // earlier slides changing their size move the unchanged ones in the pack
+            for (let slide_id = 0; slide_id < this.slides.length; ++slide_id)
+                if (!slide_ids.includes(slide_id))
+                    this.slides[slide_id].move_in_pack(this.pack, slides[slide_id].offset ?? 0);
+            for (let slide_id of slide_ids) {
+                // the chunk of that slide hasn't been loaded yet and is already up to date
+                if (slide_id >= this.slides.length)
+                    continue;
+                if (!this.replace_slide(bypass_slide_cache(slides[slide_id], version))) {
+                    this.reload_page();
+                    return;
+                }
+            }
+            console.log(`Reloaded ${slide_ids.length} slides`);
+            this.render_timeline(true);
+            if (slide_ids.includes(this.current_slide)) {
+                // play the new version, not the one that is still in the video element
+                this.previous_slide = -1;
+                this.play_slide(this.current_slide, true);
+            }
+            else
+                this.update_source();
+        });
+    }
+
+    // continue with the current slide after the reload
+    private reload_page(): void {
+        sessionStorage.setItem(START_SLIDE_KEY, Math.max(0, this.current_slide).toString());
+        location.reload();
+    }
+
+    // switch to current_slide
+    // to be overwritten by presenters not using two video elements
+    protected update_video(): void {
         // correct slide already current
         if (this.current_slide == this.previous_slide) {
             // restart video
+            telemetry.measure_switch(this.get_current_video(), this.current_slide);
             this.get_current_video().currentTime = 0;
             this.get_current_video().play();
             return;
@@ -83,29 +240,30 @@ export abstract class Presentation {
         let next_element = this.get_current_video();
 
         // double buffering: setup new video
+        // the poster is shown immediately, hiding the time it takes to decode the video
+        next_element.poster = current_slide_elem.get_poster() ?? "";
         next_element.src = current_slide_elem.get_src_url();
         next_element.style.visibility = "visible";
+        // the browser restarts loops without a gap, no ended event is fired in between
+        // complete loops stop looping once the next slide has been requested
+        next_element.loop = current_slide_elem.get_type() == SlideType.LOOP || current_slide_elem.get_type() == SlideType.COMPLETE_LOOP;
 
         // set callback for when video has ended
         switch (current_slide_elem.get_type()) {
             case SlideType.SKIP:
                 next_element.onended = (_) => {
-                    // immediately go to next slide without user input
-                    ++this.current_slide;
-                    this.next_slide = this.current_slide;
-                    this.update_video();
+                    // go to next slide without user input once the hold is over
+                    // waits when that slide hasn't been loaded yet
+                    this.after_hold(() => this.play_slide(this.current_slide + 1, true));
                 }
                 break;
             case SlideType.LOOP:
-                next_element.onended = (_) => {
-                    // restart from beginning
-                    this.update_video();
-                }
+                // looping natively
+                next_element.onended = (_) => { }
                 break;
             case SlideType.COMPLETE_LOOP:
                 next_element.onended = (_) => {
-                    // when next slide has changed, go to next one
-                    // otherwise restart
+                    // only ends once the next slide has been requested
                     this.current_slide = this.next_slide;
                     this.update_video();
                 }
@@ -118,6 +276,7 @@ export abstract class Presentation {
 
         console.log(`Playing slide '${current_slide_elem.get_name()}'`)
         // hide old video once new one plays
+        telemetry.measure_switch(next_element, this.current_slide);
         next_element.play().then(() => {
             // pause old video to not call onended callback again when that video ends in background
             last_element.pause();
@@ -132,15 +291,22 @@ export abstract class Presentation {
     }
 
     public play_slide(slide: number, skip_complete_loop = false): void {
-        if (slide < 0 || slide >= this.slides.length) {
+        if (slide < 0 || slide >= this.slide_count) {
             console.error(`Trying to switch to invalid slide index #${slide}`)
             return;
         }
+        if (slide >= this.slides.length) {
+            console.log(`Slide #${slide} hasn't been loaded yet, switching once it has`);
+            this.pending_slide = slide;
+            return;
+        }
         console.log(`Switching to slide '${this.slides[slide].get_name()} '`)
+        this.cancel_hold();
 
         if (this.current_slide != -1 && this.slides[this.current_slide].get_type() == SlideType.COMPLETE_LOOP && !skip_complete_loop) {
             // if current slide is complete loop, wait until slide finishes
             this.next_slide = slide;
+            this.finish_complete_loop(slide != this.current_slide);
         } else {
             // instantly switch the video
             this.next_slide = slide;
@@ -149,6 +315,34 @@ export abstract class Presentation {
         }
     }
 
+    // keep showing the last frame of the current slide for its trimmed hold before calling callback
+    // switching slides in the meantime cancels the callback
+    protected after_hold(callback: () => void): void {
+        let hold = this.slides[this.current_slide].get_hold();
+        if (hold <= 0) {
+            callback();
+            return;
+        }
+        this.cancel_hold();
+        this.hold_timeout = window.setTimeout(() => {
+            this.hold_timeout = null;
+            callback();
+        }, hold * 1000);
+    }
+
+    private cancel_hold(): void {
+        if (this.hold_timeout === null)
+            return;
+        clearTimeout(this.hold_timeout);
+        this.hold_timeout = null;
+    }
+
+    // let the current complete loop end after this iteration or keep it looping
+    // to be overwritten by presenters not using two video elements
+    protected finish_complete_loop(finish: boolean): void {
+        this.get_current_video().loop = !finish;
+    }
+
     public play_next_slide(): void {
         this.play_slide(this.current_slide + 1);
     }
@@ -163,66 +357,142 @@ export abstract class Presentation {
     }
 
     private load_timeline(): void {
-        for (let slide of this.slides) {
-            // one row, three cells per slide
-            let row = document.createElement("tr");
-            this.timeline.appendChild(row);
-            row.onclick = () => {
-                this.play_slide(slide.get_id(), true);
-            };
+        // rows have to fit the thumbnails
+        let thumbnail = this.slides.length == 0 ? null : this.slides[0].get_thumbnail();
+        if (this.sprite !== null && thumbnail !== null)
+            this.timeline_row_height = Math.max(TIMELINE_ROW_HEIGHT, thumbnail.height + 6);
+        let container = this.timeline.parentElement;
+        if (container !== null)
+            container.addEventListener("scroll", () => this.render_timeline(false), { passive: true });
+        window.addEventListener("resize", () => this.render_timeline(false));
+        this.render_timeline(true);
+    }
 
-            // selector
-            let cell1 = document.createElement("td");
-            row.appendChild(cell1);
-            let selector = document.createElement("img");
-            cell1.appendChild(selector);
-            selector.src = unselected_icon;
-            selector.width = 30;
-            selector.height = 30;
-            this.timeline_slides.push(selector);
-
-            // slide type
-            let cell2 = document.createElement("td");
-            row.appendChild(cell2);
-            let slide_icon = document.createElement("img");
-            cell2.appendChild(slide_icon);
-            switch (slide.get_type()) {
-                case SlideType.NORMAL:
-                    slide_icon.src = normal_slide_icon;
-                    break;
-                case SlideType.SKIP:
-                    slide_icon.src = skip_slide_icon;
-                    break;
-                case SlideType.LOOP:
-                    slide_icon.src = loop_slide_icon;
-                    break;
-                case SlideType.COMPLETE_LOOP:
-                    slide_icon.src = complete_loop_slide_icon;
-                    break;
-            }
-            selector.width = 30;
-            selector.height = 30;
-
-            // button
-            let cell3 = document.createElement("td");
-            row.appendChild(cell3);
-            let button = document.createElement("button");
-            cell2.appendChild(button);
-            button.innerText = slide.get_name();
+    // only create the rows currently visible
+    // the rows above and below are replaced with a spacer each
+    private render_timeline(force: boolean): void {
+        let container = this.timeline.parentElement;
+        let scroll_top = container === null ? 0 : container.scrollTop - this.timeline.offsetTop;
+        let view_height = container === null ? window.innerHeight : container.clientHeight;
+        let first = Math.max(0, Math.floor(scroll_top / this.timeline_row_height) - TIMELINE_OVERSCAN);
+        let last = Math.min(this.slide_count, Math.ceil((scroll_top + view_height) / this.timeline_row_height) + TIMELINE_OVERSCAN);
+        if (!force && first == this.timeline_first && last == this.timeline_last)
+            return;
+        this.timeline_first = first;
+        this.timeline_last = last;
+
+        for (let row of Array.from(this.timeline.querySelectorAll("tr")))
+            row.remove();
+        this.timeline_selectors.clear();
+        this.timeline.appendChild(this.create_spacer(first));
+        for (let slide = first; slide < last; ++slide)
+            this.timeline.appendChild(this.create_timeline_row(slide));
+        this.timeline.appendChild(this.create_spacer(this.slide_count - last));
+    }
+
+    // rows without cells collapse in some browsers
+    private create_spacer(rows: number): HTMLTableRowElement {
+        let spacer = document.createElement("tr");
+        let cell = document.createElement("td");
+        spacer.appendChild(cell);
+        cell.colSpan = 4;
+        cell.style.padding = "0";
+        cell.style.height = `${rows * this.timeline_row_height}px`;
+        return spacer;
+    }
+
+    private get_selector_icon(slide_id: number): string {
+        if (slide_id == this.current_slide)
+            return selected_icon;
+        if (this.finished_slides.has(slide_id))
+            return finished_icon;
+        return unselected_icon;
+    }
+
+    // one row, three or four cells per slide
+    private create_timeline_row(slide_id: number): HTMLTableRowElement {
+        let row = document.createElement("tr");
+        row.style.height = `${this.timeline_row_height}px`;
+        row.onclick = () => {
+            this.play_slide(slide_id, true);
+        };
+        let slide = slide_id < this.slides.length ? this.slides[slide_id] : null;
+
+        // selector
+        let cell1 = document.createElement("td");
+        row.appendChild(cell1);
+        let selector = document.createElement("img");
+        cell1.appendChild(selector);
+        selector.src = this.get_selector_icon(slide_id);
+        this.timeline_selectors.set(slide_id, selector);
+        selector.width = 30;
+        selector.height = 30;
+
+        // slide type
+        let cell2 = document.createElement("td");
+        row.appendChild(cell2);
+        // chunk not loaded yet
+        if (slide === null) {
+            cell2.innerText = `Slide #${slide_id}`;
+            return row;
         }
+        let slide_icon = document.createElement("img");
+        cell2.appendChild(slide_icon);
+        switch (slide.get_type()) {
+            case SlideType.NORMAL:
+                slide_icon.src = normal_slide_icon;
+                break;
+            case SlideType.SKIP:
+                slide_icon.src = skip_slide_icon;
+                break;
+            case SlideType.LOOP:
+                slide_icon.src = loop_slide_icon;
+                break;
+            case SlideType.COMPLETE_LOOP:
+                slide_icon.src = complete_loop_slide_icon;
+                break;
+        }
+
+        // button
+        let cell3 = document.createElement("td");
+        row.appendChild(cell3);
+        let button = document.createElement("button");
+        cell2.appendChild(button);
+        button.innerText = slide.get_name();
+
+        // thumbnail, cut out of the sprite sheet without loading the video
+        let thumbnail = slide.get_thumbnail();
+        if (this.sprite !== null && thumbnail !== null) {
+            let cell4 = document.createElement("td");
+            row.appendChild(cell4);
+            let thumbnail_el = document.createElement("div");
+            cell4.appendChild(thumbnail_el);
+            thumbnail_el.className = "timeline-thumbnail";
+            thumbnail_el.style.width = `${thumbnail.width}px`;
+            thumbnail_el.style.height = `${thumbnail.height}px`;
+            thumbnail_el.style.backgroundImage = `url("${this.sprite.image}")`;
+            thumbnail_el.style.backgroundPosition = `-${thumbnail.x}px -${thumbnail.y}px`;
+        }
+        return row;
     }
 
-    private update_timeline(): void {
-        // remove old indicator
-        if (this.previous_slide != -1) {
-            this.timeline_slides[this.previous_slide].src = finished_icon;
+    protected update_timeline(): void {
+        // old indicator becomes finished
+        if (this.previous_slide != -1 && this.previous_slide != this.current_slide)
+            this.finished_slides.add(this.previous_slide);
+        // only the selectors of the old and new slide change
+        for (let slide_id of [this.previous_slide, this.current_slide]) {
+            let selector = this.timeline_selectors.get(slide_id);
+            if (selector !== undefined)
+                selector.src = this.get_selector_icon(slide_id);
         }
-        // add new indicator
-        this.timeline_slides[this.current_slide].src = selected_icon;
     }
 
     public get_current_slide(): number { return this.current_slide; }
 
+    // memory taken up by buffered videos
+    public get_buffered_bytes(): number { return 0; }
+
     private get_current_video(): HTMLVideoElement {
         if (this.current_video == 0)
             return this.video0;
@@ -230,32 +500,14 @@ export abstract class Presentation {
             return this.video1;
     }
 
-    // recursive; downloads everything after offset in batches
-    private cache_batch(offset: number): void {
-        this.progress_bar.show();
-        let finished = offset;
-        // cache one whole batch
-        for (let i = offset, len = Math.min(offset + this.cache_batch_size, this.slides.length); i < len; ++i)
-            this.slides[i].cache(() => {
-                // when this slide has been cached
-                this.progress_bar.update(finished);
-                ++finished;
-                // all finished
-                if (finished == this.slides.length) {
-                    console.log(`Batch caching complete with offset ${offset}`)
-                    console.log("Caching complete");
-                    this.progress_bar.hide();
-                }
-                // start next batch
-                else if (finished == offset + this.cache_batch_size) {
-                    console.log(`Batch caching complete with offset ${offset}`)
-                    this.cache_batch(finished);
-                }
-            });
+    private get_downloads(slides: Slide[]): Download[] {
+        return slides.reduce((downloads: Download[], slide) => downloads.concat(slide.get_downloads()), []);
     }
 
+    // download all videos the presenter plays into the browser cache
     public cache(): void {
-        this.cache_batch(0);
+        this.caching = true;
+        this.download_scheduler.start(this.get_downloads(this.slides));
     }
 
     // todo: doesn't work on safari
@@ -297,6 +549,10 @@ export abstract class Presentation {
 
     protected abstract add_slide(slide: SlideJson): void;
 
+    // exchange a slide that has been rendered again
+    // returns false when that's not possible without reloading the page
+    protected replace_slide(_slide: SlideJson): boolean { return false; }
+
     // called after slide changed
     // to be overwritten if required
     protected update_source(): void { }
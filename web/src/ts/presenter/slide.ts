@@ -1,3 +1,45 @@
+import { Download } from "../download_scheduler";
+
+// codec of presentations created before codecs have been probed
+export const DEFAULT_CODEC = "avc1.64002A";
+
+// version of a slide video with a certain resolution
+export type RenditionJson = {
+    video: string;
+    // RFC 6381 codec string
+    codec: string;
+    width: number;
+    height: number;
+    // in bytes
+    size: number;
+    // bits per second
+    bitrate: number;
+};
+
+// first and last frame of a slide
+export type PostersJson = {
+    first: string;
+    last: string;
+};
+
+// position of the slide's thumbnail in the sprite sheet
+export type ThumbnailJson = {
+    x: number;
+    y: number;
+    width: number;
+    height: number;
+};
+
+// single animation shared with other slides and presentations
+export type SegmentJson = {
+    // relative to the presentation
+    video: string;
+    // in bytes
+    size: number;
+    // in seconds
+    duration: number;
+};
+
 export type SlideJson = {
     slide_type: string;
     name: string;
@@ -5,6 +47,20 @@ export type SlideJson = {
     first_animation: number;
     after_last_animation: number;
     video: string;
+    // in bytes
+    size: number;
+    // position in the pack file, if there is one
+    offset?: number;
+    // in seconds
+    duration?: number;
+    // sorted from best to worst, the first one is the video itself
+    renditions?: RenditionJson[];
+    posters?: PostersJson;
+    thumbnail?: ThumbnailJson;
+    // the animations of the slide in the best rendition
+    segments?: SegmentJson[];
+    // in seconds, identical frames cut from the end of the video
+    hold?: number;
 };
 
 export enum SlideType {
@@ -31,29 +87,81 @@ export abstract class Slide {
     protected name: string;
     protected slide_id: number;
     protected video: string;
+    protected size: number;
+    protected offset: number;
+    protected duration: number;
+    protected renditions: RenditionJson[];
+    protected posters: PostersJson | null;
+    protected thumbnail: ThumbnailJson | null;
+    protected segments: SegmentJson[] | null;
+    protected hold: number;
 
     public constructor(slide: SlideJson) {
         this.type = get_slide_type(slide.slide_type);
         this.name = slide.name;
         this.slide_id = slide.slide_id;
         this.video = slide.video;
+        this.size = slide.size;
+        this.offset = slide.offset ?? 0;
+        this.duration = slide.duration ?? 0;
+        this.renditions = slide.renditions ?? [{
+            video: slide.video,
+            codec: DEFAULT_CODEC,
+            width: 0,
+            height: 0,
+            size: slide.size,
+            bitrate: 0,
+        }];
+        this.posters = slide.posters ?? null;
+        this.thumbnail = slide.thumbnail ?? null;
+        this.segments = slide.segments ?? null;
+        this.hold = slide.hold ?? 0;
     }
 
-    public cache(on_cached: () => void): void {
-        let request = new XMLHttpRequest();
-        request.onload = () => {
-            console.log(`Cached slide '${this.name}'`)
-            on_cached();
-        };
-        request.onerror = () => {
-            console.error(`Slide '${this.name}' failed to be cached`);
+    // files the presenter plays this slide from, used to cache them
+    // to be overwritten by slides not playing the video of the slide itself
+    public get_downloads(): Download[] {
+        return [{
+            // changes when the video gets rendered differently
+            name: `${this.video} ${this.size}`,
+            url: this.video,
+            range: null,
+            size: this.size,
+            slide: this.slide_id,
+        }];
+    }
+
+    protected get_segment_downloads(): Download[] {
+        // named after their content
+        return this.segments!.map(segment => ({ name: segment.video, url: segment.video, range: null, size: segment.size, slide: this.slide_id }));
+    }
+
+    protected get_pack_download(pack: string): Download {
+        return {
+            name: `${pack} ${this.offset} ${this.size}`,
+            url: pack,
+            range: [this.offset, this.offset + this.size],
+            size: this.size,
+            slide: this.slide_id,
         };
-        request.open("GET", this.video, true);
-        request.send();
+    }
+
+    // the pack has been written again, e.g. in watch mode, but the video of this slide hasn't changed
+    // to be overwritten by slides loading from the pack
+    public move_in_pack(_pack: string | null, offset: number): void {
+        this.offset = offset;
     }
 
     public get_type(): SlideType { return this.type; }
     public get_name(): string { return this.name; }
     public get_id(): number { return this.slide_id; }
+    public get_size(): number { return this.size; }
+    public get_offset(): number { return this.offset; }
+    public get_duration(): number { return this.duration; }
+    // the last frame has to be shown this long after the video has ended
+    public get_hold(): number { return this.hold; }
+    // shown until the video can be played
+    public get_poster(): string | null { return this.posters === null ? null : this.posters.first; }
+    public get_thumbnail(): ThumbnailJson | null { return this.thumbnail; }
     public abstract get_src_url(): string;
 }
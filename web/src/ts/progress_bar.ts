@@ -1,11 +1,13 @@
 export class ProgressBar {
     private progress_el: HTMLDivElement;
     private bar_el: HTMLDivElement;
+    private text_el: HTMLSpanElement | null;
     private max: number;
 
     public constructor(progress_el: HTMLDivElement, bar_el: HTMLDivElement, max: number = -1) {
         this.progress_el = progress_el;
         this.bar_el = bar_el;
+        this.text_el = progress_el.querySelector(".progress-text");
         this.max = max;
     }
 
@@ -15,6 +17,14 @@ export class ProgressBar {
         this.max = max;
     }
 
+    public get_max(): number { return this.max; }
+
+    // e.g. download speed
+    public set_text(text: string): void {
+        if (this.text_el !== null)
+            this.text_el.innerText = text;
+    }
+
     public show(): void {
         this.progress_el.style.visibility = "visible";
     }
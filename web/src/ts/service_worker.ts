@@ -0,0 +1,162 @@
+// served as sw.js next to the index.html of a presentation
+// the Python side prepends the asset manifest of the build as ASSET_MANIFEST
+// every asset is kept in Cache Storage so that the presentation works offline
+// when the presentation gets rebuilt, sw.js changes and only the changed assets get downloaded again
+
+type AssetManifest = {
+    // changes whenever any asset changes
+    version: string;
+    // sha256 by path relative to the presentation folder
+    assets: { [path: string]: string };
+};
+
+// the webworker lib can't be used together with the dom lib
+interface ExtendableEvent extends Event {
+    waitUntil(promise: Promise<any>): void;
+}
+interface FetchEvent extends ExtendableEvent {
+    request: Request;
+    respondWith(response: Promise<Response>): void;
+}
+interface ServiceWorkerScope {
+    registration: { scope: string };
+    clients: { claim(): Promise<void> };
+    skipWaiting(): Promise<void>;
+    addEventListener(type: "install" | "activate", listener: (event: ExtendableEvent) => void): void;
+    addEventListener(type: "fetch", listener: (event: FetchEvent) => void): void;
+}
+
+declare const ASSET_MANIFEST: AssetManifest;
+
+// requests in flight while precaching, large presentations consist of thousands of files
+const PRECACHE_WINDOW_SIZE = 4;
+
+const worker = self as unknown as ServiceWorkerScope;
+// all presentations on the same origin share the Cache Storage
+const cache_name = `manim-web-presenter ${worker.registration.scope}`;
+// the manifest of the cached assets is stored next to them
+const manifest_url = get_url("__asset_manifest__");
+
+function get_url(path: string): string {
+    return new URL(path, worker.registration.scope).href;
+}
+
+// path relative to the presentation folder, null if outside of it
+function get_path(url: string): string | null {
+    let without_search = new URL(url);
+    without_search.search = "";
+    without_search.hash = "";
+    if (!without_search.href.startsWith(worker.registration.scope))
+        return null;
+    let path = without_search.href.slice(worker.registration.scope.length);
+    return path == "" ? "index.html" : decodeURIComponent(path);
+}
+
+// only download assets that changed since the last build
+async function precache(): Promise<void> {
+    let cache = await caches.open(cache_name);
+    let previous_response = await cache.match(manifest_url);
+    let previous: AssetManifest | null = previous_response === undefined ? null : await previous_response.json();
+
+    let paths = Object.keys(ASSET_MANIFEST.assets);
+    let next = 0;
+    // each worker takes the next asset once it's done with the previous one
+    let precache_next = async () => {
+        while (next < paths.length) {
+            let path = paths[next++];
+            let url = get_url(path);
+            if (previous !== null && previous.assets[path] === ASSET_MANIFEST.assets[path] && await cache.match(url) !== undefined)
+                continue;
+            // the http cache might still contain the old version
+            let response = await fetch(url, { cache: "reload" });
+            if (!response.ok)
+                throw new Error(`Failed to precache '${path}': status ${response.status}`);
+            await cache.put(url, response);
+        }
+    };
+    let workers: Promise<void>[] = [];
+    for (let i = 0; i < Math.min(PRECACHE_WINDOW_SIZE, paths.length); ++i)
+        workers.push(precache_next());
+    await Promise.all(workers);
+
+    // forget removed assets
+    for (let request of await cache.keys()) {
+        let path = get_path(request.url);
+        if (request.url != manifest_url && (path === null || !(path in ASSET_MANIFEST.assets)))
+            await cache.delete(request);
+    }
+    await cache.put(manifest_url, new Response(JSON.stringify(ASSET_MANIFEST)));
+    console.log(`Precached presentation version ${ASSET_MANIFEST.version}`);
+}
+
+// [start, end) of the range header, null if it can't be satisfied
+function parse_range(range: string, size: number): [number, number] | null {
+    let match = /^bytes=(\d*)-(\d*)$/.exec(range.trim());
+    if (match === null || (match[1] === "" && match[2] === ""))
+        return null;
+    let start: number;
+    let end: number;
+    // last bytes
+    if (match[1] === "") {
+        start = Math.max(0, size - Number(match[2]));
+        end = size;
+    }
+    else {
+        start = Number(match[1]);
+        end = match[2] === "" ? size : Math.min(Number(match[2]) + 1, size);
+    }
+    return start < end ? [start, end] : null;
+}
+
+// video elements and the pack loader request byte ranges
+async function get_range_response(response: Response, range_header: string): Promise<Response> {
+    // blobs don't have to be held in memory
+    let blob = await response.blob();
+    let range = parse_range(range_header, blob.size);
+    if (range === null)
+        return new Response(null, { status: 416, headers: { "Content-Range": `bytes */${blob.size}` } });
+    return new Response(blob.slice(range[0], range[1]), {
+        status: 206,
+        statusText: "Partial Content",
+        headers: {
+            "Content-Type": response.headers.get("Content-Type") ?? "application/octet-stream",
+            "Content-Length": (range[1] - range[0]).toString(),
+            "Content-Range": `bytes ${range[0]}-${range[1] - 1}/${blob.size}`,
+            "Accept-Ranges": "bytes",
+        },
+    });
+}
+
+async function respond(request: Request, path: string): Promise<Response> {
+    let cache = await caches.open(cache_name);
+    let response = await cache.match(get_url(path));
+    if (response === undefined)
+        return fetch(request);
+    let range = request.headers.get("Range");
+    if (range === null)
+        return response;
+    return get_range_response(response, range);
+}
+
+worker.addEventListener("install", (event) => {
+    event.waitUntil(precache().then(() => worker.skipWaiting()));
+});
+
+worker.addEventListener("activate", (event) => {
+    event.waitUntil(worker.clients.claim());
+});
+
+// cache first for all assets of the presentation
+worker.addEventListener("fetch", (event) => {
+    if (event.request.method != "GET")
+        return;
+    // live reload asks for the newest version of changed files, which hasn't been precached
+    if (new URL(event.request.url).searchParams.has("live"))
+        return;
+    let path = get_path(event.request.url);
+    if (path === null || !(path in ASSET_MANIFEST.assets))
+        return;
+    event.respondWith(respond(event.request, path));
+});
+
+export { };
@@ -0,0 +1,186 @@
+// what the audience experiences, recorded for the entire session
+// the log can be exported to tune the buffer settings for a venue
+
+// older events get dropped
+const MAX_EVENTS = 10000;
+// in milliseconds
+const OVERLAY_INTERVAL = 500;
+
+export type TelemetryEvent = {
+    // switch, stall, stalled, loop, load, load_failed, download or download_failed
+    type: string;
+    // milliseconds since the page has been opened
+    time: number;
+    slide?: number;
+    // duration in milliseconds
+    ms?: number;
+    bytes?: number;
+    // file or files the bytes have been loaded from
+    source?: string;
+};
+
+function format_bytes(bytes: number): string {
+    return `${(bytes / (1024 * 1024)).toFixed(1)}MB`;
+}
+
+// bytes per millisecond as megabits per second
+function format_throughput(bytes: number, ms: number): string {
+    return ms > 0 ? `${(bytes * 8 / ms / 1000).toFixed(1)}Mbit/s` : "-";
+}
+
+function percentile(values: number[], fraction: number): number {
+    if (values.length == 0)
+        return 0;
+    let sorted = values.slice().sort((a, b) => a - b);
+    return sorted[Math.min(sorted.length - 1, Math.floor(fraction * sorted.length))];
+}
+
+// not in the dom types yet
+type FrameCallback = (now: number, metadata: { mediaTime: number }) => void;
+type FrameVideo = HTMLVideoElement & { requestVideoFrameCallback?: (callback: FrameCallback) => number };
+
+export class Telemetry {
+    private events: TelemetryEvent[] = [];
+    private started = new Date();
+    // used to tell switches apart, only the latest one gets measured
+    private switch_count = 0;
+
+    public record(event: Omit<TelemetryEvent, "time">): void {
+        this.events.push({ time: performance.now(), ...event });
+        if (this.events.length > MAX_EVENTS)
+            this.events.splice(0, this.events.length - MAX_EVENTS);
+    }
+
+    // time until the first frame of the slide has been shown
+    // has to be called right before the video is started or seeked
+    public measure_switch(video: HTMLVideoElement, slide: number): void {
+        let start = performance.now();
+        let switch_id = ++this.switch_count;
+        let done = () => {
+            // superseded by a newer switch
+            if (switch_id != this.switch_count)
+                return;
+            this.record({ type: "switch", slide: slide, ms: performance.now() - start });
+        };
+        let frame_video = video as FrameVideo;
+        if (frame_video.requestVideoFrameCallback !== undefined)
+            frame_video.requestVideoFrameCallback(done);
+        else
+            video.addEventListener("playing", done, { once: true });
+    }
+
+    // measure the time a video waits for data while playing
+    public observe_video(video: HTMLVideoElement, get_slide: () => number): void {
+        let stall_start: number | null = null;
+        video.addEventListener("waiting", () => {
+            if (stall_start === null)
+                stall_start = performance.now();
+        });
+        let end_stall = () => {
+            if (stall_start === null)
+                return;
+            this.record({ type: "stall", slide: get_slide(), ms: performance.now() - stall_start });
+            stall_start = null;
+        };
+        video.addEventListener("playing", end_stall);
+        video.addEventListener("pause", end_stall);
+        // the browser isn't receiving data even though it's trying to
+        video.addEventListener("stalled", () => {
+            this.record({ type: "stalled", slide: get_slide() });
+        });
+        this.observe_loops(video as FrameVideo, get_slide);
+    }
+
+    // time between the last frame of a loop and the first frame of the next iteration
+    // ideally a single frame interval
+    private observe_loops(video: FrameVideo, get_slide: () => number): void {
+        if (video.requestVideoFrameCallback === undefined)
+            return;
+        let last_media_time = -1;
+        let last_now = 0;
+        let last_slide = -1;
+        let on_frame: FrameCallback = (now, metadata) => {
+            let slide = get_slide();
+            // going back in the same slide
+            if (slide == last_slide && metadata.mediaTime < last_media_time)
+                this.record({ type: "loop", slide: slide, ms: now - last_now });
+            last_media_time = metadata.mediaTime;
+            last_now = now;
+            last_slide = slide;
+            video.requestVideoFrameCallback!(on_frame);
+        };
+        video.requestVideoFrameCallback(on_frame);
+    }
+
+    private get_events(type: string): TelemetryEvent[] {
+        return this.events.filter(event => event.type == type);
+    }
+
+    public get_summary(buffered_bytes: number): string[] {
+        let switches = this.get_events("switch").map(event => event.ms!);
+        let stalls = this.get_events("stall").map(event => event.ms!);
+        let loops = this.get_events("loop").map(event => event.ms!);
+        let loads = this.get_events("load");
+        let downloads = this.get_events("download");
+        let last_load = loads.length == 0 ? null : loads[loads.length - 1];
+        let sum = (events: TelemetryEvent[], name: "ms" | "bytes") => events.reduce((total, event) => total + (event[name] ?? 0), 0);
+        return [
+            `switch to first frame: last ${switches.length == 0 ? "-" : switches[switches.length - 1].toFixed(0)}ms, median ${percentile(switches, 0.5).toFixed(0)}ms, p95 ${percentile(switches, 0.95).toFixed(0)}ms (${switches.length} switches)`,
+            `loop boundaries: median ${percentile(loops, 0.5).toFixed(0)}ms, max ${loops.reduce((max, ms) => Math.max(max, ms), 0).toFixed(0)}ms (${loops.length} loops)`,
+            `stalls: ${stalls.length}, ${(stalls.reduce((total, ms) => total + ms, 0) / 1000).toFixed(1)}s in total, ${this.get_events("stalled").length} network stalls`,
+            `loads: ${loads.length}, ${this.get_events("load_failed").length} failed, last ${last_load === null ? "-" : format_throughput(last_load.bytes!, last_load.ms!)}, average ${format_throughput(sum(loads, "bytes"), sum(loads, "ms"))}`,
+            `cached: ${downloads.length} files, ${format_bytes(sum(downloads, "bytes"))}, ${this.get_events("download_failed").length} failed attempts`,
+            `buffered: ${format_bytes(buffered_bytes)}`,
+        ];
+    }
+
+    // download the session log as a json file
+    public export(buffered_bytes: number): void {
+        let log = {
+            started: this.started.toISOString(),
+            url: location.href,
+            user_agent: navigator.userAgent,
+            summary: this.get_summary(buffered_bytes),
+            events: this.events,
+        };
+        let anchor = document.createElement("a");
+        anchor.href = URL.createObjectURL(new Blob([JSON.stringify(log, null, 2)], { type: "application/json" }));
+        anchor.download = `telemetry-${this.started.toISOString().replace(/[:.]/g, "-")}.json`;
+        anchor.click();
+        URL.revokeObjectURL(anchor.href);
+    }
+}
+
+// shared by everything that gets measured
+export const telemetry = new Telemetry();
+
+// on-screen summary, updated while visible
+export class TelemetryOverlay {
+    private element: HTMLElement;
+    private text_el: HTMLElement;
+    private get_buffered_bytes: () => number;
+    private interval: number | null = null;
+
+    public constructor(element: HTMLElement, text_el: HTMLElement, export_button: HTMLButtonElement, get_buffered_bytes: () => number) {
+        this.element = element;
+        this.text_el = text_el;
+        this.get_buffered_bytes = get_buffered_bytes;
+        export_button.addEventListener("click", () => telemetry.export(this.get_buffered_bytes()));
+    }
+
+    public toggle(): void {
+        if (this.interval !== null) {
+            clearInterval(this.interval);
+            this.interval = null;
+            this.element.style.display = "none";
+            return;
+        }
+        this.element.style.display = "block";
+        this.update();
+        this.interval = window.setInterval(() => this.update(), OVERLAY_INTERVAL);
+    }
+
+    private update(): void {
+        this.text_el.innerText = telemetry.get_summary(this.get_buffered_bytes()).join("\n");
+    }
+}
@@ -10,3 +10,80 @@ export function get_json(url: string, callback: { (response: any): void; }): voi
     request.open("GET", url, true);
     request.send();
 }
+
+// download file or byte range [start, end) of it, handing over the data as it arrives
+// position is the offset of the chunk in the file
+// servers that don't support range requests send the entire file
+export function stream_bytes(
+    url: string,
+    range: [number, number] | null,
+    signal: AbortSignal | null,
+    on_chunk: (chunk: Uint8Array, position: number) => void,
+    on_done: () => void,
+    on_failed: () => void
+): void {
+    let headers = new Headers();
+    if (range !== null)
+        headers.set("Range", `bytes=${range[0]}-${range[1] - 1}`);
+    fetch(url, { headers: headers, signal: signal ?? undefined }).then(async (response) => {
+        if (!response.ok || response.body === null)
+            throw new Error(`status ${response.status}`);
+        // position of the next byte in the file
+        let position = range !== null && response.status == 206 ? range[0] : 0;
+        let reader = response.body.getReader();
+        while (true) {
+            let { done, value } = await reader.read();
+            if (done || value === undefined)
+                break;
+            let chunk_start = position;
+            position += value.byteLength;
+            if (range === null) {
+                on_chunk(value, chunk_start);
+                continue;
+            }
+            // cut chunk to the requested range
+            let begin = Math.max(range[0] - chunk_start, 0);
+            let end = Math.min(range[1] - chunk_start, value.byteLength);
+            if (begin < end)
+                on_chunk(value.subarray(begin, end), chunk_start + begin);
+            if (position >= range[1]) {
+                reader.cancel();
+                break;
+            }
+        }
+        on_done();
+    }).catch((error) => {
+        // aborting isn't a failure
+        if (signal !== null && signal.aborted)
+            return;
+        console.error(`Failed to load '${url}': ${error}`);
+        on_failed();
+    });
+}
+
+// download files one after another as if they were a single one
+export function stream_files(
+    urls: string[],
+    signal: AbortSignal | null,
+    on_chunk: (chunk: Uint8Array) => void,
+    on_done: () => void,
+    on_failed: () => void
+): void {
+    if (urls.length == 0) {
+        on_done();
+        return;
+    }
+    stream_bytes(urls[0], null, signal, on_chunk, () => stream_files(urls.slice(1), signal, on_chunk, on_done, on_failed), on_failed);
+}
+
+export function concat_chunks(chunks: Uint8Array[]): Uint8Array {
+    if (chunks.length == 1)
+        return chunks[0];
+    let result = new Uint8Array(chunks.reduce((size, chunk) => size + chunk.byteLength, 0));
+    let position = 0;
+    for (let chunk of chunks) {
+        result.set(chunk, position);
+        position += chunk.byteLength;
+    }
+    return result;
+}
@@ -12,6 +12,8 @@ module.exports = (env) => {
         entry: {
             index: "./src/ts/index.ts",
             menu: "./src/ts/menu.ts",
+            // not inlined, copied next to the index.html of each presentation
+            service_worker: "./src/ts/service_worker.ts",
         },
         module: {
             rules: [{
@@ -41,7 +43,7 @@ module.exports = (env) => {
         },
         output: {
             // template based on keys in entry
-            filename: "tmp/[name].js",
+            filename: (path_data) => path_data.chunk.name == "service_worker" ? "sw.js" : "tmp/[name].js",
             // need absolute path
             path: path.resolve(__dirname, "../manim_web_presenter/web"),
         },